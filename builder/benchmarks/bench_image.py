@@ -0,0 +1,322 @@
+"""Micro-benchmarks du pipeline image (`image.py`).
+
+Chaque cas est exécuté dans un process neuf (spawn) pour mesurer son pic de RSS
+isolément. Le rapport donne, par cas, la durée médiane, le débit (Mpx/s et Mo/s
+d'entrée) et le pic de RSS du process.
+
+Usage (depuis builder/) :
+    python benchmarks/bench_image.py --preset quick
+    python benchmarks/bench_image.py --save-baseline benchmarks/baseline.json
+    python benchmarks/bench_image.py --compare benchmarks/baseline.json --threshold 0.15
+
+Avec --compare, le code de sortie vaut 1 si un cas régresse (durée ou pic de RSS
+au-delà du seuil) : utilisable en CI. Les baselines dépendent de la machine et ne
+sont pas versionnées.
+"""
+
+import argparse
+import itertools
+import json
+import math
+import multiprocessing
+import platform
+import resource
+import statistics
+import sys
+import time
+from io import BytesIO
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+ENCODERS: Tuple[str, ...] = ("jpg", "png", "jxl", "jxl_lossless")
+DTYPES: Tuple[str, ...] = ("uint8", "float32", "float64")
+PRESETS: Dict[str, Dict[str, Tuple[Any, ...]]] = {
+    "quick": {"mp": (1, 4), "channels": (3,), "dtypes": ("uint8", "float32")},
+    "standard": {"mp": (1, 12, 50), "channels": (1, 3, 4), "dtypes": DTYPES},
+    "full": {"mp": (1, 4, 12, 25, 50), "channels": (1, 3, 4), "dtypes": DTYPES},
+}
+SEED = 0
+
+Case = Dict[str, Any]
+
+
+def _shape(megapixels: float, channels: int) -> Tuple[int, ...]:
+    """Forme (h, w[, c]) au ratio 4:3 pour `megapixels` millions de pixels."""
+    width = int(math.sqrt(megapixels * 1e6 * 4 / 3))
+    height = int(megapixels * 1e6 / width)
+    return (height, width) if channels == 1 else (height, width, channels)
+
+
+def synthetic_image(megapixels: float, channels: int, dtype: str) -> Any:
+    """Image déterministe (dégradés + bruit) : compressibilité proche d'une photo."""
+    import numpy as np
+
+    shape = _shape(megapixels, channels)
+    height, width = shape[:2]
+    rng = np.random.default_rng(SEED)
+    y = np.linspace(0.0, 1.0, height, dtype=np.float32)[:, None]
+    x = np.linspace(0.0, 1.0, width, dtype=np.float32)[None, :]
+    base = 0.5 + 0.25 * np.sin(8 * x + 3 * y) * np.cos(5 * y)
+    image = np.empty(shape, dtype=np.float32)
+    for c in range(1 if channels == 1 else channels):
+        plane = base + rng.normal(0.0, 0.03, (height, width)).astype(np.float32) + 0.05 * c
+        np.clip(plane, 0.0, 1.0, out=plane)
+        if channels == 1:
+            image[...] = plane
+        else:
+            image[..., c] = plane
+    if dtype == "uint8":
+        return np.round(image * 255).astype(np.uint8)
+    return image.astype(dtype)
+
+
+def synthetic_pdf(megapixels: float, zoom: float = 2.0) -> bytes:
+    """PDF d'une page (texte, formes, image embarquée) rendu à ~`megapixels` au zoom donné."""
+    import cv2
+    import fitz
+
+    height, width = _shape(megapixels / (zoom * zoom), 1)
+    doc = fitz.open()
+    page = doc.new_page(width=width, height=height)
+    for i in range(0, height, 24):
+        page.insert_text((36, 36 + i), f"Question {i // 24} : texte de formulaire synthétique")
+        page.draw_rect(fitz.Rect(width - 60, 24 + i, width - 44, 40 + i), color=(0, 0, 0))
+    photo = synthetic_image(megapixels / 16, 3, "uint8")
+    ok, png = cv2.imencode(".png", photo)
+    page.insert_image(
+        fitz.Rect(width / 2, height / 2, width - 36, height - 36), stream=png.tobytes()
+    )
+    data = doc.tobytes()
+    doc.close()
+    return bytes(data)
+
+
+def _upload_file(data: bytes, filename: str) -> Any:
+    from fastapi import UploadFile
+
+    return UploadFile(file=BytesIO(data), filename=filename)
+
+
+def build_cases(
+    mps: Tuple[float, ...],
+    channels: Tuple[int, ...],
+    dtypes: Tuple[str, ...],
+    encoders: Tuple[str, ...],
+    only: Optional[List[str]],
+) -> List[Case]:
+    """Énumère les cas du benchmark (produit cartésien des paramètres)."""
+    cases: List[Case] = []
+    for mp, c, dtype, encoder in itertools.product(mps, channels, dtypes, encoders):
+        cases.append(
+            {
+                "id": f"encode/{encoder}/{dtype}/c{c}/{mp:g}mp",
+                "kind": "encode",
+                "mp": mp,
+                "channels": c,
+                "dtype": dtype,
+                "encoder": encoder,
+            }
+        )
+    for mp, c, dtype in itertools.product(mps, channels, dtypes):
+        for target in ("uint8", "float32"):
+            if target != dtype:
+                cases.append(
+                    {
+                        "id": f"cast/{dtype}->{target}/c{c}/{mp:g}mp",
+                        "kind": "cast",
+                        "mp": mp,
+                        "channels": c,
+                        "dtype": dtype,
+                        "target": target,
+                    }
+                )
+    for mp, fmt in itertools.product(mps, ("png", "jpg")):
+        cases.append({"id": f"extract/{fmt}/{mp:g}mp", "kind": "extract", "mp": mp, "format": fmt})
+    for mp in mps:
+        cases.append({"id": f"pdf/{mp:g}mp", "kind": "pdf", "mp": mp})
+    if only:
+        cases = [case for case in cases if case["kind"] in only]
+    return cases
+
+
+def _prepare(case: Case) -> Tuple[Any, int]:
+    """Construit la fonction à chronométrer et la taille de son entrée en octets."""
+    import cv2
+    import image
+
+    if case["kind"] == "encode":
+        arr = synthetic_image(case["mp"], case["channels"], case["dtype"])
+        return (lambda: image.encode_image_array(arr, case["encoder"], "RGB")), arr.nbytes
+
+    if case["kind"] == "cast":
+        arr = synthetic_image(case["mp"], case["channels"], case["dtype"])
+        return (lambda: image.cast_image(arr, case["target"])), arr.nbytes
+
+    if case["kind"] == "extract":
+        arr = synthetic_image(case["mp"], 3, "uint8")
+        data = cv2.imencode(f".{case['format']}", arr)[1].tobytes()
+        upload = _upload_file(data, f"bench.{case['format']}")
+        return (lambda: image.extract_image_array(upload)), len(data)
+
+    pdf = synthetic_pdf(case["mp"])
+    upload = _upload_file(pdf, "bench.pdf")
+    return (lambda: image.pdf_to_image_array(upload)), len(pdf)
+
+
+def run_case(case: Case, repeat: int, min_time: float) -> Dict[str, Any]:
+    """Exécute un cas (dans un process dédié) et retourne ses mesures."""
+    try:
+        fn, input_bytes = _prepare(case)
+        fn()  # warmup
+        timings: List[float] = []
+        started_at = time.perf_counter()
+        while len(timings) < repeat or time.perf_counter() - started_at < min_time:
+            t0 = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - t0)
+    except Exception as e:
+        return {"id": case["id"], "error": f"{type(e).__name__}: {e}"}
+
+    seconds = statistics.median(timings)
+    return {
+        "id": case["id"],
+        "seconds": seconds,
+        "runs": len(timings),
+        "mp_per_s": case["mp"] / seconds,
+        "mb_per_s": input_bytes / 1e6 / seconds,
+        # ru_maxrss est en Ko sous Linux, en octets sous macOS
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        / (1e6 if sys.platform == "darwin" else 1e3),
+    }
+
+
+def run_cases(cases: List[Case], repeat: int, min_time: float) -> Iterator[Dict[str, Any]]:
+    """Exécute chaque cas dans un process neuf (pic de RSS propre au cas)."""
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(processes=1, maxtasksperchild=1) as pool:
+        for case in cases:
+            yield pool.apply(run_case, (case, repeat, min_time))
+
+
+def environment() -> Dict[str, str]:
+    import cv2
+    import imagecodecs
+    import numpy
+
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "numpy": numpy.__version__,
+        "opencv": cv2.__version__,
+        "imagecodecs": imagecodecs.__version__,
+    }
+
+
+def compare(
+    results: List[Dict[str, Any]],
+    baseline: Dict[str, Any],
+    threshold: float,
+    rss_threshold: float,
+) -> List[str]:
+    """Liste les régressions par rapport à la baseline."""
+    regressions: List[str] = []
+    reference = baseline.get("results", {})
+    for result in results:
+        ref = reference.get(result["id"])
+        if ref is None or "error" in ref:
+            continue
+        if "error" in result:
+            regressions.append(f"{result['id']}: erreur ({result['error']})")
+            continue
+        slowdown = result["seconds"] / ref["seconds"] - 1
+        if slowdown > threshold:
+            regressions.append(
+                f"{result['id']}: {ref['seconds']:.4f}s -> {result['seconds']:.4f}s "
+                f"(+{slowdown:.0%})"
+            )
+        growth = result["peak_rss_mb"] / ref["peak_rss_mb"] - 1
+        if growth > rss_threshold:
+            regressions.append(
+                f"{result['id']}: pic RSS {ref['peak_rss_mb']:.0f} Mo -> "
+                f"{result['peak_rss_mb']:.0f} Mo (+{growth:.0%})"
+            )
+    return regressions
+
+
+def _print_result(result: Dict[str, Any], ref: Optional[Dict[str, Any]]) -> None:
+    if "error" in result:
+        print(f"{result['id']:<40} {'-':>10} {'-':>9} {'-':>9} {'-':>9}  {result['error']}")
+        return
+    delta = ""
+    if ref is not None and "seconds" in ref:
+        delta = f"{result['seconds'] / ref['seconds'] - 1:+.0%}"
+    print(
+        f"{result['id']:<40} {result['seconds'] * 1e3:>8.1f}ms "
+        f"{result['mp_per_s']:>9.1f} {result['mb_per_s']:>9.1f} "
+        f"{result['peak_rss_mb']:>9.0f}  {delta}"
+    )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--preset", choices=sorted(PRESETS), default="standard")
+    parser.add_argument("--mp", help="résolutions en mégapixels, ex: 1,12,50")
+    parser.add_argument("--channels", help="nombres de canaux, ex: 1,3,4")
+    parser.add_argument("--dtypes", help=f"parmi {','.join(DTYPES)}")
+    parser.add_argument("--encoders", default=",".join(ENCODERS), help="encodeurs à mesurer")
+    parser.add_argument("--only", help="types de cas : encode,cast,extract,pdf")
+    parser.add_argument("--repeat", type=int, default=3, help="mesures minimales par cas")
+    parser.add_argument("--min-time", type=float, default=0.5, help="durée minimale par cas (s)")
+    parser.add_argument("--save-baseline", type=Path, help="écrit les résultats dans ce fichier")
+    parser.add_argument("--compare", type=Path, help="baseline à comparer")
+    parser.add_argument("--threshold", type=float, default=0.15, help="ralentissement toléré")
+    parser.add_argument("--rss-threshold", type=float, default=0.10, help="hausse de RSS tolérée")
+    args = parser.parse_args()
+
+    preset = PRESETS[args.preset]
+    cases = build_cases(
+        mps=tuple(float(v) for v in args.mp.split(",")) if args.mp else preset["mp"],
+        channels=tuple(int(v) for v in args.channels.split(","))
+        if args.channels
+        else preset["channels"],
+        dtypes=tuple(args.dtypes.split(",")) if args.dtypes else preset["dtypes"],
+        encoders=tuple(args.encoders.split(",")),
+        only=args.only.split(",") if args.only else None,
+    )
+    baseline = json.loads(args.compare.read_text()) if args.compare else {}
+    reference = baseline.get("results", {})
+
+    print(f"{len(cases)} cas")
+    print(f"{'cas':<40} {'médiane':>10} {'Mpx/s':>9} {'Mo/s':>9} {'RSS Mo':>9}")
+    results: List[Dict[str, Any]] = []
+    for result in run_cases(cases, args.repeat, args.min_time):
+        _print_result(result, reference.get(result["id"]))
+        results.append(result)
+
+    if args.save_baseline:
+        args.save_baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.save_baseline.write_text(
+            json.dumps(
+                {"environment": environment(), "results": {r["id"]: r for r in results}},
+                indent=2,
+            )
+        )
+        print(f"Baseline écrite dans {args.save_baseline}")
+
+    if args.compare:
+        if baseline.get("environment") != environment():
+            print("Attention : baseline mesurée dans un autre environnement.")
+        regressions = compare(results, baseline, args.threshold, args.rss_threshold)
+        for line in regressions:
+            print(f"RÉGRESSION {line}")
+        if regressions:
+            return 1
+        print("Aucune régression.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
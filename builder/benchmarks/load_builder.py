@@ -0,0 +1,369 @@
+"""Test de charge hors ligne du builder (`main.py`) sur les backends locaux.
+
+Démarre l'API avec GERMINA_BACKEND=local (bucket sur disque, registre en mémoire, build
+factice, JWT locaux, voir `local_backends.py`) ou cible une URL existante démarrée de
+la même façon, puis fait dérouler à `--users` utilisateurs virtuels le parcours complet,
+`--rounds` fois chacun :
+
+    upload_file → build → build_status (jusqu'au succès) → list → delete_image
+    → operations/{id} (jusqu'à la fin de la suppression)
+
+Le rapport donne, par étape, le nombre d'appels, les latences p50/p95/p99 et les
+erreurs (les 429/503 sont réessayés après Retry-After), puis la durée des appels amont
+simulés lue sur `/metrics`. La latence du registre et la durée des builds se règlent
+par les variables LOCAL_* (ou --ar-latency, --build-seconds, --seed-users) ;
+`--profile` enregistre un profil cProfile du serveur.
+
+Usage (depuis builder/) :
+    python benchmarks/load_builder.py --users 20 --rounds 3
+    python benchmarks/load_builder.py --users 50 --ar-latency 0.05 --seed-users 2000
+    python benchmarks/load_builder.py --profile /tmp/builder.prof
+    export LOCAL_JWT_SECRET=$(openssl rand -hex 32) METRICS_TOKEN=$(openssl rand -hex 32)
+    GERMINA_BACKEND=local uvicorn main:app --port 8080 &
+    python benchmarks/load_builder.py --url http://127.0.0.1:8080
+"""
+
+import argparse
+import json
+import os
+import random
+import secrets
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from io import BytesIO
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+import requests
+
+BUILDER_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BUILDER_DIR))
+
+STEPS = ("upload_file", "build", "build_status", "list", "delete_image", "operation")
+# Limites larges : on mesure le parcours, pas le limiteur
+LOAD_RATE_LIMITS = {
+    route: {"per_minute": 1_000_000, "burst": 1_000_000, "concurrency": 0}
+    for route in ("build", "upload_file", "generate_deploy_script")
+}
+
+
+@dataclass
+class Sample:
+    step: str
+    latency: float
+    status: int
+
+
+@dataclass
+class Run:
+    samples: List[Sample] = field(default_factory=list)
+    flows: List[float] = field(default_factory=list)
+    failures: List[str] = field(default_factory=list)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+
+def synthetic_png(pixels: int, seed: int) -> bytes:
+    """Image PNG bruitée de `pixels` × `pixels` (peu compressible, comme une photo)."""
+    import numpy as np
+    from PIL import Image
+
+    rng = np.random.default_rng(seed)
+    array = rng.integers(0, 256, (pixels, pixels, 3), dtype=np.uint8)
+    buffer = BytesIO()
+    Image.fromarray(array).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def _metrics_headers() -> Dict[str, str]:
+    return {"Authorization": f"Bearer {os.environ.get('METRICS_TOKEN', '')}"}
+
+
+def _wait_ready(url: str, timeout: float) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            response = requests.get(f"{url}/metrics", headers=_metrics_headers(), timeout=2)
+            if response.status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Le builder n'a pas répondu sur {url}/metrics en {timeout}s")
+
+
+@contextmanager
+def local_builder(port: int, env: Dict[str, str], profile: Optional[Path]) -> Iterator[str]:
+    """Démarre `uvicorn main:app` sur les backends locaux (sous cProfile si demandé)."""
+    command = [sys.executable]
+    if profile:
+        command += ["-m", "cProfile", "-o", str(profile)]
+    command += ["-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port)]
+    process = subprocess.Popen(
+        command,
+        cwd=BUILDER_DIR,
+        env={**os.environ, **env},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+    try:
+        url = f"http://127.0.0.1:{port}"
+        _wait_ready(url, 60)
+        yield url
+    finally:
+        # SIGINT : arrêt propre d'uvicorn, cProfile écrit alors le profil
+        os.killpg(process.pid, signal.SIGINT)
+        process.wait(timeout=30)
+
+
+@contextmanager
+def existing_builder(url: str) -> Iterator[str]:
+    _wait_ready(url, 10)
+    yield url
+
+
+def flow(
+    url: str,
+    session: requests.Session,
+    run: Run,
+    user_id: str,
+    qid: str,
+    image: bytes,
+    poll_interval: float,
+    timeout: float,
+) -> None:
+    """Déroule le parcours complet pour un questionnaire ; lève RuntimeError à la 1re erreur."""
+    from local_backends import issue_token
+
+    session.headers["Authorization"] = f"Bearer {issue_token(user_id)}"
+    deadline = time.time() + timeout
+
+    def call(step: str, method: str, path: str, **kwargs: Any) -> Dict[str, Any]:
+        """Appel chronométré ; 429/503 sont réessayés après Retry-After, comme un client."""
+        while True:
+            started_at = time.perf_counter()
+            status = 0
+            try:
+                response = session.request(method, f"{url}{path}", timeout=120, **kwargs)
+                status = response.status_code
+            finally:
+                with run.lock:
+                    run.samples.append(Sample(step, time.perf_counter() - started_at, status))
+            if status in (429, 503) and time.time() < deadline:
+                time.sleep(float(response.headers.get("Retry-After", poll_interval)))
+                continue
+            if status >= 400:
+                raise RuntimeError(f"{step}: HTTP {status} {response.text[:200]}")
+            return dict(response.json())
+
+    def poll(step: str, path: str, done: Any) -> Dict[str, Any]:
+        while True:
+            body = call(step, "GET", path)
+            if done(body):
+                return body
+            if time.time() > deadline:
+                raise RuntimeError(f"{step}: délai dépassé ({timeout}s)")
+            time.sleep(poll_interval)
+
+    call(
+        "upload_file",
+        "POST",
+        "/upload_file",
+        data={"questionnaire_id": qid},
+        files={"file": ("template.png", image, "image/png")},
+    )
+    call(
+        "build",
+        "POST",
+        f"/build/{qid}",
+        json={
+            "user_id": user_id,
+            "title": f"Questionnaire {qid}",
+            "schema": {"type": "object", "properties": {"q": {"type": "string"}}},
+            "ui_schema": {},
+        },
+    )
+    poll(
+        "build_status", f"/build_status?questionnaire_id={qid}", lambda b: b["status"] != "pending"
+    )
+    listed = call("list", "GET", f"/list?questionnaire_id={qid}")
+    if not listed["images"]:
+        raise RuntimeError("list: image construite absente")
+    operation = call("delete_image", "DELETE", f"/delete_image?questionnaire_id={qid}")
+    result = poll(
+        "operation", f"/operations/{operation['operation_id']}", lambda b: b["status"] != "running"
+    )
+    if result["status"] != "success":
+        raise RuntimeError(f"operation: {result.get('error') or result.get('result')}")
+
+
+def drive(
+    url: str,
+    run: Run,
+    users: int,
+    rounds: int,
+    image: bytes,
+    poll_interval: float,
+    timeout: float,
+    seed: int,
+) -> None:
+    """Chaque utilisateur virtuel enchaîne `rounds` parcours, les utilisateurs en parallèle."""
+
+    def worker(index: int) -> None:
+        rng = random.Random(seed * 1000 + index)
+        session = requests.Session()
+        user_id = f"load{seed}u{index:04d}"
+        for round_index in range(rounds):
+            qid = f"r{round_index}{rng.randrange(16 ** 6):06x}"
+            started_at = time.perf_counter()
+            try:
+                flow(url, session, run, user_id, qid, image, poll_interval, timeout)
+            except (RuntimeError, requests.RequestException) as e:
+                with run.lock:
+                    run.failures.append(f"{user_id}/{qid}: {e}")
+                continue
+            with run.lock:
+                run.flows.append(time.perf_counter() - started_at)
+
+    with ThreadPoolExecutor(max_workers=users) as executor:
+        list(executor.map(worker, range(users)))
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return float("nan")
+    index = min(len(sorted_values) - 1, max(0, round(q * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def upstream_summary(url: str) -> Dict[str, List[float]]:
+    """Somme et nombre d'appels amont par `call`, lus sur `/metrics`."""
+    summary: Dict[str, List[float]] = {}
+    try:
+        text = requests.get(f"{url}/metrics", headers=_metrics_headers(), timeout=30).text
+    except requests.RequestException:
+        return summary
+    for line in text.splitlines():
+        for suffix, index in (("_sum{", 0), ("_count{", 1)):
+            prefix = f"builder_upstream_call_duration_seconds{suffix}"
+            if line.startswith(prefix):
+                call = line.split('call="', 1)[1].split('"', 1)[0]
+                summary.setdefault(call, [0.0, 0.0])[index] += float(line.rsplit(" ", 1)[1])
+    return summary
+
+
+def report(run: Run, url: str, elapsed: float) -> None:
+    print(
+        f"{'étape':<13} {'appels':>7} {'réessais':>8} "
+        f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'erreurs':>8}"
+    )
+    for step in STEPS:
+        samples = [s for s in run.samples if s.step == step]
+        if not samples:
+            continue
+        latencies = sorted(s.latency for s in samples)
+        errors = sum(1 for s in samples if s.status == 0 or s.status >= 400)
+        retried = sum(1 for s in samples if s.status in (429, 503))
+        print(
+            f"{step:<13} {len(samples):>7} {retried:>8} "
+            f"{_percentile(latencies, 0.50) * 1e3:>8.1f} "
+            f"{_percentile(latencies, 0.95) * 1e3:>8.1f} "
+            f"{_percentile(latencies, 0.99) * 1e3:>8.1f} {errors:>8}"
+        )
+    statuses = Counter(s.status for s in run.samples if s.status == 0 or s.status >= 400)
+    if statuses:
+        print("erreurs par statut : " + ", ".join(f"{k}: {v}" for k, v in statuses.items()))
+
+    flows = sorted(run.flows)
+    print(
+        f"\n{len(flows)} parcours complets, {len(run.failures)} échoués en {elapsed:.1f}s "
+        f"({len(flows) / elapsed:.2f} parcours/s, p50 {_percentile(flows, 0.5):.2f}s, "
+        f"p95 {_percentile(flows, 0.95):.2f}s)"
+    )
+    for failure in run.failures[:10]:
+        print(f"  {failure}")
+
+    summary = upstream_summary(url)
+    if summary:
+        print(f"\n{'appel amont':<26} {'appels':>7} {'moyenne ms':>11}")
+        for call, (total, count) in sorted(summary.items()):
+            print(f"{call:<26} {int(count):>7} {total / count * 1e3 if count else 0:>11.1f}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--users", type=int, default=10, help="utilisateurs virtuels")
+    parser.add_argument("--rounds", type=int, default=2, help="parcours par utilisateur")
+    parser.add_argument("--image-px", type=int, default=800, help="côté de l'image uploadée")
+    parser.add_argument("--poll-interval", type=float, default=0.2)
+    parser.add_argument("--timeout", type=float, default=300, help="délai max par parcours (s)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--build-seconds", type=float, help="LOCAL_BUILD_SECONDS")
+    parser.add_argument("--ar-latency", type=float, help="LOCAL_AR_LATENCY")
+    parser.add_argument("--gcs-latency", type=float, help="LOCAL_GCS_LATENCY")
+    parser.add_argument("--seed-users", type=int, help="LOCAL_AR_SEED_USERS")
+    parser.add_argument("--url", help="builder déjà démarré avec GERMINA_BACKEND=local")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--profile", type=Path, help="profil cProfile du serveur (.prof)")
+    args = parser.parse_args()
+
+    overrides = {
+        "LOCAL_BUILD_SECONDS": args.build_seconds,
+        "LOCAL_AR_LATENCY": args.ar_latency,
+        "LOCAL_GCS_LATENCY": args.gcs_latency,
+        "LOCAL_AR_SEED_USERS": args.seed_users,
+    }
+    image = synthetic_png(args.image_px, args.seed)
+    # Secrets partagés avec le serveur démarré ici (qui hérite de l'environnement)
+    os.environ.setdefault("LOCAL_JWT_SECRET", secrets.token_urlsafe(32))
+    os.environ.setdefault("METRICS_TOKEN", secrets.token_urlsafe(32))
+
+    with tempfile.TemporaryDirectory(prefix="germina-builder-load-") as tmp:
+        if args.url:
+            app_context: Any = existing_builder(args.url.rstrip("/"))
+        else:
+            env = {
+                "GERMINA_BACKEND": "local",
+                "LOCAL_STORAGE_DIR": str(Path(tmp) / "storage"),
+                "SURVEY_TEMPLATE_BUCKET": os.getenv("SURVEY_TEMPLATE_BUCKET", "survey-templates"),
+                "GCP_PROJECT": os.getenv("GCP_PROJECT", "local"),
+                "GCR_LOCATION": os.getenv("GCR_LOCATION", "local"),
+                "GCR_REPOSITORY": os.getenv("GCR_REPOSITORY", "germina"),
+                "RATE_LIMITS": json.dumps(LOAD_RATE_LIMITS),
+                **{k: str(v) for k, v in overrides.items() if v is not None},
+            }
+            app_context = local_builder(args.port, env, args.profile)
+
+        with app_context as url:
+            print(
+                f"{url} : {args.users} utilisateurs × {args.rounds} parcours, "
+                f"image {args.image_px}px ({len(image) / 1024:.0f} Kio)"
+            )
+            run = Run()
+            started_at = time.time()
+            drive(
+                url,
+                run,
+                args.users,
+                args.rounds,
+                image,
+                args.poll_interval,
+                args.timeout,
+                args.seed,
+            )
+            report(run, url, time.time() - started_at)
+    if args.profile:
+        print(f"\nProfil serveur : {args.profile} (python -m pstats {args.profile})")
+    return 1 if run.failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
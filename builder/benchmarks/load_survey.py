@@ -0,0 +1,437 @@
+"""Test de charge du conteneur questionnaire (`survey_template/app.py`).
+
+Génère un schéma synthétique (champs texte, enum, nombres, dates, booléens, listes et
+fichiers `data-url`), démarre l'application (process local ou image Docker) ou cible
+une URL existante, puis envoie des soumissions concurrentes sur `/submit` (et des
+affichages de `/`) jusqu'à atteindre le dernier palier de réponses stockées.
+
+Le rapport donne, par tranche de taille du stock (paliers --checkpoints), le débit
+et les latences p50/p95/p99. En fin de run, le nombre d'entrées stockées est comparé
+aux soumissions acceptées (via `/metrics`, et via le fichier de réponses si l'app est
+locale) pour vérifier qu'aucune entrée n'est perdue sous concurrence.
+
+Usage (depuis builder/) :
+    python benchmarks/load_survey.py --fields 20 --file-fields 2 --concurrency 16
+    python benchmarks/load_survey.py --checkpoints 0,1000,10000,100000 --time-limit 1800
+    python benchmarks/load_survey.py --image germina-survey:local
+    python benchmarks/load_survey.py --url http://localhost:5000 --no-verify-store
+"""
+
+import argparse
+import base64
+import csv
+import json
+import os
+import random
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import requests
+
+SURVEY_TEMPLATE_DIR = Path(__file__).resolve().parents[1] / "survey_template"
+QID = "loadtest"
+FIELD_KINDS = ("string", "enum", "number", "integer", "boolean", "date", "array")
+# PNG 1x1 valide, complété pour atteindre la taille de fichier demandée
+PNG_HEADER = bytes.fromhex(
+    "89504e470d0a1a0a0000000d49484452000000010000000108060000001f15c489"
+    "0000000d49444154789c6360000002000154a24f5d0000000049454e44ae426082"
+)
+
+
+def synthetic_schema(fields: int, file_fields: int, seed: int = 0) -> Dict[str, Any]:
+    """Schéma au format SCHEMA : `fields` champs de types variés + `file_fields` fichiers."""
+    rng = random.Random(seed)
+    properties: Dict[str, Any] = {}
+    for i in range(fields):
+        kind = FIELD_KINDS[i % len(FIELD_KINDS)]
+        name = f"{kind}_{i}"
+        if kind == "enum":
+            properties[name] = {"type": "string", "enum": [f"Option {j}" for j in range(5)]}
+        elif kind == "number":
+            properties[name] = {"type": "number", "minimum": 0, "maximum": 1000}
+        elif kind == "integer":
+            properties[name] = {"type": "integer", "minimum": 0, "maximum": 120}
+        elif kind == "date":
+            properties[name] = {"type": "string", "format": "date"}
+        elif kind == "array":
+            choices = [f"Choix {j}" for j in range(rng.randint(3, 8))]
+            properties[name] = {
+                "type": "array",
+                "items": {"type": "string", "enum": choices},
+                "uniqueItems": True,
+            }
+        else:
+            properties[name] = {"type": kind}
+        properties[name]["title"] = f"Question {i}"
+    for i in range(file_fields):
+        properties[f"file_{i}"] = {"type": "string", "format": "data-url", "title": f"Fichier {i}"}
+    return {"type": "object", "properties": properties}
+
+
+def synthetic_submission(
+    schema: Dict[str, Any], rng: random.Random, file_bytes: int
+) -> Dict[str, Any]:
+    """Valeurs de formulaire comme les envoie le frontend : chaînes, et fichiers en
+    data-URL base64 dans les champs (`data:image/png;name=...;base64,...`)."""
+    form: Dict[str, Any] = {}
+    for name, prop in schema["properties"].items():
+        if prop.get("format") == "data-url":
+            content = PNG_HEADER + rng.randbytes(max(0, file_bytes - len(PNG_HEADER)))
+            encoded = base64.b64encode(content).decode("ascii")
+            form[name] = f"data:image/png;name={name}.png;base64,{encoded}"
+        elif "enum" in prop:
+            form[name] = rng.choice(prop["enum"])
+        elif prop["type"] == "number":
+            form[name] = f"{rng.uniform(0, 1000):.2f}"
+        elif prop["type"] == "integer":
+            form[name] = str(rng.randint(0, 120))
+        elif prop["type"] == "boolean":
+            form[name] = rng.choice(["true", "false"])
+        elif prop.get("format") == "date":
+            form[name] = (date(1950, 1, 1) + timedelta(days=rng.randint(0, 25000))).isoformat()
+        elif prop["type"] == "array":
+            choices = prop["items"]["enum"]
+            form[name] = rng.sample(choices, rng.randint(1, len(choices)))
+        else:
+            form[name] = "".join(rng.choices("abcdefghij klmnop", k=rng.randint(5, 80)))
+    return form
+
+
+def _form_parts(form: Dict[str, Any]) -> Iterator[Tuple[str, str]]:
+    """Parties du formulaire ; une liste donne une partie par valeur."""
+    for name, value in form.items():
+        for item in value if isinstance(value, list) else [value]:
+            yield name, item
+
+
+@dataclass
+class Sample:
+    kind: str
+    stored_before: int
+    started_at: float
+    latency: float
+    status: int
+    entry_id: Optional[str] = None
+
+
+@dataclass
+class Run:
+    samples: List[Sample] = field(default_factory=list)
+    accepted: int = 0
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+
+def _wait_ready(url: str, timeout: float) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if requests.get(f"{url}/healthz", timeout=2).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"L'application n'a pas répondu sur {url}/healthz en {timeout}s")
+
+
+@contextmanager
+def local_app(schema: Dict[str, Any], port: int, workdir: Path) -> Iterator[str]:
+    """Démarre `app.py` comme dans le conteneur (CMD python app.py) avec le schéma donné."""
+    (workdir / "schema.json").write_text(json.dumps(schema))
+    (workdir / "ui_schema.json").write_text("{}")
+    script = (
+        "import sys; sys.path.insert(0, sys.argv[1]); import app; "
+        "app.BASE_STORAGE.mkdir(parents=True, exist_ok=True); "
+        "app.app.run(host='127.0.0.1', port=int(sys.argv[2]), threaded=True)"
+    )
+    env = {**os.environ, "Q_ID": QID, "DATA_DIR": str(workdir / "data")}
+    process = subprocess.Popen(
+        [sys.executable, "-c", script, str(SURVEY_TEMPLATE_DIR), str(port)],
+        cwd=workdir,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+    try:
+        url = f"http://127.0.0.1:{port}"
+        _wait_ready(url, 30)
+        yield url
+    finally:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait(timeout=10)
+
+
+@contextmanager
+def existing_app(url: str) -> Iterator[str]:
+    _wait_ready(url, 10)
+    yield url
+
+
+@contextmanager
+def docker_app(image: str, port: int, workdir: Path) -> Iterator[str]:
+    """Démarre une image questionnaire construite, avec le volume de données dans `workdir`."""
+    container = subprocess.check_output(
+        ["docker", "run", "-d", "--rm", "-p", f"{port}:5000", "-v", f"{workdir}:/app/data", image],
+        text=True,
+    ).strip()
+    try:
+        url = f"http://127.0.0.1:{port}"
+        _wait_ready(url, 60)
+        yield url
+    finally:
+        subprocess.run(["docker", "stop", container], check=False, capture_output=True)
+
+
+def stored_entries(url: str) -> Optional[int]:
+    """Nombre d'entrées stockées, lu sur `/metrics` (survey_store_entries)."""
+    try:
+        text = requests.get(f"{url}/metrics", timeout=30).text
+    except requests.RequestException:
+        return None
+    for line in text.splitlines():
+        if line.startswith("survey_store_entries "):
+            return int(float(line.split()[1]))
+    return None
+
+
+def drive(
+    url: str,
+    schema: Dict[str, Any],
+    run: Run,
+    submissions: int,
+    initial: int,
+    concurrency: int,
+    form_ratio: float,
+    file_bytes: int,
+    time_limit: float,
+    seed: int,
+) -> None:
+    """Envoie `submissions` soumissions (et des GET / intercalés) depuis `concurrency` threads."""
+    deadline = time.time() + time_limit
+    remaining = [submissions]
+    remaining_lock = threading.Lock()
+
+    def record(sample: Sample) -> None:
+        with run.lock:
+            run.samples.append(sample)
+            if sample.kind == "submit" and sample.status == 200:
+                run.accepted += 1
+
+    def request(session: requests.Session, kind: str, rng: random.Random) -> Sample:
+        sample = Sample(kind, initial + run.accepted, time.time(), 0.0, 0)
+        started_at = time.perf_counter()
+        try:
+            if kind == "form":
+                response = session.get(f"{url}/", timeout=60)
+            else:
+                form = synthetic_submission(schema, rng, file_bytes)
+                started_at = time.perf_counter()
+                # multipart/form-data comme le FormData du frontend, sans partie fichier
+                response = session.post(
+                    f"{url}/submit",
+                    files=[(name, (None, value)) for name, value in _form_parts(form)],
+                    timeout=120,
+                )
+                if response.status_code == 200:
+                    sample.entry_id = response.json().get("entry_id")
+            sample.status = response.status_code
+        except requests.RequestException:
+            pass
+        sample.latency = time.perf_counter() - started_at
+        return sample
+
+    def worker(worker_id: int) -> None:
+        rng = random.Random(seed * 1000 + worker_id)
+        session = requests.Session()
+        while time.time() < deadline:
+            if rng.random() < form_ratio:
+                record(request(session, "form", rng))
+                continue
+            with remaining_lock:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+            record(request(session, "submit", rng))
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(worker, range(concurrency)))
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return float("nan")
+    index = min(len(sorted_values) - 1, max(0, round(q * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def report(run: Run, checkpoints: List[int], elapsed: float) -> None:
+    """Affiche débit et latences par tranche de taille du stock."""
+    print(
+        f"{'type':<7} {'stock':>15} {'requêtes':>9} {'req/s':>8} "
+        f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'erreurs':>8}"
+    )
+    for kind in ("submit", "form"):
+        for low, high in zip(checkpoints, checkpoints[1:]):
+            samples = [s for s in run.samples if s.kind == kind and low <= s.stored_before < high]
+            if not samples:
+                continue
+            latencies = sorted(s.latency for s in samples)
+            window = max(s.started_at + s.latency for s in samples) - min(
+                s.started_at for s in samples
+            )
+            errors = sum(1 for s in samples if s.status != 200)
+            print(
+                f"{kind:<7} {f'{low}-{high}':>15} {len(samples):>9} "
+                f"{len(samples) / window if window > 0 else float('nan'):>8.1f} "
+                f"{_percentile(latencies, 0.50) * 1e3:>8.1f} "
+                f"{_percentile(latencies, 0.95) * 1e3:>8.1f} "
+                f"{_percentile(latencies, 0.99) * 1e3:>8.1f} {errors:>8}"
+            )
+    submits = sum(1 for s in run.samples if s.kind == "submit")
+    statuses = Counter(s.status for s in run.samples if s.status != 200)
+    if statuses:
+        print("erreurs par statut : " + ", ".join(f"{k}: {v}" for k, v in statuses.items()))
+    print(
+        f"\n{run.accepted} soumissions acceptées / {submits} envoyées en {elapsed:.1f}s "
+        f"({run.accepted / elapsed:.1f} soumissions/s)"
+    )
+
+
+def verify(
+    run: Run, url: str, initial: int, data_dir: Optional[Path], file_fields: List[str]
+) -> bool:
+    """Vérifie qu'aucune entrée acceptée n'a été perdue, ni ses pièces jointes.
+    Retourne True si tout est stocké."""
+    ok = True
+    expected = initial + run.accepted
+    counted = stored_entries(url)
+    if counted is None:
+        print("Vérification /metrics impossible (survey_store_entries absent).")
+    elif counted != expected:
+        print(f"PERTE : {counted} entrées stockées pour {expected} attendues (/metrics).")
+        ok = False
+    else:
+        print(f"/metrics : {counted} entrées, aucune perte.")
+
+    store = next(data_dir.glob("*/*.csv"), None) if data_dir else None
+    if store is not None and store.exists():
+        try:
+            with open(store, newline="", encoding="utf-8-sig") as f:
+                rows = list(csv.DictReader(f))
+        except Exception as e:
+            print(f"PERTE : fichier de réponses illisible ({type(e).__name__}: {e}).")
+            return False
+        stored_ids = [row["entry_id"] for row in rows]
+        accepted_ids = {s.entry_id for s in run.samples if s.entry_id}
+        missing = accepted_ids - set(stored_ids)
+        duplicates = len(stored_ids) - len(set(stored_ids))
+        # Chaque pièce jointe envoyée doit être référencée et présente sur le volume
+        lost_files = sum(
+            1
+            for row in rows
+            if row["entry_id"] in accepted_ids
+            for name in file_fields
+            if not row.get(name)
+            or not all((store.parent / path).is_file() for path in json.loads(row[name]))
+        )
+        if missing or duplicates or lost_files:
+            print(
+                f"PERTE : {len(missing)} entry_id manquants, {duplicates} doublons, "
+                f"{lost_files} pièces jointes absentes (fichier)."
+            )
+            ok = False
+        else:
+            print(
+                f"Fichier de réponses : {len(accepted_ids)} entry_id acceptés tous présents, "
+                "pièces jointes comprises."
+            )
+    return ok
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--fields", type=int, default=20, help="champs hors fichiers")
+    parser.add_argument("--file-fields", type=int, default=1, help="champs fichier data-url")
+    parser.add_argument("--file-bytes", type=int, default=16 * 1024, help="taille des fichiers")
+    parser.add_argument("--schema", type=Path, help="schéma à utiliser au lieu du schéma généré")
+    parser.add_argument("--write-schema", type=Path, help="écrit le schéma généré et quitte")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--form-ratio", type=float, default=0.1, help="part de GET /")
+    parser.add_argument(
+        "--checkpoints",
+        default="0,100,1000,10000,100000",
+        help="paliers de réponses stockées ; le dernier est la cible",
+    )
+    parser.add_argument("--time-limit", type=float, default=3600, help="durée maximale (s)")
+    parser.add_argument("--seed", type=int, default=0)
+    target_group = parser.add_mutually_exclusive_group()
+    target_group.add_argument("--url", help="application déjà démarrée (schéma via --schema)")
+    target_group.add_argument("--image", help="image questionnaire construite avec --schema")
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--no-verify-store", action="store_true", help="saute la vérification")
+    args = parser.parse_args()
+
+    if args.schema:
+        schema = json.loads(args.schema.read_text())
+    else:
+        schema = synthetic_schema(args.fields, args.file_fields, args.seed)
+    if args.write_schema:
+        args.write_schema.write_text(json.dumps(schema))
+        return 0
+    checkpoints = sorted({int(c) for c in args.checkpoints.split(",")})
+
+    with tempfile.TemporaryDirectory(prefix="germina-load-", ignore_cleanup_errors=True) as tmp:
+        workdir = Path(tmp)
+        data_dir: Optional[Path] = workdir / "data"
+        if args.url:
+            app_context: Any = existing_app(args.url.rstrip("/"))
+            data_dir = None
+        elif args.image:
+            app_context = docker_app(args.image, args.port, workdir / "data")
+        else:
+            app_context = local_app(schema, args.port, workdir)
+
+        with app_context as url:
+            initial = stored_entries(url) or 0
+            print(
+                f"{url} : {len(schema['properties'])} champs, concurrence {args.concurrency}, "
+                f"{initial} entrées initiales, cible {checkpoints[-1]}"
+            )
+            run = Run()
+            started_at = time.time()
+            drive(
+                url,
+                schema,
+                run,
+                max(0, checkpoints[-1] - initial),
+                initial,
+                args.concurrency,
+                args.form_ratio,
+                args.file_bytes,
+                args.time_limit,
+                args.seed,
+            )
+            report(run, checkpoints, time.time() - started_at)
+            if args.no_verify_store:
+                return 0
+            file_fields = [
+                name
+                for name, prop in schema["properties"].items()
+                if prop.get("format") == "data-url"
+            ]
+            return 0 if verify(run, url, initial, data_dir, file_fields) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
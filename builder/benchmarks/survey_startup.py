@@ -0,0 +1,194 @@
+"""Taille et temps de démarrage du runtime questionnaire (`survey_template`).
+
+Pour chaque profil de dépendances, installe les paquets dans un dossier isolé
+(`pip install --target`), puis mesure :
+  - la taille installée (ce que `docker pull` transfère en plus de l'image de base) ;
+  - le temps jusqu'à la première requête : lancement de `app.py` (interpréteur sans
+    site-packages, `python -S`) jusqu'à la première réponse 200 sur `/`.
+
+Profils :
+  - lean   : requirements.txt (runtime par défaut) ;
+  - excel  : + requirements-excel.txt (image construite avec WITH_EXCEL=1) ;
+  - legacy : + pandas et openpyxl importés au démarrage, comme l'ancien runtime.
+
+Avec --docker, construit l'image pour chaque valeur de WITH_EXCEL et mesure la taille
+de l'image et le temps entre `docker run` et la première réponse.
+
+Usage (depuis builder/) :
+    python benchmarks/survey_startup.py
+    python benchmarks/survey_startup.py --profiles lean,legacy --repeat 10
+    python benchmarks/survey_startup.py --docker
+"""
+
+import argparse
+import os
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import requests
+
+SURVEY_TEMPLATE_DIR = Path(__file__).resolve().parents[1] / "survey_template"
+# Paquets en plus de requirements.txt, et modules importés avant l'app
+PROFILES: Dict[str, Tuple[List[str], List[str]]] = {
+    "lean": ([], []),
+    "excel": (["-r", str(SURVEY_TEMPLATE_DIR / "requirements-excel.txt")], []),
+    "legacy": (["pandas>=1.5", "openpyxl>=3.1.0"], ["pandas"]),
+}
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return int(sock.getsockname()[1])
+
+
+def _dir_size(path: Path) -> int:
+    return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+
+
+def _wait_first_response(url: str, started_at: float, timeout: float) -> float:
+    while time.perf_counter() - started_at < timeout:
+        try:
+            if requests.get(url, timeout=1).status_code == 200:
+                return time.perf_counter() - started_at
+        except requests.RequestException:
+            pass
+        time.sleep(0.005)
+    raise RuntimeError(f"Pas de réponse sur {url} en {timeout}s")
+
+
+def install(profile: str, target: Path) -> int:
+    """Installe le profil dans `target` et retourne la taille installée (octets)."""
+    extra, _ = PROFILES[profile]
+    subprocess.run(
+        [
+            sys.executable,
+            "-m",
+            "pip",
+            "install",
+            "--quiet",
+            "--disable-pip-version-check",
+            "--root-user-action=ignore",
+            "--target",
+            str(target),
+            "-r",
+            str(SURVEY_TEMPLATE_DIR / "requirements.txt"),
+            *extra,
+        ],
+        check=True,
+    )
+    return _dir_size(target)
+
+
+def time_to_first_request(profile: str, site: Path, workdir: Path) -> float:
+    """Lance l'app comme dans le conteneur et chronomètre la première réponse sur `/`."""
+    _, preload = PROFILES[profile]
+    port = _free_port()
+    script = (
+        "import sys; sys.path[:0] = sys.argv[1:3]; "
+        + "".join(f"import {module}; " for module in preload)
+        + "import app; app.BASE_STORAGE.mkdir(parents=True, exist_ok=True); "
+        "app.app.run(host='127.0.0.1', port=int(sys.argv[3]))"
+    )
+    env = {"Q_ID": "startup", "DATA_DIR": str(workdir / "data"), "PATH": os.environ["PATH"]}
+    started_at = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-S", "-c", script, str(site), str(SURVEY_TEMPLATE_DIR), str(port)],
+        cwd=workdir,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+    try:
+        return _wait_first_response(f"http://127.0.0.1:{port}/", started_at, 60)
+    finally:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait(timeout=10)
+
+
+def run_local(profiles: List[str], repeat: int) -> None:
+    print(f"{'profil':<8} {'installé Mo':>12} {'1re requête ms (médiane)':>25} {'min ms':>8}")
+    with tempfile.TemporaryDirectory(prefix="germina-survey-startup-") as tmp:
+        workdir = Path(tmp)
+        for name in ("schema.json", "ui_schema.json"):
+            (workdir / name).write_bytes((SURVEY_TEMPLATE_DIR / name).read_bytes())
+        for profile in profiles:
+            site = workdir / f"site-{profile}"
+            size = install(profile, site)
+            timings = [time_to_first_request(profile, site, workdir) for _ in range(repeat)]
+            print(
+                f"{profile:<8} {size / 1e6:>12.1f} "
+                f"{statistics.median(timings) * 1e3:>25.0f} {min(timings) * 1e3:>8.0f}"
+            )
+
+
+def run_docker(repeat: int) -> None:
+    print(f"{'WITH_EXCEL':<10} {'image Mo':>9} {'1re requête ms (médiane)':>25} {'min ms':>8}")
+    for with_excel in ("0", "1"):
+        tag = f"germina-survey-startup:excel{with_excel}"
+        subprocess.run(
+            [
+                "docker",
+                "build",
+                "-q",
+                "-t",
+                tag,
+                "--build-arg",
+                f"WITH_EXCEL={with_excel}",
+                "--build-arg",
+                f"Q_SCHEMA={(SURVEY_TEMPLATE_DIR / 'schema.json').read_text()}",
+                "--build-arg",
+                f"Q_UI_SCHEMA={(SURVEY_TEMPLATE_DIR / 'ui_schema.json').read_text()}",
+                "--build-arg",
+                "Q_ID=startup",
+                str(SURVEY_TEMPLATE_DIR),
+            ],
+            check=True,
+            stdout=subprocess.DEVNULL,
+        )
+        size = int(
+            subprocess.check_output(
+                ["docker", "image", "inspect", "--format", "{{.Size}}", tag], text=True
+            )
+        )
+        timings = []
+        for _ in range(repeat):
+            port = _free_port()
+            started_at = time.perf_counter()
+            container = subprocess.check_output(
+                ["docker", "run", "-d", "--rm", "-p", f"{port}:5000", tag], text=True
+            ).strip()
+            try:
+                timings.append(_wait_first_response(f"http://127.0.0.1:{port}/", started_at, 60))
+            finally:
+                subprocess.run(["docker", "stop", container], check=False, capture_output=True)
+        print(
+            f"{with_excel:<10} {size / 1e6:>9.1f} "
+            f"{statistics.median(timings) * 1e3:>25.0f} {min(timings) * 1e3:>8.0f}"
+        )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--profiles", default=",".join(PROFILES), help="profils à mesurer")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--docker", action="store_true", help="mesure les images Docker")
+    args = parser.parse_args()
+
+    if args.docker:
+        run_docker(args.repeat)
+    else:
+        run_local(args.profiles.split(","), args.repeat)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
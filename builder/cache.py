@@ -0,0 +1,233 @@
+import asyncio
+import hashlib
+import json
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi.logger import logger
+from gcp import copy_blob, read_json_blob, upload_image_bytes_to_gcp
+from workers import run_blocking
+
+# Configuration
+UPLOAD_CACHE_DIR: Path = Path(os.getenv("UPLOAD_CACHE_DIR", "/tmp/germina_upload_cache"))
+UPLOAD_CACHE_MAX_BYTES: int = int(os.getenv("UPLOAD_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+# Préfixe des marqueurs distants partagés entre instances du builder
+UPLOAD_CACHE_MARKER_PREFIX: str = "_cache"
+# À incrémenter quand le pipeline image change de sortie à paramètres égaux
+UPLOAD_CACHE_VERSION: int = 1
+
+ProcessedUpload = Tuple[Dict[str, Any], List[Dict[str, Any]], Dict[str, Any]]
+
+
+def cache_key(data: bytes, params: Dict[str, Any]) -> str:
+    """Clé de cache : sha256 du fichier brut et des paramètres de traitement."""
+    digest = hashlib.sha256(data)
+    digest.update(json.dumps({"v": UPLOAD_CACHE_VERSION, **params}, sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def manifest_objects(manifest: Dict[str, Any]) -> List[str]:
+    """Liste les objets image (pleine taille et variantes) référencés par un manifest."""
+    paths = [v["path"] for v in manifest.get("variants", [])]
+    if "full_size" in manifest:
+        paths.insert(0, manifest["full_size"]["path"])
+    return paths
+
+
+def rebase_manifest(manifest: Dict[str, Any], old_prefix: str, new_prefix: str) -> Dict[str, Any]:
+    """Réécrit les chemins d'un manifest d'un préfixe d'objets vers un autre."""
+    rebased = json.loads(json.dumps(manifest))
+    for variant in rebased.get("variants", []):
+        variant["path"] = new_prefix + variant["path"][len(old_prefix) :]
+    if "full_size" in rebased:
+        rebased["full_size"]["path"] = new_prefix
+    rebased["srcset"] = {
+        mime: srcset.replace(f"{old_prefix}/", f"{new_prefix}/")
+        for mime, srcset in rebased.get("srcset", {}).items()
+    }
+    return rebased
+
+
+class UploadCache:
+    """Cache des uploads traités, indexé par le contenu brut.
+
+    Deux niveaux :
+      - un LRU sur disque local (taille bornée par `max_bytes`) qui conserve le
+        résultat du pipeline image et le chemin des objets déjà uploadés ;
+      - un marqueur JSON dans le bucket (`_cache/<clé>.json`) partagé entre instances,
+        qui pointe vers les objets déjà uploadés.
+
+    Sur un hit, les objets sont copiés côté serveur vers le nouveau chemin : ni le
+    travail CPU ni le transfert GCS ne sont refaits. Si les objets source ont disparu,
+    le résultat local (s'il existe) évite au moins le travail CPU.
+    """
+
+    def __init__(self, directory: Path, max_bytes: int) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._size = 0
+        self._stats: Dict[str, int] = {
+            "local_hits": 0,
+            "remote_hits": 0,
+            "partial_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+        }
+        self._load_index()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.pkl"
+
+    def _load_index(self) -> None:
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            files = sorted(self.directory.glob("*.pkl"), key=lambda f: f.stat().st_mtime)
+        except OSError as e:
+            logger.error(f"Cache upload indisponible ({self.directory}): {e}")
+            return
+        for file in files:
+            size = file.stat().st_size
+            self._entries[file.stem] = size
+            self._size += size
+
+    def _evict(self) -> None:
+        while self._size > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self._size -= size
+            self._stats["evictions"] += 1
+            self._path(key).unlink(missing_ok=True)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Lit une entrée locale (`source`, `manifest`, `result`) et la marque récente."""
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                entry: Dict[str, Any] = pickle.load(f)
+            os.utime(path)
+            return entry
+        except Exception:
+            with self._lock:
+                self._size -= self._entries.pop(key, 0)
+            path.unlink(missing_ok=True)
+            return None
+
+    def put(self, key: str, entry: Dict[str, Any]) -> None:
+        """Écrit une entrée locale puis évince les plus anciennes au-delà de `max_bytes`."""
+        path = self._path(key)
+        tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+        try:
+            with open(tmp_path, "wb") as f:
+                pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.error(f"Écriture du cache upload impossible: {e}")
+            tmp_path.unlink(missing_ok=True)
+            return
+        with self._lock:
+            self._size -= self._entries.pop(key, 0)
+            self._entries[key] = path.stat().st_size
+            self._size += self._entries[key]
+            self._evict()
+
+    async def _copy_from(
+        self, key: str, source: str, destination: str, manifest: Dict[str, Any]
+    ) -> bool:
+        """Copie côté serveur les objets d'un manifest vers un nouveau préfixe.
+
+        Le manifest publié sous `source` doit encore porter `key` : sinon les objets
+        source ont été supprimés ou remplacés par un autre fichier depuis.
+        """
+        published = await run_blocking(read_json_blob, f"{source}/manifest.json")
+        if published is None or published.get("cache_key") != key:
+            return False
+        if source == destination:
+            return True
+        rebased = rebase_manifest(manifest, source, destination)
+        copies = await asyncio.gather(
+            *[
+                run_blocking(copy_blob, src, dst)
+                for src, dst in zip(manifest_objects(manifest), manifest_objects(rebased))
+            ]
+        )
+        return all(copies)
+
+    async def restore(
+        self, key: str, destination: str
+    ) -> Tuple[Optional[Dict[str, Any]], Optional[ProcessedUpload]]:
+        """Tente de servir un upload depuis le cache.
+
+        Args:
+            key (str): Clé retournée par `cache_key`.
+            destination (str): Préfixe des objets à produire dans le bucket.
+        Returns:
+            (manifest, None) si les objets sont disponibles sous `destination` (manifest
+            à uploader), (None, result) si seul le résultat du pipeline est réutilisable,
+            (None, None) sinon.
+        """
+        entry = await run_blocking(self.get, key)
+        marker = entry
+        if marker is None:
+            marker = await run_blocking(read_json_blob, f"{UPLOAD_CACHE_MARKER_PREFIX}/{key}.json")
+
+        if marker is not None and await self._copy_from(
+            key, marker["source"], destination, marker["manifest"]
+        ):
+            self._record("local_hits" if entry is not None else "remote_hits")
+            return rebase_manifest(marker["manifest"], marker["source"], destination), None
+
+        if entry is not None:
+            self._record("partial_hits")
+            return None, entry["result"]
+
+        self._record("misses")
+        return None, None
+
+    async def store(
+        self, key: str, destination: str, manifest: Dict[str, Any], result: ProcessedUpload
+    ) -> None:
+        """Enregistre un upload traité en local et publie le marqueur distant."""
+        await run_blocking(
+            self.put, key, {"source": destination, "manifest": manifest, "result": result}
+        )
+        await run_blocking(
+            upload_image_bytes_to_gcp,
+            json.dumps({"source": destination, "manifest": manifest}).encode("utf-8"),
+            f"{UPLOAD_CACHE_MARKER_PREFIX}/{key}.json",
+            content_type="application/json",
+        )
+
+    def _record(self, outcome: str) -> None:
+        with self._lock:
+            self._stats[outcome] += 1
+            stats = dict(self._stats)
+        logger.info(f"Cache upload: {outcome} (taux de hit {self._hit_rate(stats):.1%})")
+
+    @staticmethod
+    def _hit_rate(stats: Dict[str, int]) -> float:
+        hits = stats["local_hits"] + stats["remote_hits"] + stats["partial_hits"]
+        lookups = hits + stats["misses"]
+        return hits / lookups if lookups else 0.0
+
+    def stats(self) -> Dict[str, float]:
+        """Retourne un instantané des métriques du cache (dont `hit_rate`)."""
+        with self._lock:
+            return {
+                **self._stats,
+                "hit_rate": self._hit_rate(self._stats),
+                "entries": len(self._entries),
+                "size_bytes": self._size,
+                "max_bytes": self.max_bytes,
+            }
+
+
+upload_cache = UploadCache(UPLOAD_CACHE_DIR, UPLOAD_CACHE_MAX_BYTES)
@@ -1,21 +1,38 @@
+import asyncio
+import base64
+import hashlib
 import json
+import mimetypes
 import os
 import shutil
 import tarfile
 import tempfile
+import threading
+import time
+from functools import lru_cache
 from io import BytesIO
 from pathlib import Path
-from typing import Any, Dict, List, Tuple, Union
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union, cast
 
+import google_crc32c
 from fastapi import HTTPException
 from fastapi.logger import logger
 from google.api_core import exceptions as gcp_exceptions
 from google.api_core.client_options import ClientOptions
 from google.cloud import artifactregistry_v1 as ar
 from google.cloud import logging as cloud_logging
-from google.cloud import storage
 from google.cloud.devtools import cloudbuild_v1
+from google.cloud.storage import Bucket
 from google.cloud.storage import Client as StorageClient
+from google.cloud.storage.retry import DEFAULT_RETRY
+from local_backends import (
+    USE_LOCAL_BACKENDS,
+    get_local_build_runner,
+    get_local_registry,
+    get_local_storage,
+)
+from metrics import BYTES, upstream
+from workers import UPSTREAM_TIMEOUT, run_blocking, with_timeout
 
 # Configuration
 GCP_PROJECT: str = os.getenv("GCP_PROJECT", "")
@@ -23,97 +40,325 @@ GCR_LOCATION: str = os.getenv("GCR_LOCATION", "")
 GCR_REPOSITORY: str = os.getenv("GCR_REPOSITORY", "")
 GCR_REPO_PATH: str = f"{GCR_LOCATION}-docker.pkg.dev/{GCP_PROJECT}/{GCR_REPOSITORY}"
 SURVEY_TEMPLATE_BUCKET: str = os.getenv("SURVEY_TEMPLATE_BUCKET", "")
+# Taille des chunks d'upload résumable (multiple de 256 Kio)
+GCS_UPLOAD_CHUNK_SIZE: int = int(os.getenv("GCS_UPLOAD_CHUNK_SIZE", str(8 * 1024 * 1024)))
+# Délai maximal (secondes) d'attente de la fin d'un build Cloud Build
+BUILD_TIMEOUT: float = float(os.getenv("BUILD_TIMEOUT", "1200"))
+# Délai maximal (secondes) d'attente de la fin d'une suppression de package Artifact Registry
+DELETE_TIMEOUT: float = float(os.getenv("DELETE_TIMEOUT", "600"))
+# "1" : image questionnaire avec openpyxl (export .xlsx)
+SURVEY_WITH_EXCEL: str = os.getenv("SURVEY_WITH_EXCEL", "0")
+# Nombre maximal de suppressions de packages menées en parallèle
+DELETE_CONCURRENCY: int = int(os.getenv("DELETE_CONCURRENCY", "10"))
+AR_PARENT: str = f"projects/{GCP_PROJECT}/locations/{GCR_LOCATION}/repositories/{GCR_REPOSITORY}"
 
 ALLOWED_IMAGE_MIMES = {"image/png", "image/jpeg", "image/jpg"}
 ALLOWED_EXTS = {".png", ".jpg", ".jpeg"}
 
-# Initialize Cloud Logging
-cloud_logging_client = cloud_logging.Client()
-cloud_logging_client.setup_logging()
+# Initialize Cloud Logging (pas de credentials en mode local)
+if not USE_LOCAL_BACKENDS:
+    cloud_logging_client = cloud_logging.Client()
+    cloud_logging_client.setup_logging()
 
 
-def get_user_images(image_prefix: str) -> List[ar.DockerImage]:
+@lru_cache(maxsize=None)
+def get_ar_client() -> ar.ArtifactRegistryAsyncClient:
+    """Client Artifact Registry async partagé (à appeler depuis la boucle d'événements).
+
+    Registre en mémoire si GERMINA_BACKEND=local.
+    """
+    if USE_LOCAL_BACKENDS:
+        return cast(ar.ArtifactRegistryAsyncClient, get_local_registry())
+    return ar.ArtifactRegistryAsyncClient()
+
+
+@lru_cache(maxsize=None)
+def get_cloud_build_client() -> cloudbuild_v1.CloudBuildAsyncClient:
+    """Client Cloud Build async partagé, sur l'endpoint régional.
+
+    Build factice (publie l'image dans le registre local) si GERMINA_BACKEND=local.
+    """
+    if USE_LOCAL_BACKENDS:
+        return cast(cloudbuild_v1.CloudBuildAsyncClient, get_local_build_runner())
+    opts = ClientOptions(api_endpoint=f"{GCR_LOCATION}-cloudbuild.googleapis.com")
+    return cloudbuild_v1.CloudBuildAsyncClient(client_options=opts)
+
+
+async def get_user_images(image_prefix: str) -> List[ar.DockerImage]:
     """Récupère les images Docker de l'utilisateur depuis Artifact Registry
     Args:
         image_prefix (str): Le préfixe des noms d'images à rechercher.
     Returns:
         list: Une liste d'objets DockerImage correspondant au préfixe donné.
     Raises:
-        HTTPException: Si une erreur se produit lors de la récupération des images.
+        HTTPException: Si une erreur se produit lors de la récupération des images,
+            504 si Artifact Registry ne répond pas à temps.
     """
-    client = ar.ArtifactRegistryClient()
-    parent: str = f"projects/{GCP_PROJECT}/locations/{GCR_LOCATION}/repositories/{GCR_REPOSITORY}"
-    images: List[ar.DockerImage] = []
-    try:
-        request = ar.ListDockerImagesRequest(parent=parent)
-        for image in client.list_docker_images(request=request):
+    client = get_ar_client()
+
+    async def _list() -> List[ar.DockerImage]:
+        images: List[ar.DockerImage] = []
+        request = ar.ListDockerImagesRequest(parent=AR_PARENT)
+        pager = await client.list_docker_images(request=request, timeout=UPSTREAM_TIMEOUT)
+        async for image in pager:
             name = image.uri.split("/")[-1].split(":")[0]
             if name.startswith(image_prefix):
                 images.append(image)
+        return images
+
+    try:
+        with upstream("ar_list_docker_images"):
+            return await with_timeout(_list(), "Artifact Registry list_docker_images")
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Erreur Artifact Registry: {e}")
         raise HTTPException(status_code=500, detail="Erreur de listing des images")
 
-    return images
+
+@lru_cache(maxsize=None)
+def get_storage_client() -> StorageClient:
+    """Client Cloud Storage partagé (connexions HTTP réutilisées entre appels).
+
+    Buckets sur le système de fichiers (LOCAL_STORAGE_DIR) si GERMINA_BACKEND=local.
+    """
+    if USE_LOCAL_BACKENDS:
+        return cast(StorageClient, get_local_storage())
+    return StorageClient()
+
+
+_storage_stats: Dict[str, float] = {
+    "uploads": 0,
+    "skipped": 0,
+    "failed": 0,
+    "bytes_sent": 0,
+    "seconds_total": 0.0,
+}
+_storage_stats_lock = threading.Lock()
+
+
+def get_storage_stats() -> Dict[str, float]:
+    """Retourne un instantané des métriques d'upload GCS."""
+    with _storage_stats_lock:
+        return dict(_storage_stats)
+
+
+def _record_upload(outcome: str, bytes_sent: int, seconds: float) -> None:
+    with _storage_stats_lock:
+        _storage_stats[outcome] += 1
+        _storage_stats["bytes_sent"] += bytes_sent
+        _storage_stats["seconds_total"] += seconds
+
+
+def _content_type(extension: str) -> str:
+    guessed, _ = mimetypes.guess_type(f"file.{extension}")
+    return guessed or f"image/{extension}"
+
+
+def _upload_bytes(bucket: Bucket, blob_name: str, data: bytes, content_type: str) -> Dict[str, Any]:
+    """Upload dédupliqué : saute l'envoi si l'objet distant a déjà le même contenu.
+
+    L'écriture est conditionnée à la génération lue (0 si l'objet n'existe pas) : une
+    écriture concurrente fait échouer la précondition et on relit l'objet.
+    """
+    md5 = base64.b64encode(hashlib.md5(data).digest()).decode("ascii")
+    crc32c = base64.b64encode(google_crc32c.Checksum(data).digest()).decode("ascii")
+    for _ in range(3):
+        existing = bucket.get_blob(blob_name, retry=DEFAULT_RETRY, timeout=UPSTREAM_TIMEOUT)
+        if existing is not None and crc32c == existing.crc32c and md5 == existing.md5_hash:
+            return {"uploaded": False, "bytes_sent": 0, "generation": existing.generation}
+
+        blob = bucket.blob(
+            blob_name,
+            chunk_size=GCS_UPLOAD_CHUNK_SIZE if len(data) > GCS_UPLOAD_CHUNK_SIZE else None,
+        )
+        try:
+            blob.upload_from_file(
+                BytesIO(data),
+                size=len(data),
+                content_type=content_type,
+                checksum="crc32c",
+                if_generation_match=existing.generation if existing is not None else 0,
+                retry=DEFAULT_RETRY,
+                timeout=UPSTREAM_TIMEOUT,
+            )
+            return {"uploaded": True, "bytes_sent": len(data), "generation": blob.generation}
+        except gcp_exceptions.PreconditionFailed:
+            continue
+    raise gcp_exceptions.PreconditionFailed(f"Écritures concurrentes sur {blob_name}")
+
+
+def _upload_stream(
+    bucket: Bucket, blob_name: str, chunks: Iterable[bytes], content_type: str
+) -> Dict[str, Any]:
+    """Upload résumable par chunks d'un flux, sans le matérialiser en mémoire."""
+    blob = bucket.blob(blob_name)
+    bytes_sent = 0
+    with blob.open(
+        "wb",
+        chunk_size=GCS_UPLOAD_CHUNK_SIZE,
+        content_type=content_type,
+        retry=DEFAULT_RETRY,
+    ) as writer:
+        for chunk in chunks:
+            writer.write(chunk)
+            bytes_sent += len(chunk)
+    return {"uploaded": True, "bytes_sent": bytes_sent, "generation": blob.generation}
 
 
 def upload_image_bytes_to_gcp(
-    image_bytes: bytes,
+    image_bytes: Union[bytes, Iterable[bytes]],
     destination_blob_name: str,
     extension: str = "jpg",
     bucket_name: str = SURVEY_TEMPLATE_BUCKET,
+    content_type: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Upload un objet dans le bucket.
+
+    - `bytes` : l'envoi est sauté si l'objet distant a déjà le même MD5/CRC32C, sinon
+      l'écriture est conditionnée à la génération distante ; au-delà de
+      GCS_UPLOAD_CHUNK_SIZE l'upload est résumable et découpé en chunks.
+    - itérable de `bytes` : le flux est écrit directement dans un upload résumable.
+    Les erreurs transitoires sont réessayées avec backoff exponentiel.
+
+    Args:
+        image_bytes (bytes | Iterable[bytes]): Contenu ou flux de contenu à uploader.
+        destination_blob_name (str): Chemin de l'objet dans le bucket.
+        extension (str): Extension servant à déduire le content-type.
+        bucket_name (str): Bucket de destination.
+        content_type (str): Content-type explicite (prioritaire sur `extension`).
+    Returns:
+        dict: `uploaded` (False si dédupliqué), `bytes_sent`, `generation`, `seconds`.
+    Raises:
+        HTTPException: 502 si GCS renvoie une erreur.
+    """
+    started_at = time.perf_counter()
+    content_type = content_type or _content_type(extension)
+    bucket = get_storage_client().bucket(bucket_name)
+    try:
+        with upstream("gcs_upload"):
+            if isinstance(image_bytes, (bytes, bytearray, memoryview)):
+                data = bytes(image_bytes)
+                result = _upload_bytes(bucket, destination_blob_name, data, content_type)
+            else:
+                result = _upload_stream(bucket, destination_blob_name, image_bytes, content_type)
+    except gcp_exceptions.GoogleAPIError as ex:
+        _record_upload("failed", 0, time.perf_counter() - started_at)
+        logger.error(f"Erreur GCP lors de l'upload de {bucket_name}/{destination_blob_name}: {ex}")
+        raise HTTPException(status_code=502, detail=f"Erreur GCP lors de l'upload : {str(ex)}")
+
+    result["seconds"] = time.perf_counter() - started_at
+    BYTES.inc("gcs_sent", amount=result["bytes_sent"])
+    _record_upload(
+        "uploads" if result["uploaded"] else "skipped", result["bytes_sent"], result["seconds"]
+    )
+    logger.info(
+        f"{bucket_name}/{destination_blob_name}: "
+        f"{'uploadé' if result['uploaded'] else 'inchangé'}, "
+        f"{result['bytes_sent']} octets en {result['seconds']:.3f}s"
+    )
+    return result
+
+
+def copy_blob(
+    source_blob_name: str,
+    destination_blob_name: str,
+    bucket_name: str = SURVEY_TEMPLATE_BUCKET,
 ) -> bool:
-    """Uploads a file to the bucket."""
+    """Copie un objet côté serveur (sans transfert de données via le builder).
+
+    Args:
+        source_blob_name (str): Chemin de l'objet source.
+        destination_blob_name (str): Chemin de l'objet destination.
+        bucket_name (str): Bucket source et destination.
+    Returns:
+        bool: True si la copie a réussi, False si la source n'existe pas ou en cas d'erreur.
+    """
     try:
-        storage_client = storage.Client()
-        bucket = storage_client.get_bucket(bucket_name)
-        blob = bucket.blob(destination_blob_name)
-        blob.upload_from_file(BytesIO(image_bytes), content_type=f"image/{extension}")
-        print(f"File {destination_blob_name} uploaded to {bucket_name}.")
+        bucket = get_storage_client().bucket(bucket_name)
+        with upstream("gcs_copy"):
+            bucket.copy_blob(
+                bucket.blob(source_blob_name),
+                bucket,
+                destination_blob_name,
+                retry=DEFAULT_RETRY,
+                timeout=UPSTREAM_TIMEOUT,
+            )
         return True
+    except gcp_exceptions.NotFound:
+        return False
     except Exception as e:
-        print(e)
+        logger.error(f"Erreur copie {source_blob_name} -> {destination_blob_name}: {e}")
         return False
 
 
-def delete_package_from_package_name(package_name: str) -> Union[str, Dict[str, str]]:
-    """Supprime un package complet dans Artifact Registry
+def read_json_blob(
+    blob_name: str, bucket_name: str = SURVEY_TEMPLATE_BUCKET
+) -> Optional[Dict[str, Any]]:
+    """Lit un objet JSON du bucket. Retourne None s'il n'existe pas ou est illisible."""
+    try:
+        blob = get_storage_client().bucket(bucket_name).blob(blob_name)
+        with upstream("gcs_read"):
+            data = blob.download_as_bytes(retry=DEFAULT_RETRY, timeout=UPSTREAM_TIMEOUT)
+        return cast(Dict[str, Any], json.loads(data))
+    except gcp_exceptions.NotFound:
+        return None
+    except Exception as e:
+        logger.error(f"Erreur lecture {bucket_name}/{blob_name}: {e}")
+        return None
+
+
+async def delete_package_from_package_name(package_name: str) -> Union[str, Dict[str, str]]:
+    """Supprime un package complet dans Artifact Registry et son template dans GCS.
+
+    Les suppressions GCS et Artifact Registry sont lancées en parallèle ; l'absence du
+    package est détectée par la suppression elle-même (pas de `get_package` préalable).
+
     Args:
         package_name (str): Le nom du package à supprimer.
     Returns:
-        str: Un message de succès si la suppression est réussie.
+        str | dict: "no_images_found" si le package n'existe pas, sinon le statut.
     Raises:
-        HTTPException: Si package n'existe pas ou si une erreur se produit lors de suppression.
+        HTTPException: Si une erreur se produit lors de la suppression.
     """
-    client = ar.ArtifactRegistryClient()
-    pkg_path: str = (
-        f"projects/{GCP_PROJECT}/"
-        f"locations/{GCR_LOCATION}/"
-        f"repositories/{GCR_REPOSITORY}/"
-        f"packages/{package_name}"
+    _, _, deleted = await asyncio.gather(
+        run_blocking(delete_blob_image_if_exists, object_path=package_name),
+        run_blocking(delete_blobs_with_prefix, prefix=f"{package_name}/"),
+        delete_ar_package(package_name),
     )
+    if not deleted:
+        return "no_images_found"
+    return {"status": "success", "deleted_package": package_name}
 
-    delete_blob_image_if_exists(object_path=package_name)
 
-    try:
-        client.get_package(name=pkg_path)
-    except gcp_exceptions.NotFound:
-        logger.error(f"Aucun package trouvé : {pkg_path}")
-        return "no_images_found"
-    except gcp_exceptions.PermissionDenied as e:
-        logger.error(f"PermissionDenied get_package({pkg_path}): {e}")
-        raise HTTPException(status_code=403, detail="Permission refusée pour get_package")
-    except Exception as e:
-        logger.error(f"Erreur get_package({pkg_path}): {type(e).__name__} {e}")
-        raise HTTPException(
-            status_code=500, detail="Erreur interne lors de la vérification du package"
-        )
+async def delete_ar_package(package_name: str) -> bool:
+    """Supprime un package Artifact Registry et attend la fin de l'opération.
 
+    Args:
+        package_name (str): Le nom du package à supprimer.
+    Returns:
+        bool: True si le package a été supprimé, False s'il n'existait pas.
+    Raises:
+        HTTPException: Si une erreur se produit lors de la suppression.
+    """
+    client = get_ar_client()
+    pkg_path: str = f"{AR_PARENT}/packages/{package_name}"
     try:
-        op = client.delete_package(name=pkg_path)
-        op.result()
-        logger.info(f"✅ Package supprimé : {pkg_path}")
-        return {"status": "success", "deleted_package": package_name}
+        with upstream("ar_delete_package"):
+            op = await with_timeout(
+                client.delete_package(name=pkg_path, timeout=UPSTREAM_TIMEOUT),
+                "Artifact Registry delete_package",
+            )
+            await with_timeout(
+                op.result(), "Artifact Registry delete_package (opération)", DELETE_TIMEOUT
+            )
+        logger.info(f"✅ Package supprimé : {pkg_path}")
+        return True
+    except HTTPException:
+        raise
+    except gcp_exceptions.NotFound:
+        logger.info(f"Aucun package trouvé : {pkg_path}")
+        return False
     except gcp_exceptions.PermissionDenied as e:
         logger.error(f"PermissionDenied delete_package({pkg_path}): {e}")
         raise HTTPException(status_code=403, detail="Permission refusée pour delete_package")
@@ -124,25 +369,77 @@ def delete_package_from_package_name(package_name: str) -> Union[str, Dict[str,
         )
 
 
+async def list_user_packages(package_prefix: str) -> List[str]:
+    """Liste les noms des packages Artifact Registry commençant par un préfixe.
+
+    Args:
+        package_prefix (str): Le préfixe des noms de packages (ex: "user_<id>_q_").
+    Returns:
+        list: Les noms courts des packages.
+    Raises:
+        HTTPException: Si une erreur se produit lors du listing.
+    """
+    client = get_ar_client()
+
+    async def _list() -> List[str]:
+        names: List[str] = []
+        pager = await client.list_packages(parent=AR_PARENT, timeout=UPSTREAM_TIMEOUT)
+        async for package in pager:
+            name = package.name.split("/")[-1]
+            if name.startswith(package_prefix):
+                names.append(name)
+        return names
+
+    try:
+        with upstream("ar_list_packages"):
+            return await with_timeout(_list(), "Artifact Registry list_packages")
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Erreur Artifact Registry: {e}")
+        raise HTTPException(status_code=500, detail="Erreur de listing des packages")
+
+
+async def delete_packages(package_names: List[str]) -> Dict[str, Any]:
+    """Supprime plusieurs packages (et leurs templates) en parallèle.
+
+    Au plus DELETE_CONCURRENCY suppressions sont en vol simultanément.
+
+    Args:
+        package_names (list): Les noms des packages à supprimer.
+    Returns:
+        dict: Par package, "deleted", "no_images_found" ou le détail de l'erreur.
+    """
+    semaphore = asyncio.Semaphore(DELETE_CONCURRENCY)
+
+    async def _delete(package_name: str) -> str:
+        async with semaphore:
+            try:
+                result = await delete_package_from_package_name(package_name)
+            except HTTPException as e:
+                return f"error: {e.detail}"
+            return "no_images_found" if result == "no_images_found" else "deleted"
+
+    results = await asyncio.gather(*[_delete(name) for name in package_names])
+    return dict(zip(package_names, results))
+
+
 def delete_blob_image_if_exists(object_path: str) -> bool:
     """
     Supprime un blob s'il existe. Retourne True si un blob a été supprimé, False sinon.
+    La suppression est tentée directement (pas d'appel `exists()` préalable).
     """
     try:
-        storage_client = StorageClient()
-        bucket = storage_client.bucket(SURVEY_TEMPLATE_BUCKET)
-        blob = bucket.blob(object_path)
-        if blob.exists(client=storage_client):
-            logger.info(
-                f"Objet trouvé dans {SURVEY_TEMPLATE_BUCKET}/{object_path}"
-                "suppression avant upload."
-            )
-            blob.delete(client=storage_client)
-            return True
+        bucket = get_storage_client().bucket(SURVEY_TEMPLATE_BUCKET)
+        with upstream("gcs_delete"):
+            bucket.blob(object_path).delete(retry=DEFAULT_RETRY, timeout=UPSTREAM_TIMEOUT)
+        logger.info(f"Objet supprimé : {SURVEY_TEMPLATE_BUCKET}/{object_path}")
+        return True
+    except gcp_exceptions.NotFound:
         return False
     except gcp_exceptions.GoogleAPIError as ex:
         logger.error(
-            "Erreur GCP lors de la vérification/suppression du blob"
+            "Erreur GCP lors de la suppression du blob "
             f"{SURVEY_TEMPLATE_BUCKET}/{object_path}: {ex}"
         )
         # remonter une erreur 502 pour les erreurs GCP (cohérent avec le reste du fichier)
@@ -159,6 +456,69 @@ def delete_blob_image_if_exists(object_path: str) -> bool:
         )
 
 
+def list_template_names(prefix: str) -> List[str]:
+    """Liste les templates (objets de premier niveau et dossiers de variantes) sous un préfixe.
+
+    Args:
+        prefix (str): Le préfixe des noms de templates (ex: "user_<id>_q_").
+    Returns:
+        list: Les noms de templates, sans le "/" final des dossiers.
+    Raises:
+        HTTPException: 502 en cas d'erreur GCP.
+    """
+    try:
+        with upstream("gcs_list"):
+            iterator = get_storage_client().list_blobs(
+                SURVEY_TEMPLATE_BUCKET,
+                prefix=prefix,
+                delimiter="/",
+                retry=DEFAULT_RETRY,
+                timeout=UPSTREAM_TIMEOUT,
+            )
+            names = {blob.name for blob in iterator}
+        names.update(p.rstrip("/") for p in iterator.prefixes)
+        return sorted(names)
+    except gcp_exceptions.GoogleAPIError as ex:
+        logger.error(f"Erreur GCP lors du listing {SURVEY_TEMPLATE_BUCKET}/{prefix}*: {ex}")
+        raise HTTPException(status_code=502, detail=f"Erreur GCP lors du listing : {str(ex)}")
+
+
+def delete_blobs_with_prefix(prefix: str) -> int:
+    """
+    Supprime tous les blobs sous un préfixe (variantes responsive d'un template).
+    Retourne le nombre de blobs supprimés.
+    """
+    try:
+        storage_client = get_storage_client()
+        with upstream("gcs_delete_prefix"):
+            blobs = list(
+                storage_client.list_blobs(
+                    SURVEY_TEMPLATE_BUCKET,
+                    prefix=prefix,
+                    retry=DEFAULT_RETRY,
+                    timeout=UPSTREAM_TIMEOUT,
+                )
+            )
+            for blob in blobs:
+                try:
+                    blob.delete(
+                        if_generation_match=blob.generation,
+                        retry=DEFAULT_RETRY,
+                        timeout=UPSTREAM_TIMEOUT,
+                    )
+                except (gcp_exceptions.NotFound, gcp_exceptions.PreconditionFailed):
+                    pass
+        return len(blobs)
+    except gcp_exceptions.GoogleAPIError as ex:
+        logger.error(
+            "Erreur GCP lors de la suppression des blobs "
+            f"{SURVEY_TEMPLATE_BUCKET}/{prefix}*: {ex}"
+        )
+        raise HTTPException(
+            status_code=502, detail=f"Erreur GCP lors de la suppression des variantes : {str(ex)}"
+        )
+
+
 def prepare_build_context(qid: str, user_id: str) -> str:
     """Prépare et upload le contexte de build vers GCS
     Args:
@@ -177,14 +537,16 @@ def prepare_build_context(qid: str, user_id: str) -> str:
         archive_path = Path(tmp_dir) / archive_name
         with tarfile.open(archive_path, "w:gz") as tar:
             tar.add(build_dir, arcname="custom_build_context")
-        bucket = StorageClient().bucket("germina-build-context")
-        blob = bucket.blob(archive_name)
-        blob.upload_from_filename(str(archive_path))
+        bucket = get_storage_client().bucket("germina-build-context")
+        blob = bucket.blob(archive_name, chunk_size=GCS_UPLOAD_CHUNK_SIZE)
+        with upstream("gcs_upload_build_context"):
+            blob.upload_from_filename(str(archive_path), retry=DEFAULT_RETRY)
+        BYTES.inc("gcs_sent", amount=archive_path.stat().st_size)
 
     return archive_name
 
 
-def launch_build(user_id: str, qid: str, payload: Any) -> Dict[str, Any]:
+async def launch_build(user_id: str, qid: str, payload: Any) -> Dict[str, Any]:
     """Lance le build via Google Cloud Build
     Args:
         user_id (str): L'ID de l'utilisateur.
@@ -195,9 +557,8 @@ def launch_build(user_id: str, qid: str, payload: Any) -> Dict[str, Any]:
     Raises:
         HTTPException: Si une erreur se produit lors du lancement du build.
     """
-    context_obj: str = prepare_build_context(qid, user_id)
-    opts = ClientOptions(api_endpoint=f"{GCR_LOCATION}-cloudbuild.googleapis.com")
-    cb_client = cloudbuild_v1.CloudBuildClient(client_options=opts)
+    context_obj: str = await run_blocking(prepare_build_context, qid, user_id)
+    cb_client = get_cloud_build_client()
 
     image_name = f"user_{user_id}_q_{qid}:latest"
     full_tag: str = f"{GCR_REPO_PATH}/{image_name}"
@@ -218,6 +579,8 @@ def launch_build(user_id: str, qid: str, payload: Any) -> Dict[str, Any]:
                     f"Q_ID={qid}",
                     "--build-arg",
                     f"Q_TITLE={payload.title}",
+                    "--build-arg",
+                    f"WITH_EXCEL={SURVEY_WITH_EXCEL}",
                     ".",
                 ],
                 dir="custom_build_context",
@@ -235,8 +598,15 @@ def launch_build(user_id: str, qid: str, payload: Any) -> Dict[str, Any]:
 
     try:
         logger.info(f"Lancement du build pour {full_tag}...")
-        op = cb_client.create_build(project_id=GCP_PROJECT, build=build)
-        res = op.result()
+        with upstream("cloudbuild_create_build"):
+            op = await with_timeout(
+                cb_client.create_build(
+                    project_id=GCP_PROJECT, build=build, timeout=UPSTREAM_TIMEOUT
+                ),
+                "Cloud Build create_build",
+            )
+        with upstream("cloudbuild_result"):
+            res = await with_timeout(op.result(), "Cloud Build (résultat)", BUILD_TIMEOUT)
         logger.info(f"Statut du build : {res.status}")
         if res.status == cloudbuild_v1.Build.Status.SUCCESS:
             return {"status": "success", "image": full_tag}
@@ -267,6 +637,11 @@ def generate_deploy_script(
         f"-v {volume_path}:/app/data -p {local_port}:5000 "
         f"--name germina_survey_local {image_full}"
     )
+    token_hint = (
+        f"Réponses et pièces jointes (http://localhost:{local_port}/responses, "
+        "/attachments.zip) : token via "
+        "docker exec germina_survey_local python app.py admin-token"
+    )
 
     if os == "linux":
         script = f"""#!/bin/bash
@@ -278,6 +653,7 @@ def generate_deploy_script(
         fi
         {run_cmd}
         echo "Accès : http://localhost:{local_port}"
+        echo "{token_hint}"
         """
         ext = "sh"
     elif os == "mac":
@@ -290,6 +666,7 @@ def generate_deploy_script(
         fi
         {run_cmd}
         echo "Accès : http://localhost:{local_port}"
+        echo "{token_hint}"
         """
         ext = "sh"
     else:  # windows
@@ -301,6 +678,7 @@ def generate_deploy_script(
         }}
         {run_cmd}
         Write-Host "Accès : http://localhost:{local_port}"
+        Write-Host "{token_hint}"
         """
         ext = "ps1"
     return script, ext
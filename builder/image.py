@@ -1,48 +1,137 @@
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
-from typing import Any, Dict, Literal, Optional, Tuple, cast
+from typing import Any, Dict, List, Literal, Optional, Sequence, Tuple, Union, cast
 
 import cv2
 import fitz
 import numpy as np
 import numpy.typing as npt
 from fastapi import HTTPException, UploadFile
-from imagecodecs import jpegxl_encode
+from imagecodecs import jpegxl_decode, jpegxl_encode
+from metrics import BYTES, IMAGE_STAGE_SECONDS
 from PIL import Image
 
+Encoder = Literal["jpg", "png", "webp", "jxl", "jxl_lossless"]
+
+ENCODER_EXTENSIONS: Dict[str, str] = {
+    "jpg": "jpg",
+    "png": "png",
+    "webp": "webp",
+    "jxl": "jxl",
+    "jxl_lossless": "jxl",
+}
+ENCODER_MIME_TYPES: Dict[str, str] = {
+    "jpg": "image/jpeg",
+    "png": "image/png",
+    "webp": "image/webp",
+    "jxl": "image/jxl",
+    "jxl_lossless": "image/jxl",
+}
+
+# Variantes responsive générées à chaque upload (largeurs en px × encodeurs)
+UPLOAD_VARIANT_WIDTHS: List[int] = [
+    int(w) for w in os.getenv("UPLOAD_VARIANT_WIDTHS", "480,960,1920").split(",") if w.strip()
+]
+UPLOAD_VARIANT_FORMATS: List[str] = [
+    f.strip() for f in os.getenv("UPLOAD_VARIANT_FORMATS", "webp,jpg").split(",") if f.strip()
+]
+if not set(UPLOAD_VARIANT_FORMATS) <= set(ENCODER_EXTENSIONS):
+    raise ValueError(f"UPLOAD_VARIANT_FORMATS invalide: {UPLOAD_VARIANT_FORMATS}")
+# Chemin d'une variante : `<largeur>w.<extension>`, donc une extension par encodeur
+if len({ENCODER_EXTENSIONS[f] for f in UPLOAD_VARIANT_FORMATS}) < len(UPLOAD_VARIANT_FORMATS):
+    raise ValueError(
+        f"UPLOAD_VARIANT_FORMATS invalide: {UPLOAD_VARIANT_FORMATS} "
+        "(un seul encodeur par extension, ex: jxl ou jxl_lossless)"
+    )
+
+# Threads d'encodage par image : variantes encodées en parallèle, et threads libjxl par
+# encodage. Les workers du pool d'images les réduisent (voir `set_encode_threads`).
+ENCODE_THREADS: int = os.cpu_count() or 1
+JXL_THREADS: int = os.cpu_count() or 1
+
+# Sélection automatique de l'encodeur (encoder="auto")
+AUTO_MIN_SSIM: float = float(os.getenv("AUTO_MIN_SSIM", "0.95"))
+AUTO_MAX_BYTES: Optional[int] = int(os.getenv("AUTO_MAX_BYTES", "0")) or None
+AUTO_TIME_BUDGET: float = float(os.getenv("AUTO_TIME_BUDGET", "2.0"))
+# Encodeur de l'image pleine taille : "source" (png pour un PNG, jpg sinon), un encodeur
+# fixe, ou "auto" (opt-in : l'objet canonique peut alors être en WebP ou JPEG XL)
+UPLOAD_ENCODER: str = os.getenv("UPLOAD_ENCODER", "source")
+if UPLOAD_ENCODER not in ("source", "auto") and UPLOAD_ENCODER not in ENCODER_EXTENSIONS:
+    raise ValueError(f"UPLOAD_ENCODER invalide: {UPLOAD_ENCODER}")
+
+# Candidats (encodeur, qualité) essayés dans l'ordre, du moins au plus coûteux.
+# Une qualité > 100 demande à OpenCV un WebP sans perte.
+AUTO_CANDIDATES: Dict[str, List[Tuple[Encoder, Optional[int]]]] = {
+    "document": [
+        ("png", None),
+        ("jpg", 90),
+        ("webp", 90),
+        ("webp", 101),
+        ("jxl_lossless", None),
+    ],
+    "photo": [
+        ("jpg", 85),
+        ("webp", 80),
+        ("jpg", 75),
+        ("webp", 70),
+        ("jxl", 85),
+        ("jxl", 75),
+        ("jpg", 92),
+    ],
+}
+
 
 def encode_image_array(
     image_array: npt.NDArray[Any],
-    encoder: Literal["jpg", "png", "jxl", "jxl_lossless"] = "png",
+    encoder: Union[Encoder, Literal["auto"]] = "png",
     color_space: Literal["RGB", "BGR"] = "RGB",
+    quality: Optional[int] = None,
 ) -> bytes:
     """Encode image array to bytes.
 
-    Input image range supposed to be 0-1 for `jpg`|`png` encoder.
+    Input image range supposed to be 0-1 for `jpg`|`png`|`webp` encoder.
 
     Args:
         image_array (numpy.ndarray): image array
-        format (str): image format, can be 'png' or 'jpg'
+        encoder (str): image format, can be 'png', 'jpg', 'webp', 'jxl', 'jxl_lossless'
+            or 'auto' (see `select_encoding`, with AUTO_* defaults)
+        color_space (str): color space of the array, 'RGB' or 'BGR'
+        quality (int): jpg/webp quality or jxl level. Defaults to the encoder default.
 
     Returns:
         bytes: image buffer
     """
+    if encoder == "auto":
+        return cast(bytes, select_encoding(image_array, color_space=color_space)["data"])
+
+    started_at = time.perf_counter()
     if encoder == "jxl" or encoder == "jxl_lossless":
         if image_array.dtype not in [np.uint8, np.uint16]:
             image_array = image_array.astype(np.uint16, casting="safe")
+        if color_space == "BGR" and image_array.ndim == 3 and image_array.shape[-1] in (3, 4):
+            image_array = image_array[..., [2, 1, 0, 3][: image_array.shape[-1]]]
         if encoder == "jxl":
-            level = 99
+            level = 99 if quality is None else quality
         elif encoder == "jxl_lossless":
             level = 100
-        return _encode_jpeg_xl(image_array, effort=3, level=level, lossless=level == 100)
+        data = _encode_jpeg_xl(image_array, effort=3, level=level, lossless=level == 100)
+    else:
+        data = _encode_with_opencv(
+            image_array, encoder=encoder, color_space=color_space, quality=quality
+        )
 
-    return _encode_with_opencv(image_array, encoder=encoder, color_space=color_space)
+    IMAGE_STAGE_SECONDS.observe(time.perf_counter() - started_at, "encode", encoder)
+    BYTES.inc("image_encoded", amount=len(data))
+    return data
 
 
 def _encode_with_opencv(
     image_array: npt.NDArray[Any],
-    encoder: Literal["jpg", "png"] = "png",
+    encoder: Literal["jpg", "png", "webp"] = "png",
     color_space: Literal["RGB", "BGR"] = "RGB",
+    quality: Optional[int] = None,
 ) -> bytes:
     image_array = cast_image(image_array, dtype="uint8")
 
@@ -61,14 +150,140 @@ def _encode_with_opencv(
         return cv2.imencode(
             ".jpg",
             image_array,
-            params=[cv2.IMWRITE_JPEG_QUALITY, 95],
+            params=[cv2.IMWRITE_JPEG_QUALITY, 95 if quality is None else quality],
         )[1].tobytes()
     elif encoder == "png":
         return cv2.imencode(".png", image_array, params=[cv2.IMWRITE_PNG_COMPRESSION, 3])[
             1
         ].tobytes()
+    elif encoder == "webp":
+        return cv2.imencode(
+            ".webp",
+            image_array,
+            params=[cv2.IMWRITE_WEBP_QUALITY, 85 if quality is None else quality],
+        )[1].tobytes()
+
+    raise Exception("Unrecognized image format: Please choose either 'png'/ 'jpg'/ 'webp'")
+
+
+def classify_content(image_array: npt.NDArray[Any]) -> Literal["document", "photo"]:
+    """Classe grossièrement une image en `document` (aplats, texte scanné) ou `photo`.
+
+    Sur une vignette quantifiée, un document est dominé par quelques couleurs.
+
+    Args:
+        image_array (np.ndarray): image array (uint8 ou float 0-1)
+
+    Returns:
+        str: 'document' ou 'photo'
+    """
+    thumbnail = resize_image_array(cast_image(image_array, dtype="uint8"), 256)
+    quantized = (thumbnail >> 4).reshape(thumbnail.shape[0] * thumbnail.shape[1], -1)
+    _, counts = np.unique(quantized, axis=0, return_counts=True)
+    top_share = np.sort(counts)[::-1][:8].sum() / counts.sum()
+    return "document" if top_share >= 0.85 else "photo"
+
+
+def _luma(image_array: npt.NDArray[Any], color_space: Literal["RGB", "BGR"]) -> npt.NDArray[Any]:
+    """Luminance float32 d'une image, réduite à 1024 px de large au plus."""
+    array = resize_image_array(cast_image(image_array, dtype="uint8"), 1024)
+    if array.ndim == 3 and array.shape[-1] >= 3:
+        code = cv2.COLOR_RGB2GRAY if color_space == "RGB" else cv2.COLOR_BGR2GRAY
+        array = cv2.cvtColor(np.ascontiguousarray(array[..., :3]), code)
+    elif array.ndim == 3:
+        array = array[..., 0]
+    return array.astype(np.float32)
+
+
+def _ssim(reference: npt.NDArray[Any], candidate: npt.NDArray[Any]) -> float:
+    """SSIM moyen (fenêtre gaussienne 11x11) entre deux luminances de même taille."""
+    c1, c2 = (0.01 * 255) ** 2, (0.03 * 255) ** 2
+
+    def blur(x: npt.NDArray[Any]) -> npt.NDArray[Any]:
+        return cast(npt.NDArray[Any], cv2.GaussianBlur(x, (11, 11), 1.5))
+
+    mu1, mu2 = blur(reference), blur(candidate)
+    sigma1 = blur(reference * reference) - mu1 * mu1
+    sigma2 = blur(candidate * candidate) - mu2 * mu2
+    sigma12 = blur(reference * candidate) - mu1 * mu2
+    ssim_map = ((2 * mu1 * mu2 + c1) * (2 * sigma12 + c2)) / (
+        (mu1 * mu1 + mu2 * mu2 + c1) * (sigma1 + sigma2 + c2)
+    )
+    return float(ssim_map.mean())
+
+
+def _decode_candidate(data: bytes, encoder: Encoder) -> Tuple[npt.NDArray[Any], str]:
+    """Décode une image encodée, retourne (array, espace couleur)."""
+    if encoder in ("jxl", "jxl_lossless"):
+        return jpegxl_decode(data), "RGB"
+    return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_UNCHANGED), "BGR"
+
+
+def select_encoding(
+    image_array: npt.NDArray[Any],
+    color_space: Literal["RGB", "BGR"] = "RGB",
+    min_ssim: float = AUTO_MIN_SSIM,
+    max_bytes: Optional[int] = AUTO_MAX_BYTES,
+    time_budget: float = AUTO_TIME_BUDGET,
+) -> Dict[str, Any]:
+    """Choisit l'encodeur et la qualité selon le contenu de l'image.
+
+    L'image est classée (`classify_content`), puis les candidats de AUTO_CANDIDATES
+    sont encodés dans l'ordre tant que le budget de temps n'est pas épuisé (au moins un
+    candidat est toujours essayé). Chaque sortie est décodée et comparée à l'original
+    (SSIM sur la luminance). Le résultat retenu est :
+      - le plus petit candidat avec SSIM >= `min_ssim` et taille <= `max_bytes`,
+      - sinon, le candidat de meilleur SSIM parmi ceux qui tiennent dans `max_bytes`,
+      - sinon, le plus petit candidat.
 
-    raise Exception("Unrecognized image format: Please choose either 'png'/ 'jpg'")
+    Args:
+        image_array (np.ndarray): image array
+        color_space (str): espace couleur de l'array
+        min_ssim (float): seuil de qualité perceptuelle (0-1)
+        max_bytes (int): taille cible maximale en octets, None pour ne pas borner
+        time_budget (float): budget de temps en secondes pour l'exploration
+
+    Returns:
+        Dict[str, Any]: `encoder`, `quality`, `content`, `ssim`, `data` (bytes) et
+            `candidates` (résumé de chaque essai).
+    """
+    started_at = time.perf_counter()
+    # Entrée float (0-1) convertie une fois : tous les candidats encodent les mêmes pixels
+    image_array = cast_image(image_array, dtype="uint8")
+    content = classify_content(image_array)
+    reference = _luma(image_array, color_space)
+
+    tried: List[Dict[str, Any]] = []
+    for encoder, quality in AUTO_CANDIDATES[content]:
+        if tried and time.perf_counter() - started_at > time_budget:
+            break
+        data = encode_image_array(image_array, encoder, color_space=color_space, quality=quality)
+        decoded, decoded_space = _decode_candidate(data, encoder)
+        score = _ssim(reference, _luma(decoded, decoded_space))  # type: ignore[arg-type]
+        tried.append({"encoder": encoder, "quality": quality, "ssim": score, "data": data})
+
+    within_budget = [c for c in tried if max_bytes is None or len(c["data"]) <= max_bytes]
+    feasible = [c for c in within_budget if c["ssim"] >= min_ssim]
+    if feasible:
+        best = min(feasible, key=lambda c: len(c["data"]))
+    elif within_budget:
+        best = max(within_budget, key=lambda c: c["ssim"])
+    else:
+        best = min(tried, key=lambda c: len(c["data"]))
+
+    return {
+        **best,
+        "content": content,
+        "candidates": [
+            {
+                "encoder": c["encoder"],
+                "quality": c["quality"],
+                "ssim": round(c["ssim"], 4),
+                "size_bytes": len(c["data"]),
+            }
+            for c in tried
+        ],
+    }
 
 
 def cast_image(image_array: npt.NDArray[Any], dtype: str = "uint8") -> npt.NDArray[Any]:
@@ -102,6 +317,18 @@ def cast_image(image_array: npt.NDArray[Any], dtype: str = "uint8") -> npt.NDArr
         raise NotImplementedError("dtype must be either uint8 or float32")
 
 
+def set_encode_threads(encode_threads: int, jxl_threads: int) -> None:
+    """Borne les threads d'encodage du process (appelé à l'initialisation des workers).
+
+    Args:
+        encode_threads (int): variantes encodées en parallèle par image.
+        jxl_threads (int): threads libjxl par encodage JPEG XL.
+    """
+    global ENCODE_THREADS, JXL_THREADS
+    ENCODE_THREADS = max(1, encode_threads)
+    JXL_THREADS = max(1, jxl_threads)
+
+
 def _encode_jpeg_xl(
     image_array: npt.NDArray[Any],
     level: int = 99,
@@ -131,11 +358,11 @@ def _encode_jpeg_xl(
         bitspersample: Bit depth of the input image. Defaults to 16.
         planar: Whether the input image is in planar format. Defaults to None.
         usecontainer: Whether to use the JPEG XL container format. Defaults to True.
-        numthreads:  Number of threads to use for encoding. Defaults to .
+        numthreads:  Number of threads to use for encoding. Defaults to JXL_THREADS.
 
     """
     if numthreads is None:
-        numthreads = os.cpu_count()
+        numthreads = JXL_THREADS
 
     return jpegxl_encode(
         image_array,
@@ -166,15 +393,42 @@ def extract_image_array(
     Lève HTTPException en cas d'erreur lisible côté client.
     """
     try:
-        uploaded_file.file.seek(0)
-        data = uploaded_file.file.read()
+        with IMAGE_STAGE_SECONDS.time("read", ""):
+            uploaded_file.file.seek(0)
+            data = uploaded_file.file.read()
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Impossible de lire le fichier: {e}")
 
+    arr, meta = decode_image_bytes(data, convert_rgb=convert_rgb)
+
+    try:
+        uploaded_file.file.seek(0)
+    except Exception:
+        pass
+
+    return arr, meta
+
+
+def decode_image_bytes(
+    data: bytes,
+    convert_rgb: bool = True,
+) -> Tuple[npt.NDArray[Any], Dict[str, Any]]:
+    """Décode une image (png/jpg/jpeg/...) depuis ses octets bruts via Pillow.
+
+    Args:
+        data (bytes): Contenu brut du fichier image.
+        convert_rgb (bool): Convertit l'image en RGB. Defaults to True.
+    Returns:
+        Tuple[npt.NDArray[Any], Dict[str, Any]]: image_array, metadatas.
+    Raises:
+        HTTPException: Si l'image ne peut pas être ouverte ou convertie.
+    """
+    started_at = time.perf_counter()
     img: Optional[Image.Image] = None
 
     try:
         img = Image.open(BytesIO(data))
+        source_format = str(img.format or "").lower()
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Erreur lors de l'ouverture de l'image: {e}")
 
@@ -193,11 +447,8 @@ def extract_image_array(
         "size_bytes": len(data),
     }
 
-    try:
-        uploaded_file.file.seek(0)
-    except Exception:
-        pass
-
+    IMAGE_STAGE_SECONDS.observe(time.perf_counter() - started_at, "decode", source_format)
+    BYTES.inc("image_input", amount=len(data))
     return arr, meta
 
 
@@ -214,12 +465,33 @@ def pdf_to_image_array(
         HTTPException: Si le PDF ne peut pas être lu ou converti.
     """
     try:
-        file.file.seek(0)
-        pdf_bytes = file.file.read()
+        with IMAGE_STAGE_SECONDS.time("read", "pdf"):
+            file.file.seek(0)
+            pdf_bytes = file.file.read()
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Impossible de lire le fichier: {e}")
+
+    return render_pdf_bytes(pdf_bytes)
+
 
+def render_pdf_bytes(
+    pdf_bytes: bytes,
+    zoom: float = 2.0,
+) -> Tuple[npt.NDArray[Any], Dict[str, Any]]:
+    """Rend la première page d'un PDF (octets bruts) en image numpy.
+
+    Args:
+        pdf_bytes (bytes): Contenu brut du PDF.
+        zoom (float): Facteur d'agrandissement du rendu. Defaults to 2.0.
+    Returns:
+        Tuple[npt.NDArray[Any], Dict[str, Any]]: image_array, metadatas.
+    Raises:
+        HTTPException: Si le PDF ne peut pas être converti.
+    """
+    started_at = time.perf_counter()
+    try:
         doc = fitz.open(stream=pdf_bytes, filetype="pdf")
         page = doc.load_page(0)
-        zoom = 2.0
         mat = fitz.Matrix(zoom, zoom)
         pix = page.get_pixmap(matrix=mat, alpha=False)
 
@@ -237,7 +509,190 @@ def pdf_to_image_array(
         doc.close()
 
     except Exception as e:
-        print('AHH OKOK ')
         raise HTTPException(status_code=400, detail=f"Impossible de convertir le PDF en image: {e}")
 
+    IMAGE_STAGE_SECONDS.observe(time.perf_counter() - started_at, "pdf_render", "pdf")
+    BYTES.inc("image_input", amount=len(pdf_bytes))
     return image_array, metadatas
+
+
+def resize_image_array(image_array: npt.NDArray[Any], width: int) -> npt.NDArray[Any]:
+    """Redimensionne une image à la largeur donnée en conservant le ratio.
+
+    L'image n'est jamais agrandie : si `width` dépasse la largeur d'origine,
+    l'array est retourné tel quel.
+
+    Args:
+        image_array (np.ndarray): image array (H, W[, C])
+        width (int): largeur cible en pixels
+
+    Returns:
+        np.ndarray: image redimensionnée
+    """
+    height, original_width = image_array.shape[:2]
+    if width >= original_width:
+        return image_array
+    new_height = max(1, round(height * width / original_width))
+    return cast(
+        npt.NDArray[Any],
+        cv2.resize(image_array, (width, new_height), interpolation=cv2.INTER_AREA),
+    )
+
+
+def encode_variants(
+    image_array: npt.NDArray[Any],
+    widths: Sequence[int],
+    encoders: Sequence[Encoder],
+    color_space: Literal["RGB", "BGR"] = "RGB",
+) -> List[Dict[str, Any]]:
+    """Encode en parallèle toutes les variantes (largeur × encodeur) d'une image.
+
+    Les largeurs supérieures à celle de l'image sont ramenées à la largeur d'origine
+    puis dédoublonnées. L'encodage est réparti sur des threads (OpenCV et libjxl
+    relâchent le GIL).
+
+    Args:
+        image_array (np.ndarray): image array
+        widths (Sequence[int]): largeurs cibles en pixels
+        encoders (Sequence[str]): encodeurs, voir `encode_image_array`
+        color_space (str): espace couleur de l'array
+
+    Returns:
+        List[Dict[str, Any]]: une entrée par variante avec `width`, `height`, `encoder`,
+            `extension`, `content_type` et `data` (bytes), triée par encodeur puis largeur.
+
+    Raises:
+        ValueError: Si deux encodeurs ont la même extension (même chemin d'objet).
+    """
+    if len({ENCODER_EXTENSIONS[e] for e in encoders}) < len(encoders):
+        raise ValueError(f"Encodeurs de variantes en conflit d'extension: {list(encoders)}")
+    original_width = image_array.shape[1]
+    target_widths = sorted({min(w, original_width) for w in widths if w > 0})
+    resized = {w: resize_image_array(image_array, w) for w in target_widths}
+    jobs = [(w, enc) for enc in encoders for w in target_widths]
+
+    def _encode(job: Tuple[int, Encoder]) -> Dict[str, Any]:
+        width, encoder = job
+        array = resized[width]
+        return {
+            "width": array.shape[1],
+            "height": array.shape[0],
+            "encoder": encoder,
+            "extension": ENCODER_EXTENSIONS[encoder],
+            "content_type": ENCODER_MIME_TYPES[encoder],
+            "data": encode_image_array(array, encoder=encoder, color_space=color_space),
+        }
+
+    if not jobs:
+        return []
+    with ThreadPoolExecutor(max_workers=min(len(jobs), ENCODE_THREADS)) as executor:
+        return list(executor.map(_encode, jobs))
+
+
+def encode_full_size(
+    image_array: npt.NDArray[Any],
+    encoder: Union[Encoder, Literal["auto"]] = "png",
+    color_space: Literal["RGB", "BGR"] = "RGB",
+) -> Dict[str, Any]:
+    """Encode l'image pleine taille et décrit le format retenu.
+
+    Args:
+        image_array (np.ndarray): image array
+        encoder (str): encodeur, ou 'auto' pour `select_encoding`
+        color_space (str): espace couleur de l'array
+
+    Returns:
+        Dict[str, Any]: `encoder`, `quality`, `extension`, `content_type`, `data` (bytes)
+            et, en mode auto, `content`, `ssim` et `candidates`.
+    """
+    if encoder == "auto":
+        result = select_encoding(image_array, color_space=color_space)
+    else:
+        result = {
+            "encoder": encoder,
+            "quality": None,
+            "data": encode_image_array(image_array, encoder, color_space=color_space),
+        }
+    result["extension"] = ENCODER_EXTENSIONS[result["encoder"]]
+    result["content_type"] = ENCODER_MIME_TYPES[result["encoder"]]
+    return result
+
+
+def process_upload(
+    data: bytes,
+    is_pdf: bool,
+    encoder: Union[Encoder, Literal["auto"]] = "png",
+    variant_widths: Sequence[int] = (),
+    variant_encoders: Sequence[Encoder] = (),
+) -> Tuple[Dict[str, Any], List[Dict[str, Any]], Dict[str, Any]]:
+    """Pipeline complet d'un upload : décodage (image ou PDF) puis encodage.
+
+    Ne manipule que des octets pour pouvoir être exécuté dans un process worker.
+
+    Args:
+        data (bytes): Contenu brut du fichier uploadé.
+        is_pdf (bool): True si le fichier est un PDF.
+        encoder (str): Encodeur de l'image pleine taille, voir `encode_full_size`.
+        variant_widths (Sequence[int]): Largeurs des variantes responsive.
+        variant_encoders (Sequence[str]): Encodeurs des variantes responsive.
+    Returns:
+        Tuple[Dict[str, Any], List[Dict[str, Any]], Dict[str, Any]]: image pleine taille
+            (voir `encode_full_size`), variantes (voir `encode_variants`), metadatas.
+    Raises:
+        HTTPException: Si le fichier ne peut pas être décodé.
+    """
+    if is_pdf:
+        image_array, metadatas = render_pdf_bytes(data)
+    else:
+        image_array, metadatas = decode_image_bytes(data)
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        full_size = executor.submit(encode_full_size, image_array, encoder, "RGB")
+        variants = encode_variants(image_array, variant_widths, variant_encoders)
+        return full_size.result(), variants, metadatas
+
+
+def build_variant_manifest(
+    prefix: str,
+    variants: List[Dict[str, Any]],
+    metadatas: Dict[str, Any],
+    full_size: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """Construit le manifest des variantes responsive d'un template.
+
+    Assigne à chaque variante son chemin d'objet (`<prefix>/<largeur>w.<ext>`) et
+    regroupe les variantes par type MIME sous forme d'attribut `srcset`.
+
+    Args:
+        prefix (str): Préfixe des objets dans le bucket.
+        variants (list): Variantes retournées par `encode_variants`.
+        metadatas (dict): Métadonnées de l'image d'origine.
+        full_size (dict): Image pleine taille stockée à `prefix` (voir `encode_full_size`).
+    Returns:
+        dict: Manifest sérialisable en JSON.
+    """
+    entries: List[Dict[str, Any]] = []
+    srcset: Dict[str, List[str]] = {}
+    for variant in variants:
+        variant["path"] = f"{prefix}/{variant['width']}w.{variant['extension']}"
+        entries.append({k: v for k, v in variant.items() if k != "data"})
+        entries[-1]["size_bytes"] = len(variant["data"])
+        srcset.setdefault(variant["content_type"], []).append(
+            f"{variant['path']} {variant['width']}w"
+        )
+
+    manifest: Dict[str, Any] = {
+        "original": {k: metadatas.get(k) for k in ("width", "height", "format", "size_bytes")},
+        "variants": entries,
+        "srcset": {mime: ", ".join(items) for mime, items in srcset.items()},
+    }
+    if full_size is not None:
+        manifest["full_size"] = {
+            "path": prefix,
+            "size_bytes": len(full_size["data"]),
+            **{
+                k: full_size.get(k)
+                for k in ("encoder", "quality", "content_type", "content", "ssim")
+            },
+        }
+    return manifest
@@ -0,0 +1,515 @@
+"""Backends locaux (hors ligne) pour Supabase, GCS, Artifact Registry et Cloud Build.
+
+Avec GERMINA_BACKEND=local, les fabriques de clients de `gcp.py` et `users.py`
+retournent ces implémentations à la place des clients Google/Supabase. Elles
+reproduisent le sous-ensemble d'API utilisé par le builder (mêmes méthodes, mêmes
+exceptions `google.api_core`, mêmes types proto), si bien que tout le code du
+builder s'exécute tel quel :
+  - `LocalStorageClient` : bucket sur le système de fichiers (générations, MD5/CRC32C,
+    préconditions `if_generation_match`) ;
+  - `LocalArtifactRegistry` : registre en mémoire, pré-rempli de N images et avec
+    latence injectée par aller-retour (et par page de listing) ;
+  - `LocalCloudBuild` : build factice qui publie l'image dans le registre local ;
+  - `LocalSupabase` : vérification de JWT HS256 émis par `issue_token`.
+
+Émettre un token pour un utilisateur local (même LOCAL_JWT_SECRET que le serveur) :
+    GERMINA_BACKEND=local LOCAL_JWT_SECRET=<secret> python local_backends.py token <user_id>
+"""
+
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import os
+import random
+import secrets
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from functools import lru_cache
+from io import BytesIO
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Set
+from urllib.parse import quote, unquote
+
+import google_crc32c
+from fastapi.logger import logger
+from google.api_core import exceptions as gcp_exceptions
+from google.cloud import artifactregistry_v1 as ar
+from google.cloud.devtools import cloudbuild_v1
+from supabase_auth.types import User as SupabaseUser
+
+# Configuration
+GERMINA_BACKEND: str = os.getenv("GERMINA_BACKEND", "gcp")
+if GERMINA_BACKEND not in ("gcp", "local"):
+    raise ValueError(f"GERMINA_BACKEND invalide: {GERMINA_BACKEND}")
+USE_LOCAL_BACKENDS: bool = GERMINA_BACKEND == "local"
+
+LOCAL_STORAGE_DIR: Path = Path(os.getenv("LOCAL_STORAGE_DIR", "/tmp/germina_local_storage"))
+# Latence injectée (secondes) par appel GCS et par aller-retour Artifact Registry
+LOCAL_GCS_LATENCY: float = float(os.getenv("LOCAL_GCS_LATENCY", "0"))
+LOCAL_AR_LATENCY: float = float(os.getenv("LOCAL_AR_LATENCY", "0"))
+LOCAL_AR_PAGE_SIZE: int = int(os.getenv("LOCAL_AR_PAGE_SIZE", "100"))
+# Images pré-existantes : utilisateurs fictifs × images par utilisateur
+LOCAL_AR_SEED_USERS: int = int(os.getenv("LOCAL_AR_SEED_USERS", "0"))
+LOCAL_AR_SEED_IMAGES_PER_USER: int = int(os.getenv("LOCAL_AR_SEED_IMAGES_PER_USER", "3"))
+LOCAL_BUILD_SECONDS: float = float(os.getenv("LOCAL_BUILD_SECONDS", "2"))
+LOCAL_BUILD_FAILURE_RATE: float = float(os.getenv("LOCAL_BUILD_FAILURE_RATE", "0"))
+# Sans LOCAL_JWT_SECRET, secret aléatoire propre au process : aucun secret connu ne
+# permet de signer des tokens si le mode local est activé par erreur
+LOCAL_JWT_SECRET_GENERATED: bool = not os.getenv("LOCAL_JWT_SECRET")
+LOCAL_JWT_SECRET: str = os.getenv("LOCAL_JWT_SECRET") or secrets.token_urlsafe(32)
+LOCAL_JWT_TTL: int = int(os.getenv("LOCAL_JWT_TTL", "86400"))
+
+
+def _b64(data: bytes) -> str:
+    return base64.b64encode(data).decode("ascii")
+
+
+# --- Stockage (google.cloud.storage) ---------------------------------------------
+
+
+class LocalBlob:
+    """Objet d'un `LocalBucket` (sous-ensemble de `google.cloud.storage.Blob`)."""
+
+    def __init__(self, bucket: "LocalBucket", name: str, **_: Any) -> None:
+        self.bucket = bucket
+        self.name = name
+        self.generation: Optional[int] = None
+        self.md5_hash: Optional[str] = None
+        self.crc32c: Optional[str] = None
+        self.content_type: Optional[str] = None
+        self.size: Optional[int] = None
+
+    def _load(self, meta: Dict[str, Any]) -> "LocalBlob":
+        self.generation = meta["generation"]
+        self.md5_hash = meta["md5_hash"]
+        self.crc32c = meta["crc32c"]
+        self.content_type = meta["content_type"]
+        self.size = meta["size"]
+        return self
+
+    def upload_from_file(
+        self,
+        file_obj: Any,
+        size: Optional[int] = None,
+        content_type: Optional[str] = None,
+        if_generation_match: Optional[int] = None,
+        **_: Any,
+    ) -> None:
+        data = file_obj.read() if size is None else file_obj.read(size)
+        self._load(self.bucket._write(self.name, data, content_type, if_generation_match))
+
+    def upload_from_filename(
+        self, filename: str, content_type: Optional[str] = None, **kwargs: Any
+    ) -> None:
+        with open(filename, "rb") as f:
+            self.upload_from_file(f, content_type=content_type, **kwargs)
+
+    def open(self, mode: str = "rb", content_type: Optional[str] = None, **_: Any) -> Any:
+        if mode != "wb":
+            return BytesIO(self.download_as_bytes())
+        blob = self
+
+        class _Writer(BytesIO):
+            def close(self) -> None:
+                if not self.closed:
+                    blob._load(blob.bucket._write(blob.name, self.getvalue(), content_type, None))
+                super().close()
+
+        return _Writer()
+
+    def download_as_bytes(self, **_: Any) -> bytes:
+        return self.bucket._read(self.name)
+
+    def delete(self, if_generation_match: Optional[int] = None, **_: Any) -> None:
+        self.bucket._delete(self.name, if_generation_match)
+
+
+class LocalBucket:
+    """Bucket sur disque : un fichier par objet (nom encodé) et un fichier de métadonnées.
+
+    Les noms d'objets sont encodés (`quote`) : un objet `a` et un objet `a/b` peuvent
+    coexister, comme dans GCS.
+    """
+
+    def __init__(self, root: Path, name: str, latency: float) -> None:
+        self.name = name
+        self.directory = root / (name or "_default")
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.latency = latency
+        self._lock = threading.Lock()
+
+    def _paths(self, blob_name: str) -> "tuple[Path, Path]":
+        encoded = quote(blob_name, safe="")
+        return self.directory / encoded, self.directory / f"{encoded}.meta"
+
+    def _meta(self, blob_name: str) -> Optional[Dict[str, Any]]:
+        try:
+            meta: Dict[str, Any] = json.loads(self._paths(blob_name)[1].read_text())
+            return meta
+        except FileNotFoundError:
+            return None
+
+    def _pause(self) -> None:
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _write(
+        self,
+        blob_name: str,
+        data: bytes,
+        content_type: Optional[str],
+        if_generation_match: Optional[int],
+    ) -> Dict[str, Any]:
+        self._pause()
+        data_path, meta_path = self._paths(blob_name)
+        with self._lock:
+            current = self._meta(blob_name)
+            if if_generation_match is not None:
+                generation = current["generation"] if current else 0
+                if generation != if_generation_match:
+                    raise gcp_exceptions.PreconditionFailed(f"{blob_name}: génération {generation}")
+            meta = {
+                "generation": time.time_ns(),
+                "md5_hash": _b64(hashlib.md5(data).digest()),
+                "crc32c": _b64(google_crc32c.Checksum(data).digest()),
+                "content_type": content_type or "application/octet-stream",
+                "size": len(data),
+            }
+            tmp_path = data_path.with_name(f"{data_path.name}.{threading.get_ident()}.tmp")
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, data_path)
+            meta_path.write_text(json.dumps(meta))
+        return meta
+
+    def _read(self, blob_name: str) -> bytes:
+        self._pause()
+        try:
+            return self._paths(blob_name)[0].read_bytes()
+        except FileNotFoundError:
+            raise gcp_exceptions.NotFound(f"{self.name}/{blob_name}")
+
+    def _delete(self, blob_name: str, if_generation_match: Optional[int]) -> None:
+        self._pause()
+        data_path, meta_path = self._paths(blob_name)
+        with self._lock:
+            current = self._meta(blob_name)
+            if current is None:
+                raise gcp_exceptions.NotFound(f"{self.name}/{blob_name}")
+            if if_generation_match is not None and current["generation"] != if_generation_match:
+                raise gcp_exceptions.PreconditionFailed(f"{blob_name}: génération modifiée")
+            meta_path.unlink(missing_ok=True)
+            data_path.unlink(missing_ok=True)
+
+    def blob(self, blob_name: str, **kwargs: Any) -> LocalBlob:
+        return LocalBlob(self, blob_name, **kwargs)
+
+    def get_blob(self, blob_name: str, **_: Any) -> Optional[LocalBlob]:
+        self._pause()
+        meta = self._meta(blob_name)
+        return LocalBlob(self, blob_name)._load(meta) if meta else None
+
+    def copy_blob(
+        self, blob: LocalBlob, destination_bucket: "LocalBucket", new_name: str, **_: Any
+    ) -> LocalBlob:
+        meta = self._meta(blob.name)
+        if meta is None:
+            raise gcp_exceptions.NotFound(f"{self.name}/{blob.name}")
+        data = self._read(blob.name)
+        copied = destination_bucket._write(new_name, data, meta["content_type"], None)
+        return LocalBlob(destination_bucket, new_name)._load(copied)
+
+    def list_blob_names(self) -> List[str]:
+        return sorted(unquote(p.name[: -len(".meta")]) for p in self.directory.glob("*.meta"))
+
+
+class LocalBlobIterator:
+    """Résultat de `list_blobs` : itérable de blobs, avec `prefixes` si `delimiter`."""
+
+    def __init__(self, blobs: List[LocalBlob], prefixes: Set[str]) -> None:
+        self._blobs = blobs
+        self.prefixes = prefixes
+
+    def __iter__(self) -> Iterator[LocalBlob]:
+        return iter(self._blobs)
+
+
+class LocalStorageClient:
+    """Remplaçant de `google.cloud.storage.Client` sur le système de fichiers."""
+
+    def __init__(self, root: Path = LOCAL_STORAGE_DIR, latency: float = LOCAL_GCS_LATENCY) -> None:
+        self.root = root
+        self.latency = latency
+        self._buckets: Dict[str, LocalBucket] = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, bucket_name: str) -> LocalBucket:
+        with self._lock:
+            if bucket_name not in self._buckets:
+                self._buckets[bucket_name] = LocalBucket(self.root, bucket_name, self.latency)
+            return self._buckets[bucket_name]
+
+    def list_blobs(
+        self,
+        bucket_or_name: Any,
+        prefix: Optional[str] = None,
+        delimiter: Optional[str] = None,
+        **_: Any,
+    ) -> LocalBlobIterator:
+        bucket = bucket_or_name if isinstance(bucket_or_name, LocalBucket) else None
+        bucket = bucket or self.bucket(bucket_or_name)
+        bucket._pause()
+        prefix = prefix or ""
+        blobs: List[LocalBlob] = []
+        prefixes: Set[str] = set()
+        for name in bucket.list_blob_names():
+            if not name.startswith(prefix):
+                continue
+            rest = name[len(prefix) :]
+            if delimiter and delimiter in rest:
+                prefixes.add(prefix + rest.split(delimiter, 1)[0] + delimiter)
+                continue
+            meta = bucket._meta(name)
+            if meta is not None:
+                blobs.append(LocalBlob(bucket, name)._load(meta))
+        return LocalBlobIterator(blobs, prefixes)
+
+
+# --- Artifact Registry et Cloud Build ------------------------------------------------
+
+
+class LocalOperation:
+    """Opération longue (`await op.result()`), comme les clients async Google."""
+
+    def __init__(self, work: Any) -> None:
+        self._work = work
+
+    async def result(self, **_: Any) -> Any:
+        return await self._work()
+
+
+class LocalArtifactRegistry:
+    """Remplaçant en mémoire de `ArtifactRegistryAsyncClient` (repository unique).
+
+    Chaque appel coûte `latency` secondes, plus `latency` par page supplémentaire de
+    `page_size` éléments lors des listings (comme la pagination de l'API).
+    """
+
+    def __init__(self, repo_path: str, latency: float, page_size: int) -> None:
+        self.repo_path = repo_path
+        self.latency = latency
+        self.page_size = page_size
+        self._images: Dict[str, List[ar.DockerImage]] = {}
+
+    def add_image(self, package_name: str, tag: str = "latest") -> ar.DockerImage:
+        """Publie une image (appelé par le build factice ou pour pré-remplir)."""
+        digest = hashlib.sha256(f"{package_name}:{tag}:{time.time_ns()}".encode()).hexdigest()
+        image = ar.DockerImage(
+            name=f"{package_name}@sha256:{digest}",
+            uri=f"{self.repo_path}/{package_name}@sha256:{digest}",
+            tags=[tag],
+            upload_time=datetime.now(timezone.utc),
+        )
+        for existing in self._images.get(package_name, []):
+            if tag in existing.tags:
+                existing.tags.remove(tag)
+        self._images.setdefault(package_name, []).append(image)
+        return image
+
+    def seed(self, users: int, images_per_user: int) -> None:
+        """Pré-remplit le registre avec `users` × `images_per_user` packages fictifs."""
+        for u in range(users):
+            for q in range(images_per_user):
+                self.add_image(f"user_seed{u:05d}_q_{q}")
+
+    async def _pause(self) -> None:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    async def _pages(self, items: List[Any]) -> AsyncIterator[Any]:
+        for start in range(0, len(items), self.page_size):
+            if start:
+                await self._pause()
+            for item in items[start : start + self.page_size]:
+                yield item
+
+    async def list_docker_images(self, request: Any = None, **_: Any) -> AsyncIterator[Any]:
+        await self._pause()
+        images = [image for images in self._images.values() for image in images]
+        return self._pages(images)
+
+    async def list_packages(self, parent: Optional[str] = None, **_: Any) -> AsyncIterator[Any]:
+        await self._pause()
+        packages = [ar.Package(name=f"{parent}/packages/{name}") for name in self._images]
+        return self._pages(packages)
+
+    async def delete_package(self, name: str, **_: Any) -> LocalOperation:
+        await self._pause()
+        package_name = name.rsplit("/", 1)[-1]
+        if package_name not in self._images:
+            raise gcp_exceptions.NotFound(name)
+
+        async def work() -> None:
+            await self._pause()
+            self._images.pop(package_name, None)
+
+        return LocalOperation(work)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "packages": len(self._images),
+            "images": sum(len(images) for images in self._images.values()),
+        }
+
+
+class LocalCloudBuild:
+    """Remplaçant de `CloudBuildAsyncClient` : attend `duration` puis publie les images.
+
+    Comme Cloud Build, le build échoue si l'archive source est absente du bucket.
+    """
+
+    def __init__(
+        self,
+        registry: LocalArtifactRegistry,
+        storage: LocalStorageClient,
+        duration: float,
+        failure_rate: float,
+    ) -> None:
+        self.registry = registry
+        self.storage = storage
+        self.duration = duration
+        self.failure_rate = failure_rate
+
+    async def create_build(self, build: cloudbuild_v1.Build, **_: Any) -> LocalOperation:
+        await self.registry._pause()
+        source = build.source.storage_source
+        if source.object_ and self.storage.bucket(source.bucket).get_blob(source.object_) is None:
+            raise gcp_exceptions.InvalidArgument(f"gs://{source.bucket}/{source.object_} absent")
+
+        async def work() -> cloudbuild_v1.Build:
+            await asyncio.sleep(self.duration)
+            if random.random() < self.failure_rate:
+                return cloudbuild_v1.Build(
+                    status=cloudbuild_v1.Build.Status.FAILURE,
+                    status_detail="Échec simulé (LOCAL_BUILD_FAILURE_RATE)",
+                )
+            for full_tag in build.images:
+                package_name, _, tag = full_tag.rsplit("/", 1)[-1].partition(":")
+                self.registry.add_image(package_name, tag or "latest")
+            return cloudbuild_v1.Build(status=cloudbuild_v1.Build.Status.SUCCESS)
+
+        return LocalOperation(work)
+
+
+# --- Supabase (auth) ---------------------------------------------------------------
+
+
+def issue_token(user_id: str, email: Optional[str] = None, ttl: int = LOCAL_JWT_TTL) -> str:
+    """Émet un JWT HS256 signé avec LOCAL_JWT_SECRET (même forme qu'un token Supabase)."""
+
+    def encode(part: Dict[str, Any]) -> str:
+        raw = json.dumps(part, separators=(",", ":")).encode()
+        return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+    now = int(time.time())
+    claims = {
+        "sub": user_id,
+        "email": email or f"{user_id}@local.test",
+        "aud": "authenticated",
+        "role": "authenticated",
+        "iat": now,
+        "exp": now + ttl,
+    }
+    signing_input = f"{encode({'alg': 'HS256', 'typ': 'JWT'})}.{encode(claims)}"
+    signature = hmac.new(LOCAL_JWT_SECRET.encode(), signing_input.encode(), hashlib.sha256)
+    return f"{signing_input}.{base64.urlsafe_b64encode(signature.digest()).rstrip(b'=').decode()}"
+
+
+def verify_token(token: str) -> Dict[str, Any]:
+    """Vérifie signature et expiration d'un token émis par `issue_token`.
+
+    Raises:
+        ValueError: Si le token est mal formé, mal signé ou expiré.
+    """
+    try:
+        header, payload, signature = token.split(".")
+        expected = hmac.new(
+            LOCAL_JWT_SECRET.encode(), f"{header}.{payload}".encode(), hashlib.sha256
+        ).digest()
+        given = base64.urlsafe_b64decode(signature + "=" * (-len(signature) % 4))
+        claims: Dict[str, Any] = json.loads(
+            base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4))
+        )
+    except Exception as e:
+        raise ValueError("Token mal formé") from e
+    if not hmac.compare_digest(expected, given):
+        raise ValueError("Signature invalide")
+    if claims.get("exp", 0) < time.time():
+        raise ValueError("Token expiré")
+    return claims
+
+
+class LocalAuth:
+    async def get_user(self, jwt: str) -> Any:
+        claims = verify_token(jwt)
+        user = SupabaseUser(
+            id=claims["sub"],
+            email=claims.get("email"),
+            aud=claims["aud"],
+            app_metadata={},
+            user_metadata={},
+            created_at=datetime.fromtimestamp(claims["iat"], tz=timezone.utc),
+        )
+        return SimpleNamespace(user=user)
+
+
+class LocalSupabase:
+    """Remplaçant de `supabase.AsyncClient` limité à `auth.get_user`."""
+
+    def __init__(self) -> None:
+        if LOCAL_JWT_SECRET_GENERATED:
+            logger.warning(
+                "LOCAL_JWT_SECRET non défini : secret aléatoire, seuls les tokens émis par ce "
+                "process sont acceptés (définir LOCAL_JWT_SECRET pour `local_backends.py token`)"
+            )
+        self.auth = LocalAuth()
+
+
+# --- Instances partagées -----------------------------------------------------------
+
+
+@lru_cache(maxsize=None)
+def get_local_registry() -> LocalArtifactRegistry:
+    from gcp import GCR_REPO_PATH
+
+    registry = LocalArtifactRegistry(GCR_REPO_PATH, LOCAL_AR_LATENCY, LOCAL_AR_PAGE_SIZE)
+    registry.seed(LOCAL_AR_SEED_USERS, LOCAL_AR_SEED_IMAGES_PER_USER)
+    return registry
+
+
+@lru_cache(maxsize=None)
+def get_local_build_runner() -> LocalCloudBuild:
+    return LocalCloudBuild(
+        get_local_registry(), get_local_storage(), LOCAL_BUILD_SECONDS, LOCAL_BUILD_FAILURE_RATE
+    )
+
+
+@lru_cache(maxsize=None)
+def get_local_storage() -> LocalStorageClient:
+    return LocalStorageClient()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3 or sys.argv[1] != "token":
+        sys.exit("Usage: python local_backends.py token <user_id>")
+    if LOCAL_JWT_SECRET_GENERATED:
+        print(
+            f"LOCAL_JWT_SECRET non défini, secret généré : {LOCAL_JWT_SECRET} "
+            "(le serveur doit être démarré avec la même valeur)",
+            file=sys.stderr,
+        )
+    print(issue_token(sys.argv[2]))
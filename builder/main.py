@@ -2,9 +2,13 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+import asyncio
+import json
+from contextlib import asynccontextmanager
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
 
+from cache import cache_key, upload_cache
 from fastapi import (
     BackgroundTasks,
     Depends,
@@ -17,17 +21,49 @@ from fastapi import (
 )
 from fastapi.middleware.cors import CORSMiddleware
 from gcp import (
-    delete_package_from_package_name,
+    delete_packages,
     generate_deploy_script,
+    get_storage_stats,
     get_user_images,
     launch_build,
+    list_template_names,
+    list_user_packages,
     upload_image_bytes_to_gcp,
 )
-from image import encode_image_array, extract_image_array, pdf_to_image_array
+from image import (
+    AUTO_CANDIDATES,
+    AUTO_MAX_BYTES,
+    AUTO_MIN_SSIM,
+    AUTO_TIME_BUDGET,
+    UPLOAD_ENCODER,
+    UPLOAD_VARIANT_FORMATS,
+    UPLOAD_VARIANT_WIDTHS,
+    build_variant_manifest,
+    process_upload,
+)
+from metrics import BYTES, IMAGE_STAGE_SECONDS, MetricsMiddleware, registry
+from operations import operations
 from pydantic import BaseModel
-from users import get_current_user
+from quota import quota
+from ratelimit import limiter
+from users import get_current_user, require_metrics_token
+from workers import UPSTREAM_TIMEOUT, image_pool, io_executor, run_blocking
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    quota.start(lambda: list_user_packages("user_"))
+    yield
+    await quota.stop()
+    await operations.shutdown()
+    image_pool.shutdown()
+    io_executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Les uploads d'images peuvent enchaîner plusieurs chunks résumables
+UPLOAD_TIMEOUT: float = 4 * UPSTREAM_TIMEOUT
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -35,6 +71,46 @@ app.add_middleware(
     allow_headers=["*"],
     expose_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
+
+registry.register_stats("builder_image_pool", image_pool.stats)
+registry.register_stats("builder_upload_cache", upload_cache.stats)
+registry.register_stats("builder_gcs_uploads", get_storage_stats)
+registry.register_stats("builder_quota", quota.stats)
+registry.register_stats("builder_rate_limit", limiter.stats, label="route")
+
+
+async def launch_build_with_quota(
+    user_id: str, qid: str, payload: Any, on_done: Optional[Callable[[], None]] = None
+) -> Dict[str, Any]:
+    """Lance le build puis confirme ou libère la réservation de quota correspondante.
+
+    `on_done` est appelé à la fin du build, quelle qu'en soit l'issue (ex: libération de
+    la place de concurrence prise par la requête /build).
+    """
+    package_name = f"user_{user_id}_q_{qid}"
+    try:
+        result = await launch_build(user_id, qid, payload)
+    except Exception:
+        quota.release(user_id, package_name)
+        raise
+    finally:
+        if on_done is not None:
+            on_done()
+    if result["status"] == "success":
+        quota.confirm(user_id, package_name)
+    else:
+        quota.release(user_id, package_name)
+    return result
+
+
+async def delete_packages_with_quota(user_id: str, package_names: List[str]) -> Dict[str, Any]:
+    """Supprime des packages puis les retire de l'index de quota."""
+    results = await delete_packages(package_names)
+    for package_name, outcome in results.items():
+        if not outcome.startswith("error"):
+            quota.forget(user_id, package_name)
+    return results
 
 
 class BuildPayload(BaseModel):
@@ -44,6 +120,12 @@ class BuildPayload(BaseModel):
     ui_schema: Dict[str, Any]
 
 
+class DeleteImagesPayload(BaseModel):
+    questionnaire_ids: Optional[List[str]] = None
+    # Suppression de tout le compte : uniquement sur demande explicite
+    all: bool = False
+
+
 class DeployScriptPayload(BaseModel):  # type: ignore[misc]
     image: str
     port: Optional[int] = 5000
@@ -52,8 +134,8 @@ class DeployScriptPayload(BaseModel):  # type: ignore[misc]
     qid: Optional[str] = "unknown"
 
 
-@app.post("/upload_file", status_code=201)
-def upload_survey_template(
+@app.post("/upload_file", status_code=201, dependencies=[Depends(limiter.by_user("upload_file"))])
+async def upload_survey_template(
     file: UploadFile = File(...),
     questionnaire_id: str = Form(...),
     user: Any = Depends(get_current_user),
@@ -64,7 +146,16 @@ def upload_survey_template(
       - questionnaire_id (champ form)
       - file (fichier)
     Le fichier est stocké dans le bucket GCP configuré via SURVEY_TEMPLATE_BUCKET.
-    Retourne le chemin de l'objet stocké (ex: photos/user_<id>_q_<qid>/uuid.jpg)
+    Le décodage et l'encodage sont exécutés dans le pool de process `image_pool`
+    (503 + Retry-After si le pool est saturé). L'image pleine taille est en png pour un
+    PNG, en jpg sinon ; UPLOAD_ENCODER=auto choisit l'encodeur selon le contenu (voir
+    `image.select_encoding`).
+    En plus de l'image pleine taille, des variantes responsive (UPLOAD_VARIANT_WIDTHS ×
+    UPLOAD_VARIANT_FORMATS) sont uploadées sous `<path>/` avec un `manifest.json`.
+    Un fichier déjà traité (même contenu, mêmes paramètres) est servi depuis
+    `upload_cache` par copie côté serveur, sans retraitement ni re-upload.
+    Retourne le chemin de l'objet stocké (ex: user_<id>_q_<qid>), celui du manifest
+    et les `srcset` par type MIME.
     """
     if not file:
         raise HTTPException(status_code=400, detail="Aucun fichier fourni.")
@@ -80,31 +171,104 @@ def upload_survey_template(
         "application/pdf",
     ]:
         raise HTTPException(status_code=415, detail=f"MIME non supporté: {file.content_type}.")
-    if ext == ".pdf" or (file.content_type and file.content_type.lower() == "application/pdf"):
-        image_array, metadatas = pdf_to_image_array(file)
-    else:
-        image_array, metadatas = extract_image_array(file)
+    is_pdf = ext == ".pdf" or (
+        file.content_type is not None and file.content_type.lower() == "application/pdf"
+    )
+    try:
+        with IMAGE_STAGE_SECONDS.time("read", "pdf" if is_pdf else ""):
+            data = await file.read()
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Impossible de lire le fichier: {e}")
+    BYTES.inc("upload_received", amount=len(data))
 
     bucket_saving_path = f"user_{user.id}_q_{questionnaire_id}"
-
-    encoder = "png" if ext == ".png" else "jpg"
-
-    upload_image_bytes_to_gcp(
-        encode_image_array(image_array, encoder=encoder, color_space="BGR"), bucket_saving_path
+    encoder = UPLOAD_ENCODER
+    if encoder == "source":
+        encoder = "png" if ext == ".png" else "jpg"
+
+    manifest_path = f"{bucket_saving_path}/manifest.json"
+    key = cache_key(
+        data,
+        {
+            "is_pdf": is_pdf,
+            "encoder": encoder,
+            "widths": UPLOAD_VARIANT_WIDTHS,
+            "formats": UPLOAD_VARIANT_FORMATS,
+            "min_ssim": AUTO_MIN_SSIM,
+            "max_bytes": AUTO_MAX_BYTES,
+            # Le budget et la table décident des candidats essayés en mode auto
+            "time_budget": AUTO_TIME_BUDGET,
+            "candidates": AUTO_CANDIDATES,
+        },
+    )
+    manifest, result = await upload_cache.restore(key, bucket_saving_path)
+    if manifest is not None:
+        await run_blocking(
+            upload_image_bytes_to_gcp,
+            json.dumps(manifest).encode(),
+            manifest_path,
+            content_type="application/json",
+        )
+        return {"path": bucket_saving_path, "manifest": manifest_path, "srcset": manifest["srcset"]}
+
+    if result is None:
+        result = await image_pool.run(
+            process_upload,
+            data,
+            is_pdf,
+            encoder,
+            UPLOAD_VARIANT_WIDTHS,
+            UPLOAD_VARIANT_FORMATS,
+        )
+    full_size, variants, metadatas = result
+    manifest = build_variant_manifest(bucket_saving_path, variants, metadatas, full_size)
+    manifest["cache_key"] = key
+
+    await asyncio.gather(
+        run_blocking(
+            upload_image_bytes_to_gcp,
+            full_size["data"],
+            bucket_saving_path,
+            full_size["extension"],
+            content_type=full_size["content_type"],
+            timeout=UPLOAD_TIMEOUT,
+        ),
+        *[
+            run_blocking(
+                upload_image_bytes_to_gcp,
+                variant["data"],
+                variant["path"],
+                variant["extension"],
+                content_type=variant["content_type"],
+                timeout=UPLOAD_TIMEOUT,
+            )
+            for variant in variants
+        ],
+        run_blocking(
+            upload_image_bytes_to_gcp,
+            json.dumps(manifest).encode(),
+            manifest_path,
+            content_type="application/json",
+        ),
     )
+    await upload_cache.store(key, bucket_saving_path, manifest, result)
 
-    return {"path": bucket_saving_path}
+    return {"path": bucket_saving_path, "manifest": manifest_path, "srcset": manifest["srcset"]}
 
 
 @app.post("/build/{questionnaire_id}", status_code=202)  # type: ignore[misc]
-def build_image(
+async def build_image(
     questionnaire_id: str,
     payload: BuildPayload,
     bg: BackgroundTasks,
     user: Any = Depends(get_current_user),
+    release_slot: Callable[[], None] = Depends(limiter.by_user("build", detach=True)),
 ) -> Dict[str, Any]:
     """
     Lance le build d'une image Docker pour le questionnaire donné.
+    La limite d'interfaces par utilisateur est vérifiée par une réservation dans
+    l'index `quota` (sans scan d'Artifact Registry). La place de concurrence "build"
+    de l'utilisateur reste prise jusqu'à la fin du build Cloud Build.
 
     Args:
         questionnaire_id (str): L'ID du questionnaire pour lequel l'image doit être construite.
@@ -118,22 +282,15 @@ def build_image(
     Raises:
         HTTPException: Si l'utilisateur a déjà atteint la limite de 5 images.
     """
-    total_users_images = get_user_images(f"user_{user.id}_q_")
-    if len(total_users_images) >= 5:
-        raise HTTPException(
-            status_code=429,
-            detail=(
-                "Vous avez atteint la limite de 5 interfaces, "
-                "supprimez-en une pour en créer une nouvelle."
-            ),
-        )
+    await quota.ready(timeout=UPSTREAM_TIMEOUT)
+    quota.reserve(user.id, f"user_{user.id}_q_{questionnaire_id}")
 
-    bg.add_task(launch_build, user.id, questionnaire_id, payload)
+    bg.add_task(launch_build_with_quota, user.id, questionnaire_id, payload, release_slot)
     return {"status": "pending", "questionnaire_id": questionnaire_id}
 
 
 @app.get("/build_status")  # type: ignore[misc]
-def build_status(
+async def build_status(
     questionnaire_id: str,
     user: Any = Depends(get_current_user),
 ) -> Dict[str, Any]:
@@ -150,7 +307,7 @@ def build_status(
     """
     image_prefix = f"user_{user.id}_q_{questionnaire_id}"
 
-    images = get_user_images(image_prefix)
+    images = await get_user_images(image_prefix)
 
     if not images:
         return {
@@ -164,7 +321,7 @@ def build_status(
             "images": [
                 {
                     "name": img.uri.split("/")[-1].split("@")[0],
-                    "tags": img.tags,
+                    "tags": list(img.tags),
                     "updated_at": img.upload_time.strftime("%Y-%m-%dT%H:%M:%SZ"),
                 }
                 for img in images
@@ -173,7 +330,7 @@ def build_status(
 
 
 @app.get("/list")  # type: ignore[misc]
-def list_images(
+async def list_images(
     questionnaire_id: str,
     user: Any = Depends(get_current_user),
 ) -> Dict[str, List[Dict[str, Any]]]:
@@ -189,7 +346,7 @@ def list_images(
     """
     image_prefix = f"user_{user.id}_q_{questionnaire_id}"
 
-    images = get_user_images(image_prefix)
+    images = await get_user_images(image_prefix)
     to_return_images: List[Dict[str, Any]] = []
     for image in images:
         for tag in image.tags:
@@ -204,34 +361,122 @@ def list_images(
     return {"images": to_return_images}
 
 
-@app.delete("/delete_image", status_code=200)  # type: ignore[misc]
-def delete_image(
+@app.delete("/delete_image", status_code=202)  # type: ignore[misc]
+async def delete_image(
     questionnaire_id: str,
     user: Any = Depends(get_current_user),
 ) -> Dict[str, str]:
     """
-    Supprime un package complet dans Artifact Registry pour un questionnaire donné.
+    Lance la suppression d'un package complet dans Artifact Registry (et du template
+    associé dans GCS) pour un questionnaire donné, sans attendre la fin de l'opération.
 
     Args:
         questionnaire_id (str): L'ID du questionnaire pour lequel supprimer le package.
         user: L'utilisateur actuel, récupéré via Supabase.
 
     Returns:
-        dict: Un dictionnaire contenant le statut de la suppression.
+        dict: Le statut et l'ID de l'opération, à suivre via `/operations/{operation_id}`.
+    """
+    package_name = f"user_{user.id}_q_{questionnaire_id}"
+    operation = await operations.start(
+        user.id, "delete", [package_name], delete_packages_with_quota(user.id, [package_name])
+    )
+    return {
+        "status": "pending",
+        "operation_id": operation["id"],
+        "message": f"Suppression du package {package_name} lancée.",
+    }
+
+
+@app.post("/delete_images", status_code=202)  # type: ignore[misc]
+async def delete_images(
+    payload: DeleteImagesPayload,
+    user: Any = Depends(get_current_user),
+) -> Dict[str, Any]:
+    """
+    Lance la suppression en parallèle de plusieurs questionnaires (packages Artifact
+    Registry et templates GCS). Tout ce qui appartient à l'utilisateur n'est supprimé
+    qu'avec `all: true` ; sinon `questionnaire_ids` doit être une liste non vide.
+
+    Args:
+        payload (DeleteImagesPayload): Les IDs des questionnaires à supprimer, ou `all`.
+        user: L'utilisateur actuel, récupéré via Supabase.
+
+    Returns:
+        dict: Le statut, l'ID de l'opération et les packages visés.
 
     Raises:
-        HTTPException: Si le package n'existe pas ou en cas d'erreur.
+        HTTPException: 400 si ni `questionnaire_ids` (non vide) ni `all` ne sont fournis,
+            ou si les deux le sont.
     """
-    package_name = f"user_{user.id}_q_{questionnaire_id}"
-    try:
-        delete_package_from_package_name(package_name)
-        return {"status": "success", "message": f"Package {package_name} supprimé."}
-    except HTTPException as e:
-        return {"status": "error", "message": str(e.detail)}
+    user_prefix = f"user_{user.id}_q_"
+    if payload.all and payload.questionnaire_ids:
+        raise HTTPException(status_code=400, detail="`all` et `questionnaire_ids` sont exclusifs.")
+    if payload.questionnaire_ids:
+        package_names = sorted({f"{user_prefix}{qid}" for qid in payload.questionnaire_ids})
+    elif payload.all:
+        packages, templates = await asyncio.gather(
+            list_user_packages(user_prefix),
+            run_blocking(list_template_names, user_prefix),
+        )
+        package_names = sorted(set(packages) | set(templates))
+    else:
+        raise HTTPException(
+            status_code=400,
+            detail="Aucun questionnaire sélectionné (`all: true` pour tout supprimer).",
+        )
+
+    operation = await operations.start(
+        user.id, "delete", package_names, delete_packages_with_quota(user.id, package_names)
+    )
+    return {"status": "pending", "operation_id": operation["id"], "packages": package_names}
+
+
+@app.get("/operations/{operation_id}")  # type: ignore[misc]
+async def get_operation(
+    operation_id: str,
+    user: Any = Depends(get_current_user),
+) -> Dict[str, Any]:
+    """
+    Retourne l'état d'une opération lancée en tâche de fond (ex: suppression).
+
+    L'état est partagé entre instances via le bucket : la requête peut être servie par
+    une autre instance que celle qui a lancé l'opération.
+
+    Args:
+        operation_id (str): L'ID retourné à la création de l'opération.
+        user: L'utilisateur actuel, récupéré via Supabase.
+
+    Returns:
+        dict: L'opération (`status` running|success|error, `result`, `error`, ...).
+
+    Raises:
+        HTTPException: 404 si l'opération n'existe pas ou n'appartient pas à l'utilisateur.
+    """
+    operation = await operations.get(operation_id, user.id)
+    if operation is None:
+        raise HTTPException(status_code=404, detail="Opération introuvable.")
+    return operation
+
+
+@app.get("/metrics", dependencies=[Depends(require_metrics_token)])  # type: ignore[misc]
+async def get_metrics() -> Response:
+    """Métriques au format texte Prometheus (latences par route, appels amont, étapes
+    du pipeline image, octets traités et instantanés des pools/caches/quotas).
+
+    Le service étant public, l'accès demande `Authorization: Bearer <METRICS_TOKEN>`
+    (404 si METRICS_TOKEN n'est pas défini).
+
+    Le rendu n'a lieu qu'au scrape : hors scrape, l'instrumentation se limite à des
+    mises à jour de compteurs en mémoire.
+    """
+    return Response(registry.render(), media_type="text/plain; version=0.0.4")
 
 
-@app.post("/generate_deploy_script")  # type: ignore[misc]
-def get_deploy_script(
+@app.post(
+    "/generate_deploy_script", dependencies=[Depends(limiter.by_client("generate_deploy_script"))]
+)  # type: ignore[misc]
+async def get_deploy_script(
     p: DeployScriptPayload,
 ) -> Response:
     """
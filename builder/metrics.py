@@ -0,0 +1,320 @@
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Configuration
+METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "1").lower() not in ("0", "false", "no")
+
+LATENCY_BUCKETS: Tuple[float, ...] = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+    300.0,
+    1200.0,
+)
+
+Labels = Tuple[str, ...]
+StatsSource = Callable[[], Dict[str, Any]]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{_escape(str(v))}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class _Metric:
+    """Métrique en mémoire, indexée par tuple de valeurs de labels.
+
+    Une observation ne coûte qu'un verrou et une mise à jour de dict ; le rendu au
+    format texte Prometheus n'a lieu qu'au scrape de `/metrics`.
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Labels, Any] = {}
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def _samples(self) -> Iterator[Tuple[str, Sequence[str], Sequence[str], float]]:
+        with self._lock:
+            values = dict(self._values)
+        for labels, value in sorted(values.items()):
+            yield self.name, self.labelnames, labels, value
+
+    def drain(self) -> Dict[Labels, Any]:
+        """Retourne les valeurs accumulées et les remet à zéro."""
+        with self._lock:
+            values, self._values = self._values, {}
+        return values
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        if not METRICS_ENABLED:
+            return
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def merge(self, values: Dict[Labels, float]) -> None:
+        for labels, value in values.items():
+            self.inc(*labels, amount=value)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        if not METRICS_ENABLED:
+            return
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def dec(self, *labels: str, amount: float = 1.0) -> None:
+        self.inc(*labels, amount=-amount)
+
+    @contextmanager
+    def track(self, *labels: str) -> Iterator[None]:
+        """Incrémente la jauge pendant la durée du bloc."""
+        self.inc(*labels)
+        try:
+            yield
+        finally:
+            self.dec(*labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> None:
+        self.buckets = tuple(buckets)
+        super().__init__(name, documentation, labelnames)
+
+    def observe(self, value: float, *labels: str) -> None:
+        if not METRICS_ENABLED:
+            return
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, *labels: str) -> Iterator[None]:
+        """Observe la durée du bloc (en secondes)."""
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started_at, *labels)
+
+    def merge(self, values: Dict[Labels, List[Any]]) -> None:
+        if not METRICS_ENABLED:
+            return
+        with self._lock:
+            for labels, (counts, total, count) in values.items():
+                state = self._values.get(labels)
+                if state is None:
+                    state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+                state[0] = [a + b for a, b in zip(state[0], counts)]
+                state[1] += total
+                state[2] += count
+
+    def _samples(self) -> Iterator[Tuple[str, Sequence[str], Sequence[str], float]]:
+        with self._lock:
+            values = {labels: (list(s[0]), s[1], s[2]) for labels, s in self._values.items()}
+        names = self.labelnames + ("le",)
+        for labels, (counts, total, count) in sorted(values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                yield f"{self.name}_bucket", names, labels + (le,), cumulative
+            yield f"{self.name}_sum", self.labelnames, labels, total
+            yield f"{self.name}_count", self.labelnames, labels, count
+
+
+class Registry:
+    """Ensemble des métriques exposées sur `/metrics`.
+
+    En plus des métriques instrumentées, des sources `stats()` existantes (pool image,
+    cache, quotas, ...) sont lues au moment du scrape et exposées en jauges.
+    """
+
+    def __init__(self) -> None:
+        self._metrics: List[_Metric] = []
+        self._sources: List[Tuple[str, StatsSource, Optional[str]]] = []
+
+    def register(self, metric: _Metric) -> None:
+        self._metrics.append(metric)
+
+    def register_stats(self, prefix: str, source: StatsSource, label: Optional[str] = None) -> None:
+        """Expose un instantané `stats()` en jauges `<prefix>_<clé>`.
+
+        Si `label` est fourni, `source` retourne `{valeur_du_label: {clé: valeur}}`.
+        """
+        self._sources.append((prefix, source, label))
+
+    def drain(self) -> Dict[str, Dict[Labels, Any]]:
+        """Vide les métriques de ce process (worker) pour les fusionner dans le parent."""
+        drained = {metric.name: metric.drain() for metric in self._metrics}
+        return {name: values for name, values in drained.items() if values}
+
+    def merge(self, drained: Dict[str, Dict[Labels, Any]]) -> None:
+        """Fusionne les métriques retournées par `drain` dans un autre process."""
+        for metric in self._metrics:
+            if metric.name in drained and hasattr(metric, "merge"):
+                metric.merge(drained[metric.name])
+
+    def _stats_lines(self) -> Iterator[str]:
+        for prefix, source, label in self._sources:
+            snapshot = source()
+            rows = snapshot.items() if label else [(None, snapshot)]
+            series: Dict[str, List[str]] = {}
+            for label_value, values in rows:
+                for key, value in values.items():
+                    if not isinstance(value, (int, float)):
+                        continue
+                    labels = _format_labels((label,), (label_value,)) if label else ""
+                    series.setdefault(f"{prefix}_{key}", []).append(f"{labels} {float(value)}")
+            for name, samples in series.items():
+                yield f"# TYPE {name} gauge"
+                yield from (f"{name}{sample}" for sample in samples)
+
+    def render(self) -> str:
+        """Rend toutes les métriques au format texte Prometheus (0.0.4)."""
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labelnames, labels, value in metric._samples():
+                lines.append(f"{name}{_format_labels(labelnames, labels)} {float(value)}")
+        lines.extend(self._stats_lines())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+REQUEST_SECONDS = Histogram(
+    "builder_http_request_duration_seconds",
+    "Durée des requêtes HTTP jusqu'à la fin de la réponse.",
+    ("method", "route", "status"),
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "builder_http_requests_in_flight",
+    "Requêtes HTTP en cours de traitement.",
+    ("method", "route"),
+)
+UPSTREAM_SECONDS = Histogram(
+    "builder_upstream_call_duration_seconds",
+    "Durée des appels aux services amont (Artifact Registry, GCS, Cloud Build).",
+    ("call", "outcome"),
+)
+IMAGE_STAGE_SECONDS = Histogram(
+    "builder_image_stage_duration_seconds",
+    "Durée des étapes du pipeline image (lecture, décodage, rendu PDF, encodage).",
+    ("stage", "format"),
+)
+BYTES = Counter(
+    "builder_bytes_total",
+    "Octets traités, par flux (upload reçu, entrée/sortie image, envoyés à GCS).",
+    ("flow",),
+)
+
+
+@contextmanager
+def upstream(call: str) -> Iterator[None]:
+    """Chronomètre un appel amont, avec `outcome` = ok | error."""
+    started_at = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        UPSTREAM_SECONDS.observe(time.perf_counter() - started_at, call, outcome)
+
+
+class MetricsMiddleware:
+    """Middleware ASGI : latence et requêtes en cours par route (gabarit de chemin).
+
+    La durée s'arrête au dernier message de la réponse, sans compter les tâches de
+    fond (ex: le build lancé par `/build`).
+    """
+
+    def __init__(self, app: Any) -> None:
+        self.app = app
+
+    @staticmethod
+    def _route(scope: Dict[str, Any]) -> str:
+        from starlette.routing import Match
+
+        for route in scope["app"].router.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return str(getattr(route, "path", "unknown"))
+        return "unmatched"
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        method, route = scope["method"], self._route(scope)
+        started_at = time.perf_counter()
+        status = "500"
+        done = False
+
+        def finish() -> None:
+            nonlocal done
+            if not done:
+                done = True
+                REQUESTS_IN_FLIGHT.dec(method, route)
+                REQUEST_SECONDS.observe(time.perf_counter() - started_at, method, route, status)
+
+        async def send_wrapper(message: Dict[str, Any]) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body"):
+                finish()
+
+        REQUESTS_IN_FLIGHT.inc(method, route)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            finish()
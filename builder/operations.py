@@ -0,0 +1,136 @@
+import asyncio
+import json
+import os
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Awaitable, Dict, List, Optional
+
+from fastapi import HTTPException
+from fastapi.logger import logger
+from gcp import read_json_blob, upload_image_bytes_to_gcp
+from workers import run_blocking
+
+# Configuration
+OPERATION_TTL: float = float(os.getenv("OPERATION_TTL", "3600"))
+OPERATION_MAX_ENTRIES: int = int(os.getenv("OPERATION_MAX_ENTRIES", "10000"))
+# Préfixe des états d'opération publiés dans le bucket (partagés entre instances)
+OPERATION_MARKER_PREFIX: str = "_operations"
+
+
+class OperationRegistry:
+    """Registre des opérations longues lancées en tâche de fond.
+
+    Chaque opération appartient à un utilisateur et est consultable par son ID
+    jusqu'à `ttl` secondes après sa fin. L'instance qui la lance la garde en mémoire
+    (au plus `max_entries` conservées) et publie son état dans le bucket
+    (`_operations/<id>.json`) au lancement et à la fin : les autres instances le lisent
+    de là. Une opération restée `running` plus de `ttl` secondes dans le bucket est
+    considérée comme interrompue (instance arrêtée avant la fin).
+    """
+
+    def __init__(self, ttl: float, max_entries: int) -> None:
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._operations: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._tasks: Dict[str, "asyncio.Task[Any]"] = {}
+
+    def _prune(self) -> None:
+        now = time.time()
+        for op_id in list(self._operations):
+            op = self._operations[op_id]
+            expired = op["finished_at"] is not None and now - op["finished_at"] > self.ttl
+            if expired or (len(self._operations) > self.max_entries and op_id not in self._tasks):
+                del self._operations[op_id]
+
+    async def _publish(self, operation: Dict[str, Any]) -> None:
+        try:
+            await run_blocking(
+                upload_image_bytes_to_gcp,
+                json.dumps(operation).encode("utf-8"),
+                f"{OPERATION_MARKER_PREFIX}/{operation['id']}.json",
+                content_type="application/json",
+            )
+        except Exception as e:
+            # L'opération reste suivie par l'instance qui l'a lancée
+            logger.warning(f"Publication de l'opération {operation['id']} impossible: {e}")
+
+    async def start(
+        self, owner: str, kind: str, targets: List[str], coro: Awaitable[Any]
+    ) -> Dict[str, Any]:
+        """Lance `coro` en tâche de fond et retourne l'opération créée.
+
+        Args:
+            owner (str): ID de l'utilisateur propriétaire.
+            kind (str): Type d'opération (ex: "delete").
+            targets (list): Ressources concernées.
+            coro: Coroutine à exécuter ; son résultat est stocké dans `result`.
+        Returns:
+            dict: L'opération (`id`, `status`, ...).
+        """
+        self._prune()
+        op_id = uuid.uuid4().hex
+        operation: Dict[str, Any] = {
+            "id": op_id,
+            "kind": kind,
+            "owner": owner,
+            "targets": targets,
+            "status": "running",
+            "result": None,
+            "error": None,
+            "created_at": time.time(),
+            "finished_at": None,
+        }
+        self._operations[op_id] = operation
+        # Publié avant le lancement : l'état final ne peut pas être écrasé par celui-ci
+        await self._publish(operation)
+        self._tasks[op_id] = asyncio.create_task(self._run(op_id, coro))
+        return operation
+
+    async def _run(self, op_id: str, coro: Awaitable[Any]) -> None:
+        operation = self._operations[op_id]
+        try:
+            operation["result"] = await coro
+            operation["status"] = "success"
+        except HTTPException as e:
+            operation["status"] = "error"
+            operation["error"] = str(e.detail)
+        except Exception as e:
+            logger.exception(f"Erreur dans l'opération {op_id}")
+            operation["status"] = "error"
+            operation["error"] = f"{type(e).__name__}: {e}"
+        finally:
+            operation["finished_at"] = time.time()
+            self._tasks.pop(op_id, None)
+        await self._publish(operation)
+
+    async def get(self, op_id: str, owner: str) -> Optional[Dict[str, Any]]:
+        """Retourne l'opération si elle existe et appartient à `owner`.
+
+        Cherche d'abord en mémoire, puis dans le bucket (opération lancée par une autre
+        instance).
+        """
+        operation = self._operations.get(op_id)
+        if operation is None and op_id.isalnum():
+            operation = await run_blocking(
+                read_json_blob, f"{OPERATION_MARKER_PREFIX}/{op_id}.json"
+            )
+            if operation is not None:
+                now = time.time()
+                finished_at = operation.get("finished_at")
+                if finished_at is not None and now - finished_at > self.ttl:
+                    return None
+                if finished_at is None and now - operation["created_at"] > self.ttl:
+                    operation["status"] = "error"
+                    operation["error"] = "Opération interrompue (instance arrêtée)."
+        if operation is None or operation.get("owner") != owner:
+            return None
+        return {k: v for k, v in operation.items() if k != "owner"}
+
+    async def shutdown(self) -> None:
+        """Laisse les opérations en cours se terminer (arrêt de l'application)."""
+        if self._tasks:
+            await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+
+
+operations = OperationRegistry(OPERATION_TTL, OPERATION_MAX_ENTRIES)
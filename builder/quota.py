@@ -0,0 +1,179 @@
+import asyncio
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Set, Tuple
+
+from fastapi import HTTPException
+from fastapi.logger import logger
+
+# Configuration
+MAX_IMAGES_PER_USER: int = int(os.getenv("MAX_IMAGES_PER_USER", "5"))
+QUOTA_RECONCILE_INTERVAL: float = float(os.getenv("QUOTA_RECONCILE_INTERVAL", "300"))
+# Durée de vie d'une réservation dont le build ne s'est jamais terminé
+QUOTA_RESERVATION_TTL: float = float(os.getenv("QUOTA_RESERVATION_TTL", "3600"))
+# Tant que la première réconciliation échoue : nouvel essai après 1 s, 2 s, 4 s... au plus
+QUOTA_STARTUP_RETRY_MAX: float = float(os.getenv("QUOTA_STARTUP_RETRY_MAX", "10"))
+
+PackageFetcher = Callable[[], Awaitable[Iterable[str]]]
+
+
+def package_owner(package_name: str) -> Optional[str]:
+    """Extrait l'ID utilisateur d'un nom de package `user_<id>_q_<qid>`."""
+    if not package_name.startswith("user_") or "_q_" not in package_name:
+        return None
+    return package_name[len("user_") :].split("_q_", 1)[0]
+
+
+class QuotaIndex:
+    """Index en mémoire des interfaces (packages) de chaque utilisateur.
+
+    La vérification du quota est une réservation en temps constant, sans `await`
+    entre le test et l'écriture : deux builds simultanés ne peuvent pas dépasser la
+    limite. L'index est réconcilié périodiquement avec Artifact Registry ; les
+    changements locaux postérieurs au début d'un scan sont rejoués par-dessus.
+    """
+
+    def __init__(self, limit: int, reconcile_interval: float, reservation_ttl: float) -> None:
+        self.limit = limit
+        self.reconcile_interval = reconcile_interval
+        self.reservation_ttl = reservation_ttl
+        self._packages: Dict[str, Set[str]] = {}
+        self._reservations: Dict[str, Dict[str, float]] = {}
+        self._changes: Dict[Tuple[str, str], Tuple[float, bool]] = {}
+        self._fetch: Optional[PackageFetcher] = None
+        self._ready = asyncio.Event()
+        self._task: Optional["asyncio.Task[None]"] = None
+        self._stats: Dict[str, float] = {
+            "reservations": 0,
+            "rejections": 0,
+            "reconciliations": 0,
+            "reconcile_errors": 0,
+            "last_reconcile_at": 0.0,
+            "last_reconcile_seconds": 0.0,
+        }
+
+    def _used(self, user_id: str, now: float) -> Set[str]:
+        reservations = self._reservations.get(user_id, {})
+        for package, expires_at in list(reservations.items()):
+            if expires_at < now:
+                del reservations[package]
+        return self._packages.get(user_id, set()) | set(reservations)
+
+    def reserve(self, user_id: str, package_name: str) -> None:
+        """Réserve une place pour `package_name` (no-op si le package existe déjà).
+
+        Raises:
+            HTTPException: 429 si l'utilisateur a atteint la limite.
+        """
+        now = time.time()
+        used = self._used(user_id, now)
+        if package_name not in used and len(used) >= self.limit:
+            self._stats["rejections"] += 1
+            raise HTTPException(
+                status_code=429,
+                detail=(
+                    f"Vous avez atteint la limite de {self.limit} interfaces, "
+                    "supprimez-en une pour en créer une nouvelle."
+                ),
+            )
+        self._reservations.setdefault(user_id, {})[package_name] = now + self.reservation_ttl
+        self._stats["reservations"] += 1
+
+    def confirm(self, user_id: str, package_name: str) -> None:
+        """Le build a réussi : la réservation devient un package existant."""
+        self._reservations.get(user_id, {}).pop(package_name, None)
+        self._packages.setdefault(user_id, set()).add(package_name)
+        self._changes[(user_id, package_name)] = (time.time(), True)
+
+    def release(self, user_id: str, package_name: str) -> None:
+        """Le build a échoué : la réservation est libérée."""
+        self._reservations.get(user_id, {}).pop(package_name, None)
+
+    def forget(self, user_id: str, package_name: str) -> None:
+        """Le package a été supprimé."""
+        self._packages.get(user_id, set()).discard(package_name)
+        self._changes[(user_id, package_name)] = (time.time(), False)
+
+    def usage(self, user_id: str) -> int:
+        """Nombre d'interfaces existantes ou en cours de build de l'utilisateur."""
+        return len(self._used(user_id, time.time()))
+
+    async def reconcile(self) -> None:
+        """Reconstruit l'index depuis Artifact Registry puis rejoue les changements locaux."""
+        if self._fetch is None:
+            return
+        started_at = time.time()
+        packages: Dict[str, Set[str]] = {}
+        for package_name in await self._fetch():
+            owner = package_owner(package_name)
+            if owner is not None:
+                packages.setdefault(owner, set()).add(package_name)
+
+        for (user_id, package_name), (changed_at, present) in list(self._changes.items()):
+            if changed_at < started_at:
+                del self._changes[(user_id, package_name)]
+            elif present:
+                packages.setdefault(user_id, set()).add(package_name)
+            else:
+                packages.get(user_id, set()).discard(package_name)
+
+        self._packages = packages
+        self._ready.set()
+        self._stats["reconciliations"] += 1
+        self._stats["last_reconcile_at"] = time.time()
+        self._stats["last_reconcile_seconds"] = time.time() - started_at
+
+    async def _reconcile_loop(self) -> None:
+        # Avant le premier succès, les builds attendent l'index : réessais rapprochés
+        # plutôt que d'attendre tout l'intervalle de réconciliation
+        retry_delay = 1.0
+        while True:
+            try:
+                await self.reconcile()
+            except Exception:
+                self._stats["reconcile_errors"] += 1
+                logger.exception("Erreur de réconciliation des quotas")
+            if self._ready.is_set():
+                await asyncio.sleep(self.reconcile_interval)
+            else:
+                await asyncio.sleep(min(retry_delay, QUOTA_STARTUP_RETRY_MAX))
+                retry_delay *= 2
+
+    def start(self, fetch: PackageFetcher) -> None:
+        """Démarre la réconciliation périodique avec la source `fetch`."""
+        self._fetch = fetch
+        self._task = asyncio.create_task(self._reconcile_loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def ready(self, timeout: float) -> None:
+        """Attend la première réconciliation.
+
+        Raises:
+            HTTPException: 503 si l'index n'est pas encore chargé après `timeout`.
+        """
+        if self._ready.is_set():
+            return
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            raise HTTPException(
+                status_code=503,
+                detail="Quotas en cours de chargement, veuillez réessayer.",
+                headers={"Retry-After": "5"},
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        """Retourne un instantané des métriques de l'index."""
+        return {
+            **self._stats,
+            "users": len(self._packages),
+            "pending_reservations": sum(len(r) for r in self._reservations.values()),
+        }
+
+
+quota = QuotaIndex(MAX_IMAGES_PER_USER, QUOTA_RECONCILE_INTERVAL, QUOTA_RESERVATION_TTL)
@@ -0,0 +1,235 @@
+import json
+import math
+import os
+import time
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Protocol, Tuple
+
+from fastapi import Depends, HTTPException, Request
+from users import get_current_user
+
+# Configuration : limites par route, surchargées par RATE_LIMITS (JSON)
+#   per_minute : jetons regagnés par minute, burst : taille du seau,
+#   concurrency : requêtes simultanées par utilisateur (0 = pas de limite)
+DEFAULT_RATE_LIMITS: Dict[str, Dict[str, float]] = {
+    "build": {"per_minute": 6, "burst": 3, "concurrency": 2},
+    "upload_file": {"per_minute": 20, "burst": 5, "concurrency": 2},
+    "generate_deploy_script": {"per_minute": 30, "burst": 10, "concurrency": 0},
+}
+RATE_LIMITS: Dict[str, Dict[str, float]] = {
+    route: {**DEFAULT_RATE_LIMITS.get(route, {}), **overrides}
+    for route, overrides in {
+        **{route: {} for route in DEFAULT_RATE_LIMITS},
+        **json.loads(os.getenv("RATE_LIMITS", "{}")),
+    }.items()
+}
+# "memory" (par instance) ou une URL redis:// partagée entre instances
+RATE_LIMIT_BACKEND: str = os.getenv("RATE_LIMIT_BACKEND", "memory")
+# Proxys de confiance devant l'app, qui ajoutent chacun l'IP vue à X-Forwarded-For
+# (1 : frontal Cloud Run). 0 : l'en-tête est ignoré, l'IP est celle de la connexion.
+TRUSTED_PROXY_HOPS: int = int(os.getenv("TRUSTED_PROXY_HOPS", "1"))
+MAX_TRACKED_BUCKETS: int = 100_000
+
+
+class RateLimitBackend(Protocol):
+    async def acquire(self, key: str, rate: float, burst: float) -> float:
+        """Consomme un jeton du seau `key`.
+
+        Returns:
+            float: 0 si le jeton est accordé, sinon le délai (secondes) avant le prochain.
+        """
+        ...
+
+
+class InMemoryBackend:
+    """Seaux à jetons locaux au process (non partagés entre instances)."""
+
+    def __init__(self) -> None:
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+
+    async def acquire(self, key: str, rate: float, burst: float) -> float:
+        now = time.monotonic()
+        tokens, updated_at = self._buckets.get(key, (burst, now))
+        tokens = min(burst, tokens + (now - updated_at) * rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / rate
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > MAX_TRACKED_BUCKETS:
+            self._buckets = {k: v for k, v in self._buckets.items() if now - v[1] < burst / rate}
+        return wait
+
+
+_REDIS_TOKEN_BUCKET = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local data = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(data[1]) or burst
+local ts = tonumber(data[2]) or now
+tokens = math.min(burst, tokens + (now - ts) * rate)
+local wait = 0
+if tokens >= 1 then tokens = tokens - 1 else wait = (1 - tokens) / rate end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return tostring(wait)
+"""
+
+
+class RedisBackend:
+    """Seaux à jetons partagés dans Redis (script Lua atomique).
+
+    Nécessite le paquet optionnel `redis` (`pip install redis`).
+    """
+
+    def __init__(self, url: str) -> None:
+        try:
+            from redis import asyncio as redis_asyncio
+        except ImportError as e:
+            raise RuntimeError("RATE_LIMIT_BACKEND=redis:// nécessite `pip install redis`") from e
+        self._redis = redis_asyncio.from_url(url)
+        self._script = self._redis.register_script(_REDIS_TOKEN_BUCKET)
+
+    async def acquire(self, key: str, rate: float, burst: float) -> float:
+        wait = await self._script(keys=[f"ratelimit:{key}"], args=[rate, burst])
+        return float(wait)
+
+
+def make_backend(spec: str) -> RateLimitBackend:
+    """Construit le backend à partir de RATE_LIMIT_BACKEND."""
+    if spec == "memory":
+        return InMemoryBackend()
+    if spec.startswith(("redis://", "rediss://")):
+        return RedisBackend(spec)
+    raise ValueError(f"RATE_LIMIT_BACKEND invalide: {spec}")
+
+
+def client_ip(request: Request, trusted_hops: Optional[int] = None) -> str:
+    """IP du client vue par le proxy de confiance (voir TRUSTED_PROXY_HOPS)."""
+    hops = TRUSTED_PROXY_HOPS if trusted_hops is None else trusted_hops
+    forwarded: List[str] = [
+        hop.strip() for hop in request.headers.get("x-forwarded-for", "").split(",") if hop.strip()
+    ]
+    if hops > 0 and len(forwarded) >= hops:
+        return forwarded[-hops]
+    return request.client.host if request.client else "unknown"
+
+
+class RateLimiter:
+    """Limitation de débit (seau à jetons) et de concurrence par route et par utilisateur.
+
+    Utilisé comme dépendance FastAPI : `Depends(limiter.by_user("build"))`. Au-delà de
+    la limite, la requête reçoit une 429 avec un en-tête Retry-After. Les plafonds de
+    concurrence sont toujours locaux à l'instance.
+    """
+
+    def __init__(self, backend: RateLimitBackend, limits: Dict[str, Dict[str, float]]) -> None:
+        self.backend = backend
+        self.limits = limits
+        self._in_flight: Dict[str, int] = {}
+        self._stats: Dict[str, Dict[str, int]] = {
+            route: {"allowed": 0, "throttled": 0, "concurrency_rejected": 0} for route in limits
+        }
+
+    async def _enter(self, route: str, subject: str) -> Optional[str]:
+        limit = self.limits[route]
+        stats = self._stats[route]
+        key = f"{route}:{subject}"
+
+        # Place de concurrence réservée avant le jeton : une requête refusée pour
+        # concurrence ne vide pas le seau
+        concurrency = int(limit.get("concurrency", 0))
+        if concurrency:
+            if self._in_flight.get(key, 0) >= concurrency:
+                stats["concurrency_rejected"] += 1
+                raise HTTPException(
+                    status_code=429,
+                    detail="Trop de requêtes simultanées, veuillez patienter.",
+                    headers={"Retry-After": "1"},
+                )
+            self._in_flight[key] = self._in_flight.get(key, 0) + 1
+
+        try:
+            wait = await self.backend.acquire(key, limit["per_minute"] / 60.0, limit["burst"])
+        except BaseException:
+            self._exit(key if concurrency else None)
+            raise
+        if wait > 0:
+            self._exit(key if concurrency else None)
+            stats["throttled"] += 1
+            raise HTTPException(
+                status_code=429,
+                detail="Trop de requêtes, veuillez patienter.",
+                headers={"Retry-After": str(math.ceil(wait))},
+            )
+
+        stats["allowed"] += 1
+        return key if concurrency else None
+
+    def _exit(self, key: Optional[str]) -> None:
+        if key is None:
+            return
+        self._in_flight[key] -= 1
+        if not self._in_flight[key]:
+            del self._in_flight[key]
+
+    def _releaser(self, key: Optional[str]) -> Callable[[], None]:
+        released = False
+
+        def release() -> None:
+            nonlocal released
+            if not released:
+                released = True
+                self._exit(key)
+
+        return release
+
+    def by_user(self, route: str, detach: bool = False) -> Callable[..., AsyncIterator[Any]]:
+        """Dépendance limitant `route` par ID utilisateur (via `get_current_user`).
+
+        Avec `detach=True`, la place de concurrence survit à la requête : la dépendance
+        fournit une fonction `release` à appeler à la fin de la tâche de fond lancée par
+        la route (ex: build). Elle est libérée tout de suite si la route échoue.
+        """
+
+        async def dependency(user: Any = Depends(get_current_user)) -> AsyncIterator[Any]:
+            release = self._releaser(await self._enter(route, f"user:{user.id}"))
+            try:
+                yield release
+            except BaseException:
+                release()
+                raise
+            finally:
+                if not detach:
+                    release()
+
+        return dependency
+
+    def by_client(self, route: str) -> Callable[..., AsyncIterator[None]]:
+        """Dépendance limitant `route` par adresse IP (routes non authentifiées).
+
+        L'IP retenue est celle ajoutée à X-Forwarded-For par le proxy de confiance le
+        plus éloigné (TRUSTED_PROXY_HOPS) : les entrées plus à gauche viennent du client
+        et ne sont pas prises en compte.
+        """
+
+        async def dependency(request: Request) -> AsyncIterator[None]:
+            key = await self._enter(route, f"ip:{client_ip(request)}")
+            try:
+                yield
+            finally:
+                self._exit(key)
+
+        return dependency
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Retourne un instantané des compteurs par route (dont requêtes en cours)."""
+        snapshot = {route: {**counters, "in_flight": 0} for route, counters in self._stats.items()}
+        for key, count in self._in_flight.items():
+            snapshot[key.split(":", 1)[0]]["in_flight"] += count
+        return snapshot
+
+
+limiter = RateLimiter(make_backend(RATE_LIMIT_BACKEND), RATE_LIMITS)
@@ -1,22 +1,42 @@
+import base64
+import binascii
+import codecs
+import csv
+import hmac
+import io
 import json
+import mimetypes
 import os
+import re
+import secrets
+import shutil
+import socket
+import sys
+import threading
+import time
 import uuid
+import zipfile
 from collections import OrderedDict
 from datetime import datetime
+from functools import partial, wraps
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Callable, Dict, Iterator, List, Optional, Union
+from urllib.parse import unquote
+from xml.etree import ElementTree
 
 import jsonschema
-import pandas as pd
-from flask import Flask, jsonify, render_template, request, session
+from flask import Flask, Request, Response, g, jsonify, render_template, request, session
 from flask_cors import CORS
-from werkzeug.datastructures import MultiDict
+from index import ResponseIndex, read_records
+from metrics import Counter, Gauge, Histogram, render
+from werkzeug.datastructures import FileStorage, MultiDict
+from werkzeug.security import safe_join
 
 # Configuration
 QID: str = os.environ.get('Q_ID', '')
 if not QID:
     raise EnvironmentError("Environment variable Q_ID must be set")
-BASE_STORAGE: Path = Path("/app/data") / QID
+BASE_STORAGE: Path = Path(os.environ.get('DATA_DIR', '/app/data')) / QID
 ALLOWED_EXTENSIONS: set[str] = {
     'png',
     'jpg',
@@ -29,6 +49,22 @@ ALLOWED_EXTENSIONS: set[str] = {
     'csv',
     'json',
 }
+# /healthz répond 503 en dessous de cet espace libre sur le volume de données
+HEALTHZ_MIN_FREE_BYTES: int = int(os.environ.get('HEALTHZ_MIN_FREE_BYTES', str(50 * 1024**2)))
+# Token d'accès aux réponses ; à défaut, généré au premier usage dans le volume de données
+SURVEY_ADMIN_TOKEN: str = os.environ.get('SURVEY_ADMIN_TOKEN', '')
+RESPONSES_MAX_LIMIT: int = 1000
+# Taille maximale des champs texte d'une soumission : les fichiers envoyés par le
+# formulaire sont des data-URL (base64) dans les champs, pas des parties multipart
+MAX_FORM_MEMORY_SIZE: int = int(os.environ.get('MAX_FORM_MEMORY_SIZE', str(50 * 1024**2)))
+# data:<type>[;name=<fichier>][;base64],<données> ; un champ liste de fichiers arrive
+# comme des data-URL séparées par des virgules (FormData.append d'un tableau)
+DATA_URL_PATTERN = re.compile(r'data:(?P<mime>[^;,]*)(?P<params>(?:;[^;,]*)*),(?P<data>[^,]*)')
+# Espaces de noms XML des .xlsx (lecture des anciens fichiers de réponses)
+XLSX_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+XLSX_REL_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+# Taille des blocs lus quand sendfile n'est pas disponible, et des blocs de l'archive ZIP
+ATTACHMENT_CHUNK_SIZE: int = 1024 * 1024
 
 SCHEMA: Dict[str, Any]
 UI_SCHEMA: Dict[str, Any]
@@ -40,15 +76,374 @@ with open('ui_schema.json', 'r') as f:
 JSONType = Union[str, int, float, bool, None, Dict[str, Any], List[Any]]
 ParsedData = Dict[str, JSONType]
 
+# Colonnes du fichier de réponses : champs du schéma puis métadonnées de l'entrée
+COLUMNS: List[str] = list(dict.fromkeys([*SCHEMA.get('properties', {}), 'entry_id', 'date']))
+VALIDATOR = jsonschema.validators.validator_for(SCHEMA)(SCHEMA)
+# Index secondaires du fichier de réponses, construits au premier appel de /responses
+RESPONSE_INDEX = ResponseIndex(SCHEMA, COLUMNS)
+
+
+class SurveyRequest(Request):
+    max_form_memory_size = MAX_FORM_MEMORY_SIZE
+
+
 app = Flask(__name__)
+app.request_class = SurveyRequest
+app.config['MAX_FORM_MEMORY_SIZE'] = MAX_FORM_MEMORY_SIZE
 app.secret_key = os.urandom(24)
 CORS(app, resources={r"/submit": {"origins": "*"}})
 
+# Sérialise les écritures du fichier de réponses (serveur multi-threadé)
+_write_lock = threading.Lock()
+# Une seule construction des index à la fois
+_index_build_lock = threading.Lock()
+
+# État du stockage, initialisé au premier scrape puis tenu à jour à chaque soumission
+_store_lock = threading.Lock()
+_store_state: Dict[str, Optional[int]] = {'entries': None, 'upload_bytes': None}
+
+
+def _store_path() -> Path:
+    return BASE_STORAGE / f"{QID}.csv"
+
+
+def _legacy_excel_path() -> Path:
+    return BASE_STORAGE / f"{QID}.xlsx"
+
+
+def _count_entries() -> int:
+    """Nombre d'entrées du fichier de réponses (une ligne CSV par entrée, hors en-tête)."""
+    if not _store_path().exists():
+        return 0
+    with open(_store_path(), newline='', encoding='utf-8-sig') as f:
+        return max(0, sum(1 for _ in csv.reader(f)) - 1)
+
+
+def _to_cell(value: JSONType) -> str:
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, ensure_ascii=False)
+    return str(value)
+
+
+def _from_cell(value: str, field_schema: Dict[str, Any]) -> JSONType:
+    """Retype une cellule CSV selon le schéma du champ (pour l'export Excel)."""
+    if value == '':
+        return None
+    field_type = field_schema.get('type')
+    try:
+        if field_type == 'number':
+            return float(value)
+        if field_type == 'integer':
+            return int(value)
+        if field_type == 'boolean':
+            return value == 'true'
+    except ValueError:
+        pass
+    return value
+
+
+def _csv_line(cells: List[str]) -> bytes:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(cells)
+    return buffer.getvalue().encode('utf-8')
+
+
+def append_entry(row: Dict[str, JSONType]) -> int:
+    """Ajoute une entrée au fichier de réponses et retourne le nombre d'entrées.
+
+    Le fichier est en ajout seul : une soumission coûte une écriture de ligne, quelle
+    que soit la taille du stock. La ligne est écrite en un seul `write` (O_APPEND) et
+    ajoutée aux index de /responses s'ils sont chargés.
+    """
+    cells = [_to_cell(row.get(column)) for column in COLUMNS]
+    with _write_lock:
+        store_entries()
+        with open(_store_path(), 'ab') as f:
+            if f.tell() == 0:
+                # BOM UTF-8 : Excel (Windows) ouvre le fichier sans casser les accents
+                f.write(codecs.BOM_UTF8 + _csv_line(COLUMNS))
+            offset = f.tell()
+            line = _csv_line(cells)
+            f.write(line)
+        if RESPONSE_INDEX.loaded:
+            RESPONSE_INDEX.add(offset, offset + len(line), cells)
+        with _store_lock:
+            _store_state['entries'] = (_store_state['entries'] or 0) + 1
+            return _store_state['entries']
+
+
+def _extend_index() -> None:
+    if _store_path().exists():
+        with open(_store_path(), 'rb') as f:
+            RESPONSE_INDEX.extend(f)
+
+
+def _ensure_index() -> None:
+    """Construit les index au premier usage.
+
+    Le gros de la lecture se fait hors de `_write_lock` (les soumissions continuent) ;
+    les entrées écrites entre-temps sont rattrapées sous le verrou, après quoi
+    `append_entry` tient les index à jour.
+    """
+    if RESPONSE_INDEX.loaded:
+        return
+    with _index_build_lock:
+        if RESPONSE_INDEX.loaded:
+            return
+        _extend_index()
+        with _write_lock:
+            _extend_index()
+            RESPONSE_INDEX.loaded = True
+
+
+def _typed_entry(cells: List[str]) -> Dict[str, JSONType]:
+    """Entrée typée selon le schéma (listes et chemins de fichiers décodés)."""
+    properties = SCHEMA.get('properties', {})
+    entry: Dict[str, JSONType] = {}
+    for column, raw in zip(COLUMNS, cells):
+        prop = properties.get(column, {})
+        if raw and (prop.get('type') == 'array' or prop.get('format') == 'data-url'):
+            try:
+                entry[column] = json.loads(raw)
+                continue
+            except ValueError:
+                pass
+        entry[column] = _from_cell(raw, prop)
+    return entry
+
+
+def read_entries() -> Iterator[Dict[str, str]]:
+    """Parcourt les entrées du fichier de réponses (valeurs brutes, chaînes)."""
+    if not _store_path().exists():
+        return
+    with open(_store_path(), newline='', encoding='utf-8-sig') as f:
+        yield from csv.DictReader(f)
+
+
+def export_excel(destination: Path) -> int:
+    """Exporte les réponses en .xlsx (valeurs retypées selon le schéma).
+
+    openpyxl n'est importé qu'ici : il n'est installé dans l'image que si elle est
+    construite avec WITH_EXCEL=1 (requirements-excel.txt).
+    """
+    from openpyxl import Workbook
+
+    properties = SCHEMA.get('properties', {})
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(COLUMNS)
+    count = 0
+    for entry in read_entries():
+        sheet.append([_from_cell(entry.get(c) or '', properties.get(c, {})) for c in COLUMNS])
+        count += 1
+    tmp_path = destination.with_suffix('.tmp.xlsx')
+    workbook.save(tmp_path)
+    os.replace(tmp_path, destination)
+    return count
+
+
+def _xlsx_text(element: ElementTree.Element) -> str:
+    return ''.join(t.text or '' for t in element.iter(f'{XLSX_NS}t'))
+
+
+def _xlsx_column(reference: str) -> int:
+    """Index (0-based) de la colonne d'une référence de cellule (`C5` -> 2)."""
+    index = 0
+    for char in reference:
+        if not char.isalpha():
+            break
+        index = index * 26 + ord(char.upper()) - ord('A') + 1
+    return index - 1
+
+
+def _xlsx_value(cell: ElementTree.Element, shared: List[str]) -> JSONType:
+    kind = cell.get('t', 'n')
+    if kind == 'inlineStr':
+        inline = cell.find(f'{XLSX_NS}is')
+        return _xlsx_text(inline) if inline is not None else None
+    value = cell.find(f'{XLSX_NS}v')
+    if value is None or value.text is None:
+        return None
+    text = value.text
+    if kind == 's':
+        return shared[int(text)]
+    if kind == 'b':
+        return text == '1'
+    if kind == 'n':
+        # Même lecture qu'openpyxl : entier sauf décimale ou exposant
+        return float(text) if '.' in text or 'E' in text.upper() else int(text)
+    return text
+
+
+def _xlsx_rows(path: Path) -> Iterator[List[JSONType]]:
+    """Lignes de la première feuille d'un .xlsx, lues avec la bibliothèque standard.
+
+    Couvre ce qu'écrivaient les anciennes images (pandas + openpyxl) : chaînes partagées
+    ou en ligne, nombres et booléens ; les dates y sont des chaînes.
+    """
+    with zipfile.ZipFile(path) as archive:
+        workbook = ElementTree.fromstring(archive.read('xl/workbook.xml'))
+        sheet = workbook.find(f'{XLSX_NS}sheets/{XLSX_NS}sheet')
+        if sheet is None:
+            raise ValueError("classeur sans feuille")
+        rel_id = sheet.get(f'{XLSX_REL_NS}id')
+        rels = ElementTree.fromstring(archive.read('xl/_rels/workbook.xml.rels'))
+        target = next(rel.get('Target', '') for rel in rels if rel.get('Id') == rel_id)
+        sheet_path = target.lstrip('/') if target.startswith('/') else f"xl/{target}"
+        shared: List[str] = []
+        if 'xl/sharedStrings.xml' in archive.namelist():
+            strings = ElementTree.fromstring(archive.read('xl/sharedStrings.xml'))
+            shared = [_xlsx_text(item) for item in strings]
+        with archive.open(sheet_path) as f:
+            for _, row in ElementTree.iterparse(f):
+                if row.tag != f'{XLSX_NS}row':
+                    continue
+                values: List[JSONType] = []
+                for cell in row:
+                    reference = cell.get('r')
+                    column = _xlsx_column(reference) if reference else len(values)
+                    values.extend([None] * (column - len(values)))
+                    values.append(_xlsx_value(cell, shared))
+                row.clear()
+                yield values
+
+
+def migrate_legacy_excel() -> None:
+    """Convertit le fichier de réponses .xlsx des anciennes images en CSV.
+
+    La lecture n'utilise que la bibliothèque standard : la migration a lieu aussi sur
+    l'image par défaut, sans openpyxl. L'ancien fichier est conservé.
+
+    Raises:
+        RuntimeError: Si l'ancien fichier est illisible. Le démarrage s'arrête plutôt
+            que de repartir d'un fichier de réponses vide.
+    """
+    legacy_path = _legacy_excel_path()
+    if not legacy_path.exists() or _store_path().exists():
+        return
+    tmp_path = _store_path().with_suffix('.tmp.csv')
+    count = 0
+    try:
+        rows = _xlsx_rows(legacy_path)
+        header = [str(cell) for cell in next(rows, [])]
+        with open(tmp_path, 'w', newline='', encoding='utf-8-sig') as f:
+            writer = csv.writer(f)
+            writer.writerow(COLUMNS)
+            for values in rows:
+                legacy = dict(zip(header, values))
+                writer.writerow(
+                    ['' if legacy.get(c) is None else _to_cell(legacy[c]) for c in COLUMNS]
+                )
+                count += 1
+    except (OSError, KeyError, ValueError, StopIteration, zipfile.BadZipFile) as e:
+        tmp_path.unlink(missing_ok=True)
+        raise RuntimeError(f"{legacy_path} non migré : fichier illisible ({e})") from e
+    except ElementTree.ParseError as e:
+        tmp_path.unlink(missing_ok=True)
+        raise RuntimeError(f"{legacy_path} non migré : XML invalide ({e})") from e
+    os.replace(tmp_path, _store_path())
+    app.logger.warning("%s migré vers %s (%d entrées)", legacy_path, _store_path(), count)
+
+
+def _scan_upload_bytes() -> int:
+    """Taille totale des fichiers uploadés (dossiers par champ sous BASE_STORAGE)."""
+    total = 0
+    if not BASE_STORAGE.exists():
+        return 0
+    for root, _, files in os.walk(BASE_STORAGE):
+        if Path(root) == BASE_STORAGE:
+            continue
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return total
+
+
+def store_entries() -> int:
+    with _store_lock:
+        if _store_state['entries'] is None:
+            _store_state['entries'] = _count_entries()
+        return _store_state['entries']
+
+
+def upload_bytes_on_disk() -> int:
+    with _store_lock:
+        if _store_state['upload_bytes'] is None:
+            _store_state['upload_bytes'] = _scan_upload_bytes()
+        return _store_state['upload_bytes']
+
+
+def _record_upload_bytes(size: int) -> None:
+    with _store_lock:
+        if _store_state['upload_bytes'] is not None:
+            _store_state['upload_bytes'] += size
+
+
+def _disk_free_bytes() -> int:
+    path = BASE_STORAGE if BASE_STORAGE.exists() else BASE_STORAGE.parent
+    try:
+        return shutil.disk_usage(path).free
+    except OSError:
+        return 0
+
+
+REQUESTS = Counter(
+    'survey_http_requests_total',
+    'Requêtes HTTP traitées.',
+    ('method', 'endpoint', 'status'),
+)
+REQUEST_SECONDS = Histogram(
+    'survey_http_request_duration_seconds',
+    'Durée des requêtes HTTP.',
+    ('method', 'endpoint'),
+)
+SUBMIT_STAGE_SECONDS = Histogram(
+    'survey_submit_stage_duration_seconds',
+    'Durée des étapes de /submit (file_save, validation, parse, persistence).',
+    ('stage',),
+)
+SUBMIT_ERRORS = Counter(
+    'survey_submit_errors_total',
+    'Soumissions en erreur, par type (validation ou server).',
+    ('kind',),
+)
+ATTACHMENT_BYTES = Counter(
+    'survey_attachment_bytes_total',
+    'Octets de pièces jointes servis, par mode (sendfile, read, zip).',
+    ('mode',),
+)
+Gauge(
+    'survey_store_size_bytes',
+    'Taille du fichier de réponses.',
+    lambda: _store_path().stat().st_size if _store_path().exists() else 0,
+)
+Gauge('survey_store_entries', 'Nombre de réponses enregistrées.', store_entries)
+Gauge(
+    'survey_upload_bytes_on_disk', 'Taille des fichiers uploadés sur disque.', upload_bytes_on_disk
+)
+Gauge('survey_disk_free_bytes', 'Espace libre sur le volume de données.', _disk_free_bytes)
+
+
+@app.before_request  # type: ignore[misc]
+def start_timer() -> None:
+    g.started_at = time.perf_counter()
+
+
+@app.after_request  # type: ignore[misc]
+def record_request(response: Response) -> Response:
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    REQUESTS.inc(request.method, endpoint, str(response.status_code))
+    if 'started_at' in g:
+        REQUEST_SECONDS.observe(time.perf_counter() - g.started_at, request.method, endpoint)
+    return response
+
 
 def parse_form_data(form_data: MultiDict[str, Any], json_schema: Dict[str, Any]) -> ParsedData:
     """
     Parse les données d'un formulaire (MultiDict) selon un schéma JSON.
-    Retourne un dict prêt à être inséré dans un Excel.
+    Retourne un dict prêt à être ajouté au fichier de réponses.
 
     Args:
         form_data (MultiDict): Les données du formulaire à parser.
@@ -114,6 +509,43 @@ def get_file_fields(schema: Dict[str, Any]) -> List[str]:
     ]
 
 
+def decode_data_urls(field_name: str, value: str) -> List[FileStorage]:
+    """Fichiers d'un champ data-url tel qu'envoyé par le formulaire (une ou plusieurs
+    data-URL base64, avec le nom d'origine dans le paramètre `name` si présent).
+
+    Args:
+        field_name (str): Le nom du champ de fichier.
+        value (str): La valeur du champ ('' si aucun fichier).
+    Returns:
+        list: Les fichiers décodés, à passer à `save_uploaded_files`.
+    Raises:
+        ValueError: Si la valeur n'est pas une suite de data-URL base64 valides.
+    """
+    if not value:
+        return []
+    matches = list(DATA_URL_PATTERN.finditer(value))
+    if not matches or ','.join(m.group(0) for m in matches) != value:
+        raise ValueError("data-URL invalide")
+
+    files: List[FileStorage] = []
+    for idx, match in enumerate(matches):
+        params = match.group('params').split(';')[1:]
+        if 'base64' not in params:
+            raise ValueError("data-URL non encodée en base64")
+        try:
+            content = base64.b64decode(match.group('data'), validate=True)
+        except binascii.Error:
+            raise ValueError("data-URL : base64 invalide")
+        filename = next((unquote(p[len('name=') :]) for p in params if p.startswith('name=')), '')
+        if not Path(filename).suffix:
+            extension = mimetypes.guess_extension(match.group('mime')) or ''
+            filename = f"{field_name}_{idx + 1}{extension}"
+        files.append(
+            FileStorage(io.BytesIO(content), filename=filename, content_type=match.group('mime'))
+        )
+    return files
+
+
 def save_uploaded_files(field_name: str, files: List[Any], entry_id: str) -> List[str]:
     """Sauvegarde les fichiers en local sur la machine du serveur.
     Crée un répertoire pour chaque champ de fichier et enregistre les fichiers avec un nom unique.
@@ -123,7 +555,7 @@ def save_uploaded_files(field_name: str, files: List[Any], entry_id: str) -> Lis
         files (list): Liste des fichiers uploadés.
         entry_id (str): L'ID de l'entrée du questionnaire.
     Returns:
-        list: Liste des chemins relatifs des fichiers sauvegardés pour ajouter dans l'Excel.
+        list: Liste des chemins relatifs des fichiers sauvegardés pour le fichier de réponses.
     """
     field_dir: Path = BASE_STORAGE / field_name / entry_id
     field_dir.mkdir(parents=True, exist_ok=True)
@@ -140,11 +572,54 @@ def save_uploaded_files(field_name: str, files: List[Any], entry_id: str) -> Lis
         filename = f"{field_name}_{entry_id}_{idx + 1}{ext}"
         filepath = field_dir / filename
         file.save(filepath)
+        _record_upload_bytes(filepath.stat().st_size)
         saved_files.append(str(filepath.relative_to(BASE_STORAGE)))
 
     return saved_files
 
 
+def discard_uploaded_files(field_names: List[str], entry_id: str) -> None:
+    """Supprime les fichiers d'une entrée non enregistrée (soumission rejetée)."""
+    for field_name in field_names:
+        field_dir: Path = BASE_STORAGE / field_name / entry_id
+        if not field_dir.exists():
+            continue
+        size = sum(path.stat().st_size for path in field_dir.iterdir() if path.is_file())
+        shutil.rmtree(field_dir, ignore_errors=True)
+        _record_upload_bytes(-size)
+
+
+def admin_token() -> str:
+    """Token d'accès aux réponses : SURVEY_ADMIN_TOKEN, sinon `.admin_token` du volume."""
+    if SURVEY_ADMIN_TOKEN:
+        return SURVEY_ADMIN_TOKEN
+    token_path = BASE_STORAGE / '.admin_token'
+    try:
+        return token_path.read_text().strip()
+    except FileNotFoundError:
+        BASE_STORAGE.mkdir(parents=True, exist_ok=True)
+        token = secrets.token_urlsafe(32)
+        fd = os.open(token_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            f.write(token)
+        return token
+
+
+def require_admin(view: Callable[..., Any]) -> Callable[..., Any]:
+    """Réserve la route au propriétaire du questionnaire (Authorization: Bearer <token>)."""
+
+    @wraps(view)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        scheme, _, given = request.headers.get('Authorization', '').partition(' ')
+        if scheme.lower() != 'bearer' or not hmac.compare_digest(given, admin_token()):
+            response = jsonify(status="error", errors={"_global": "Token d'accès invalide"})
+            response.headers['WWW-Authenticate'] = 'Bearer'
+            return response, 401
+        return view(*args, **kwargs)
+
+    return wrapper
+
+
 @app.route('/')  # type: ignore[misc]
 def form() -> Any:
     return render_template(
@@ -160,45 +635,304 @@ def submit() -> Any:
         data: MultiDict[str, Any] = request.form.copy()
         file_fields: List[str] = get_file_fields(SCHEMA)
 
+        # Tous les fichiers sont vérifiés avant d'en écrire un seul
+        uploads: Dict[str, List[FileStorage]] = {}
         for field in file_fields:
-            files = request.files.getlist(field)
-            if files and files[0].filename:
-                saved_paths: List[str] = save_uploaded_files(field, files, entry_id)
-                data[field] = json.dumps(saved_paths)
-            else:
-                data[field] = None
-
-        jsonschema.validate(data, SCHEMA)
-
-        parsed_data: ParsedData = parse_form_data(request.form, SCHEMA)
-        df: pd.DataFrame = pd.DataFrame([parsed_data])
+            # Le formulaire envoie des data-URL ; les parties multipart restent acceptées
+            files = [f for f in request.files.getlist(field) if f.filename]
+            if not files:
+                try:
+                    files = decode_data_urls(field, request.form.get(field, ''))
+                except ValueError as e:
+                    raise jsonschema.ValidationError(str(e), path=[field])
+            if any(
+                Path(f.filename).suffix.lower().lstrip('.') not in ALLOWED_EXTENSIONS for f in files
+            ):
+                raise jsonschema.ValidationError(
+                    f"Type de fichier non autorisé ({', '.join(sorted(ALLOWED_EXTENSIONS))})",
+                    path=[field],
+                )
+            uploads[field] = files
 
-        df['entry_id'] = entry_id
-        df['date'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-        excel_path: Path = BASE_STORAGE / f"{QID}.xlsx"
-        if excel_path.exists():
-            existing_df: pd.DataFrame = pd.read_excel(excel_path)
-            df = pd.concat([existing_df, df], ignore_index=True)
-
-        df.to_excel(excel_path, index=False)
+        try:
+            with SUBMIT_STAGE_SECONDS.time('file_save'):
+                for field, files in uploads.items():
+                    data[field] = (
+                        json.dumps(save_uploaded_files(field, files, entry_id)) if files else None
+                    )
+
+            # Les valeurs du formulaire sont des chaînes : la validation porte sur les
+            # données typées, sans les champs absents.
+            with SUBMIT_STAGE_SECONDS.time('parse'):
+                parsed_data: ParsedData = parse_form_data(data, SCHEMA)
+
+            with SUBMIT_STAGE_SECONDS.time('validation'):
+                VALIDATOR.validate({k: v for k, v in parsed_data.items() if v is not None})
+
+            with SUBMIT_STAGE_SECONDS.time('persistence'):
+                parsed_data['entry_id'] = entry_id
+                parsed_data['date'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                append_entry(parsed_data)
+        except Exception:
+            # Entrée non enregistrée : pas de fichiers orphelins sur le volume
+            discard_uploaded_files(list(uploads), entry_id)
+            raise
 
         session['success_message'] = f"Entrée {entry_id} enregistrée !"
         return jsonify({"status": "ok", "entry_id": entry_id})
 
     except jsonschema.ValidationError as e:
+        SUBMIT_ERRORS.inc('validation')
         return (
             jsonify(status="error", errors={'.'.join(e.path) or "_global": e.message}),
             400,
         )
 
     except Exception as e:
+        SUBMIT_ERRORS.inc('server')
         return (
             jsonify(status="error", errors={"_global": f"Erreur serveur: {str(e)}"}),
             500,
         )
 
 
+@app.route('/responses')  # type: ignore[misc]
+@require_admin
+def responses() -> Any:
+    """Réponses filtrées et paginées, servies par les index secondaires.
+
+    Filtres sur les champs indexés (enums, booléens, listes à choix, nombres, dates) :
+    `<champ>=v` (répétable), `<champ>__gte|gt|lte|lt=v`, `entry_id=...`, `date__gte=...`
+    (date de soumission). Pagination : `limit` (max RESPONSES_MAX_LIMIT), `offset`,
+    `order=desc|asc` (ordre de soumission).
+    """
+    try:
+        limit = min(RESPONSES_MAX_LIMIT, max(1, int(request.args.get('limit', 50))))
+        offset = max(0, int(request.args.get('offset', 0)))
+        order = request.args.get('order', 'desc')
+        if order not in ('asc', 'desc'):
+            raise ValueError("order : asc ou desc")
+        _ensure_index()
+        with _write_lock:
+            total, offsets = RESPONSE_INDEX.query(request.args, order, offset, limit)
+    except ValueError as e:
+        return (
+            jsonify(
+                status="error",
+                errors={"_global": str(e)},
+                filterable=RESPONSE_INDEX.filterable(),
+            ),
+            400,
+        )
+
+    items: List[Dict[str, JSONType]] = []
+    if offsets:
+        with open(_store_path(), 'rb') as f:
+            items = [_typed_entry(cells) for cells in read_records(f, offsets)]
+    return jsonify(
+        status="ok",
+        total=total,
+        offset=offset,
+        limit=limit,
+        next_offset=offset + limit if offset + limit < total else None,
+        items=items,
+    )
+
+
+def _attachment_path(relative: str) -> Optional[Path]:
+    """Fichier du volume désigné par un chemin relatif (None si hors du volume ou absent)."""
+    joined = safe_join(str(BASE_STORAGE), relative)
+    if joined is None or not os.path.isfile(joined):
+        return None
+    return Path(joined)
+
+
+def _file_body(
+    path: Path, start: int, length: int, sock: Optional[socket.socket]
+) -> Iterator[bytes]:
+    """Corps d'un téléchargement : les octets [start, start + length) du fichier.
+
+    Sous le serveur Flask du conteneur, les octets vont du cache de pages au socket
+    par sendfile(2), sans copie dans Python. Ailleurs (autre serveur WSGI, client de
+    test), le fichier est lu par blocs.
+    """
+    with open(path, 'rb') as f:
+        if sock is not None:
+            # Un bloc vide fait envoyer les en-têtes par le serveur avant le corps
+            yield b''
+            ATTACHMENT_BYTES.inc('sendfile', amount=sock.sendfile(f, start, length))
+            return
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(ATTACHMENT_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            ATTACHMENT_BYTES.inc('read', amount=len(chunk))
+            yield chunk
+
+
+class _ZipSink(io.RawIOBase):
+    """Flux non seekable dans lequel écrit `zipfile` ; le générateur le vide à chaque bloc."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data: Any) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        ATTACHMENT_BYTES.inc('zip', amount=len(data))
+        return data
+
+
+def _attachment_paths(offsets: List[int], fields: List[str]) -> Iterator[str]:
+    """Chemins relatifs des pièces jointes des entrées aux offsets donnés."""
+    if not offsets:
+        return
+    columns = [COLUMNS.index(field) for field in fields]
+    with open(_store_path(), 'rb') as store:
+        for cells in read_records(store, offsets):
+            for column in columns:
+                raw = cells[column] if column < len(cells) else ''
+                yield from json.loads(raw) if raw else []
+
+
+def _zip_stream(offsets: List[int], fields: List[str]) -> Iterator[bytes]:
+    """Archive ZIP des pièces jointes des entrées aux offsets donnés, produite au fil de l'eau.
+
+    Rien n'est préparé sur disque ni en mémoire : chaque fichier est copié par blocs de
+    ATTACHMENT_CHUNK_SIZE (entrées non compressées, les formats acceptés le sont déjà
+    pour la plupart) et chaque bloc part dès qu'il est écrit. Chemins dans l'archive :
+    `<champ>/<entry_id>/<fichier>`, comme sur le volume.
+    """
+    sink = _ZipSink()
+    with zipfile.ZipFile(sink, 'w') as archive:
+        for relative in _attachment_paths(offsets, fields):
+            path = _attachment_path(relative)
+            if path is None:
+                continue
+            info = zipfile.ZipInfo.from_file(path, relative)
+            with open(path, 'rb') as src, archive.open(
+                info, 'w', force_zip64=info.file_size >= zipfile.ZIP64_LIMIT
+            ) as dest:
+                for chunk in iter(partial(src.read, ATTACHMENT_CHUNK_SIZE), b''):
+                    dest.write(chunk)
+                    if sink.chunks:
+                        yield sink.drain()
+            if sink.chunks:
+                yield sink.drain()
+    # Répertoire central, écrit à la fermeture de l'archive
+    yield sink.drain()
+
+
+@app.route('/attachments/<field>/<entry_id>/<filename>')  # type: ignore[misc]
+@require_admin
+def attachment(field: str, entry_id: str, filename: str) -> Any:
+    """Une pièce jointe, avec requêtes partielles (Range) et conditionnelles (ETag, date)."""
+    path = None
+    if field in get_file_fields(SCHEMA):
+        path = _attachment_path(f"{field}/{entry_id}/{filename}")
+    if path is None:
+        return jsonify(status="error", errors={"_global": "Pièce jointe introuvable"}), 404
+
+    stat = path.stat()
+    response = Response(
+        mimetype=mimetypes.guess_type(path.name)[0] or 'application/octet-stream',
+        direct_passthrough=True,
+    )
+    response.content_length = stat.st_size
+    response.last_modified = stat.st_mtime
+    response.set_etag(f"{stat.st_mtime_ns:x}-{stat.st_size:x}")
+    response.cache_control.private = True
+    response.headers['Content-Disposition'] = f'attachment; filename="{path.name}"'
+    response.make_conditional(request, accept_ranges=True, complete_length=stat.st_size)
+    if response.status_code == 206:
+        start = response.content_range.start
+        length = response.content_range.stop - start
+    elif response.status_code == 200:
+        start, length = 0, stat.st_size
+    else:  # 304, 412 : pas de corps
+        return response
+    response.response = _file_body(path, start, length, request.environ.get('werkzeug.socket'))
+    return response
+
+
+@app.route('/attachments.zip')  # type: ignore[misc]
+@require_admin
+def attachments_archive() -> Any:
+    """Archive ZIP des pièces jointes, envoyée en flux.
+
+    `field=<champ fichier>` (répétable ; par défaut tous les champs fichier) et les
+    filtres de /responses choisissent les entrées, p. ex. `date__gte=2025-02-01&
+    date__lte=2025-02-28` pour les soumissions d'une période.
+    """
+    file_fields = get_file_fields(SCHEMA)
+    fields = request.args.getlist('field') or file_fields
+    filters: MultiDict[str, str] = MultiDict(
+        [(key, value) for key, value in request.args.items(multi=True) if key != 'field']
+    )
+    try:
+        unknown = [field for field in fields if field not in file_fields]
+        if unknown:
+            raise ValueError(f"{', '.join(unknown)} : champ fichier inconnu")
+        _ensure_index()
+        with _write_lock:
+            _, offsets = RESPONSE_INDEX.query(filters, 'asc', 0, len(RESPONSE_INDEX.offsets))
+    except ValueError as e:
+        return (
+            jsonify(
+                status="error",
+                errors={"_global": str(e)},
+                filterable=RESPONSE_INDEX.filterable(),
+            ),
+            400,
+        )
+
+    return Response(
+        _zip_stream(offsets, fields),
+        mimetype='application/zip',
+        headers={'Content-Disposition': f'attachment; filename="{QID}-attachments.zip"'},
+        direct_passthrough=True,
+    )
+
+
+@app.route('/healthz')  # type: ignore[misc]
+def healthz() -> Any:
+    """Vérifie que le volume de données est accessible en écriture et non saturé."""
+    writable = BASE_STORAGE.is_dir() and os.access(BASE_STORAGE, os.W_OK)
+    free = _disk_free_bytes()
+    healthy = writable and free >= HEALTHZ_MIN_FREE_BYTES
+    return (
+        jsonify(status="ok" if healthy else "error", writable=writable, disk_free_bytes=free),
+        200 if healthy else 503,
+    )
+
+
+@app.route('/metrics')  # type: ignore[misc]
+def metrics() -> Any:
+    """Métriques au format texte Prometheus."""
+    return Response(render(), mimetype='text/plain; version=0.0.4')
+
+
 if __name__ == '__main__':
     BASE_STORAGE.mkdir(parents=True, exist_ok=True)
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    if sys.argv[1:2] == ['export-xlsx']:
+        # docker exec <conteneur> python app.py export-xlsx [/app/data/<qid>/export.xlsx]
+        target = Path(sys.argv[2]) if len(sys.argv) > 2 else BASE_STORAGE / 'export.xlsx'
+        print(f"{export_excel(target)} entrées exportées dans {target}")
+        sys.exit(0)
+    if sys.argv[1:2] == ['admin-token']:
+        # docker exec <conteneur> python app.py admin-token
+        print(admin_token())
+        sys.exit(0)
+    migrate_legacy_excel()
+    # Pas de reloader ni de debugger par défaut : un seul process, démarrage plus rapide
+    app.run(host='0.0.0.0', port=5000, debug=os.environ.get('FLASK_DEBUG') == '1')
@@ -0,0 +1,351 @@
+import bisect
+import codecs
+import csv
+import io
+import json
+from array import array
+from operator import itemgetter
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+from werkzeug.datastructures import MultiDict
+
+# Opérateurs de plage : `<champ>__gte=...`
+RANGE_OPERATORS: Tuple[str, ...] = ('gte', 'gt', 'lte', 'lt')
+# Paramètres de /responses qui ne sont pas des filtres
+RESERVED_PARAMS = frozenset({'limit', 'offset', 'order'})
+SUBMISSION_DATE = 'date'
+
+# (candidats triés par position, nombre estimé, test d'une position)
+Plan = Tuple[Callable[[], Sequence[int]], int, Callable[[int], bool]]
+TRUTHY = ('true', '1', 'yes', 'on')
+# Ajouts en attente par index de plage avant fusion dans les clés triées
+RANGE_MERGE_THRESHOLD: int = 4096
+
+
+def _iter_records(f: BinaryIO) -> Iterator[Tuple[int, bytes]]:
+    """Parcourt un CSV en binaire : (offset, octets) de chaque enregistrement.
+
+    Un enregistrement peut contenir des retours à la ligne entre guillemets : il est
+    complet quand le nombre de `"` accumulés est pair (les `"` internes sont doublés).
+    Seuls les enregistrements terminés par un retour à la ligne sont rendus : une fin de
+    fichier sans `\n` (écriture en cours ou interrompue) est laissée au passage suivant.
+    """
+    offset = f.tell()
+    pending: List[bytes] = []
+    quotes = 0
+    for line in f:
+        if not line.endswith(b'\n'):
+            return
+        pending.append(line)
+        quotes += line.count(b'"')
+        if quotes % 2 == 0:
+            record = b''.join(pending)
+            yield offset, record
+            offset += len(record)
+            pending, quotes = [], 0
+
+
+def _parse_record(record: bytes) -> List[str]:
+    return next(csv.reader(io.StringIO(record.decode('utf-8'), newline='')), [])
+
+
+def _to_number(raw: str) -> Optional[float]:
+    try:
+        return float(raw)
+    except ValueError:
+        return None
+
+
+def _to_choices(raw: str) -> Optional[frozenset]:
+    try:
+        return frozenset(json.loads(raw))
+    except (ValueError, TypeError):
+        return None
+
+
+def read_records(f: BinaryIO, offsets: Sequence[int]) -> Iterator[List[str]]:
+    """Relit les enregistrements aux offsets donnés (une page de résultats)."""
+    for offset in offsets:
+        f.seek(offset)
+        for _, record in _iter_records(f):
+            yield _parse_record(record)
+            break
+
+
+class ResponseIndex:
+    """Index secondaires en mémoire sur le fichier de réponses CSV.
+
+    Les lignes restent sur disque ; l'index garde l'offset de chaque entrée et, pour
+    les champs indexés (choisis d'après le schéma) :
+      - `terms` : valeur -> positions, pour les enums, booléens et listes à choix ;
+      - `ranges` : clés triées + positions, pour les nombres et les dates (dont la
+        date de soumission). Les ajouts vont dans `pending` (non trié), fusionné par
+        un seul tri au-delà de RANGE_MERGE_THRESHOLD : pas d'insertion O(n) par entrée ;
+      - `values` : valeur par position, pour vérifier les autres filtres sur les
+        candidats du filtre le plus sélectif.
+    L'appelant sérialise `extend`, `add` et `query` (verrou d'écriture de l'app).
+    """
+
+    def __init__(self, schema: Dict[str, Any], columns: Sequence[str]) -> None:
+        self.columns = list(columns)
+        self.kinds: Dict[str, str] = {}
+        self.booleans: Set[str] = set()
+        for name, prop in schema.get('properties', {}).items():
+            kind = self._kind(prop)
+            if kind:
+                self.kinds[name] = kind
+            if prop.get('type') == 'boolean':
+                self.booleans.add(name)
+        self.kinds[SUBMISSION_DATE] = 'date'
+        self.loaded = False
+        self._reset()
+
+    @staticmethod
+    def _kind(prop: Dict[str, Any]) -> Optional[str]:
+        field_type = prop.get('type')
+        if 'enum' in prop or field_type == 'boolean':
+            return 'term'
+        if field_type == 'array' and 'enum' in prop.get('items', {}):
+            return 'multi'
+        if field_type in ('number', 'integer'):
+            return 'number'
+        if field_type == 'string' and prop.get('format') in ('date', 'date-time'):
+            return 'date'
+        return None
+
+    def _reset(self) -> None:
+        # Offset de fin du dernier enregistrement indexé (0 : en-tête pas encore lu)
+        self.end = 0
+        self._mapping: Optional[List[int]] = None
+        self.offsets = array('Q')
+        self.entry_ids: Dict[str, int] = {}
+        self.values: Dict[str, List[Any]] = {name: [] for name in self.kinds}
+        self.terms: Dict[str, Dict[str, array]] = {
+            name: {} for name, kind in self.kinds.items() if kind in ('term', 'multi')
+        }
+        self.ranges: Dict[str, Tuple[List[Any], array]] = {
+            name: ([], array('I'))
+            for name, kind in self.kinds.items()
+            if kind in ('number', 'date')
+        }
+        self.pending: Dict[str, List[Tuple[Any, int]]] = {name: [] for name in self.ranges}
+        # Cellule brute -> valeur indexée : une valeur répétée (enum, date, choix multiples)
+        # n'est convertie et stockée qu'une fois, les entrées la référencent
+        self.interned: Dict[str, Dict[str, Any]] = {
+            name: {}
+            for name, kind in self.kinds.items()
+            if name != SUBMISSION_DATE and kind != 'number'
+        }
+        convert = {'number': _to_number, 'multi': _to_choices}
+        # (colonne, liste à choix, valeurs, postings, ajouts en attente, cache, conversion)
+        self._slots = [
+            (
+                self.columns.index(name),
+                kind == 'multi',
+                self.values[name],
+                self.terms.get(name),
+                self.pending.get(name),
+                self.interned.get(name),
+                convert.get(kind),
+            )
+            for name, kind in self.kinds.items()
+            if name in self.columns
+        ]
+        self._entry_column = self.columns.index('entry_id') if 'entry_id' in self.columns else -1
+
+    def _merge(self, name: str) -> None:
+        keys, positions = self.ranges[name]
+        pairs = list(zip(keys, positions))
+        pairs.extend(self.pending[name])
+        pairs.sort(key=itemgetter(0))
+        self.ranges[name] = ([key for key, _ in pairs], array('I', (p for _, p in pairs)))
+        self.pending[name].clear()
+
+    def add(self, offset: int, end: int, cells: Sequence[str], merge: bool = True) -> None:
+        """Indexe l'enregistrement [offset, end) du fichier (cellules dans l'ordre `columns`)."""
+        position = len(self.offsets)
+        self.offsets.append(offset)
+        self.end = end
+        size = len(cells)
+        if 0 <= self._entry_column < size and cells[self._entry_column]:
+            self.entry_ids[cells[self._entry_column]] = position
+        for column, multi, values, terms, pending, cache, convert in self._slots:
+            raw = cells[column] if column < size else ''
+            if not raw:
+                values.append(None)
+                continue
+            if cache is None:
+                key = raw if convert is None else convert(raw)
+            else:
+                key = cache.get(raw)
+                if key is None:
+                    key = raw if convert is None else convert(raw)
+                    if key is not None:
+                        cache[raw] = key
+            values.append(key)
+            if key is None:
+                continue
+            if terms is not None:
+                for term in key if multi else (key,):
+                    posting = terms.get(term)
+                    if posting is None:
+                        posting = terms[term] = array('I')
+                    posting.append(position)
+            else:
+                pending.append((key, position))
+                if merge and len(pending) >= RANGE_MERGE_THRESHOLD:
+                    self._merge(self.columns[column])
+
+    def extend(self, f: BinaryIO) -> int:
+        """Indexe les enregistrements écrits depuis le dernier passage ; retourne leur nombre.
+
+        Le premier appel lit l'en-tête et indexe tout le fichier (ouvert en binaire).
+        """
+        f.seek(self.end)
+        records = _iter_records(f)
+        if self.end == 0:
+            header = next(records, None)
+            if header is None:
+                return 0
+            # Le fichier commence par un BOM UTF-8 (ouverture dans Excel)
+            names = _parse_record(header[1].removeprefix(codecs.BOM_UTF8))
+            self.end = header[0] + len(header[1])
+            if names != self.columns:
+                # Colonnes dans un autre ordre : on ramène chaque ligne à `columns`
+                self._mapping = [names.index(c) if c in names else -1 for c in self.columns]
+        count = 0
+        mapping = self._mapping
+        for offset, record in records:
+            cells = _parse_record(record)
+            if mapping is not None:
+                cells = [cells[i] if 0 <= i < len(cells) else '' for i in mapping]
+            self.add(offset, offset + len(record), cells, merge=False)
+            count += 1
+        # Un seul tri par index pour le lot (la première construction passe ici)
+        for name, pending in self.pending.items():
+            if len(pending) >= RANGE_MERGE_THRESHOLD:
+                self._merge(name)
+        return count
+
+    def filterable(self) -> Dict[str, str]:
+        return {'entry_id': 'term', **self.kinds}
+
+    def _bound(self, name: str, operator: str, raw: str) -> Any:
+        if self.kinds[name] == 'number':
+            try:
+                return float(raw)
+            except ValueError:
+                raise ValueError(f"{name}__{operator} : nombre attendu")
+        # Date de soumission "AAAA-MM-JJ HH:MM:SS" : une borne jour inclut toute la journée
+        if name == SUBMISSION_DATE and len(raw) == 10 and operator in ('lte', 'gt'):
+            return f"{raw} 23:59:59"
+        return raw
+
+    def _range(self, name: str, bounds: Dict[str, Any]) -> Plan:
+        keys, positions = self.ranges[name]
+        low, high = 0, len(keys)
+        if 'gte' in bounds:
+            low = max(low, bisect.bisect_left(keys, bounds['gte']))
+        if 'gt' in bounds:
+            low = max(low, bisect.bisect_right(keys, bounds['gt']))
+        if 'lte' in bounds:
+            high = min(high, bisect.bisect_right(keys, bounds['lte']))
+        if 'lt' in bounds:
+            high = min(high, bisect.bisect_left(keys, bounds['lt']))
+        values = self.values[name]
+        pending = self.pending[name]
+
+        def within(value: Any) -> bool:
+            return value is not None and (
+                ('gte' not in bounds or value >= bounds['gte'])
+                and ('gt' not in bounds or value > bounds['gt'])
+                and ('lte' not in bounds or value <= bounds['lte'])
+                and ('lt' not in bounds or value < bounds['lt'])
+            )
+
+        def candidates() -> Sequence[int]:
+            found = positions[low:high].tolist()
+            found.extend(p for key, p in pending if within(key))
+            found.sort()
+            return found
+
+        return candidates, max(0, high - low) + len(pending), lambda p: within(values[p])
+
+    def _terms(self, name: str, wanted: List[str]) -> Plan:
+        if name in self.booleans:
+            # Mêmes écritures que le formulaire (voir parse_form_data)
+            wanted = ['true' if w.lower() in TRUTHY else 'false' for w in wanted]
+        postings = [self.terms[name].get(w, array('I')) for w in wanted]
+        wanted_set = frozenset(wanted)
+        values = self.values[name]
+
+        def candidates() -> Sequence[int]:
+            if len(postings) == 1:
+                return postings[0]
+            return sorted({p for posting in postings for p in posting})
+
+        def check(position: int) -> bool:
+            value = values[position]
+            if self.kinds[name] == 'multi':
+                return value is not None and not value.isdisjoint(wanted_set)
+            return value in wanted_set
+
+        return candidates, sum(len(p) for p in postings), check
+
+    def _entry_ids(self, wanted: List[str]) -> Plan:
+        found = sorted({self.entry_ids[e] for e in wanted if e in self.entry_ids})
+        return (lambda: found), len(found), frozenset(found).__contains__
+
+    def query(
+        self, args: MultiDict[str, str], order: str = 'desc', offset: int = 0, limit: int = 50
+    ) -> Tuple[int, List[int]]:
+        """Évalue les filtres de `args` et retourne (total, offsets de la page).
+
+        - `<champ>=v` (répétable : v1 OU v2) ; pour une liste à choix, « contient v » ;
+        - `<champ>__gte|gt|lte|lt=v` pour les nombres et les dates ;
+        - `entry_id=...`.
+        Les résultats sont dans l'ordre de soumission (`order=desc` : plus récents d'abord).
+
+        Raises:
+            ValueError: Filtre sur un champ non indexé ou valeur invalide.
+        """
+        plans: List[Plan] = []
+        bounds: Dict[str, Dict[str, Any]] = {}
+        for param in args:
+            if param in RESERVED_PARAMS:
+                continue
+            name, _, operator = param.partition('__')
+            kind = self.filterable().get(name)
+            if kind is None:
+                raise ValueError(f"{name} : champ non filtrable")
+            if operator:
+                if operator not in RANGE_OPERATORS or kind not in ('number', 'date'):
+                    raise ValueError(f"{param} : opérateur non supporté")
+                bounds.setdefault(name, {})[operator] = self._bound(name, operator, args[param])
+            elif name == 'entry_id':
+                plans.append(self._entry_ids(args.getlist(name)))
+            elif kind in ('term', 'multi'):
+                plans.append(self._terms(name, args.getlist(name)))
+            else:
+                bounds.setdefault(name, {}).update(
+                    gte=self._bound(name, 'gte', args[name]),
+                    lte=self._bound(name, 'lte', args[name]),
+                )
+        plans.extend(self._range(name, field_bounds) for name, field_bounds in bounds.items())
+
+        if not plans:
+            total = len(self.offsets)
+            if order == 'desc':
+                page = range(total - 1 - offset, max(-1, total - 1 - offset - limit), -1)
+            else:
+                page = range(offset, min(total, offset + limit))
+            return total, [self.offsets[p] for p in page]
+
+        # Le plan le plus sélectif fournit les candidats, les autres filtres sont vérifiés
+        # sur les valeurs en mémoire de ces seuls candidats
+        plans.sort(key=lambda plan: plan[1])
+        checks = [check for _, _, check in plans[1:]]
+        matched = [p for p in plans[0][0]() if all(check(p) for check in checks)]
+        if order == 'desc':
+            matched.reverse()
+        return len(matched), [self.offsets[p] for p in matched[offset : offset + limit]]
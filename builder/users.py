@@ -1,19 +1,42 @@
+import hmac
 import os
+from typing import Optional, cast
 
 from fastapi import Depends, HTTPException
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
-from supabase import Client, create_client
+from local_backends import USE_LOCAL_BACKENDS, LocalSupabase
+from supabase import AsyncClient, acreate_client
 from supabase_auth.types import User as SupabaseUser
+from workers import with_timeout
 
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
 
 SUPABASE_URL = os.getenv("SUPABASE_URL", "")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY", "")
+# Token du scraper Prometheus pour /metrics (vide : endpoint désactivé)
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+_supabase: Optional[AsyncClient] = None
 
 
-def get_current_user(creds: HTTPAuthorizationCredentials = Depends(security)) -> SupabaseUser:
+async def get_supabase() -> AsyncClient:
+    """Client Supabase async, créé au premier appel dans la boucle d'événements.
+
+    Si GERMINA_BACKEND=local, les tokens sont des JWT émis par `local_backends.issue_token`.
+    """
+    global _supabase
+    if _supabase is None:
+        if USE_LOCAL_BACKENDS:
+            _supabase = cast(AsyncClient, LocalSupabase())
+        else:
+            _supabase = await acreate_client(SUPABASE_URL, SUPABASE_KEY)
+    return _supabase
+
+
+async def get_current_user(
+    creds: HTTPAuthorizationCredentials = Depends(security),
+) -> SupabaseUser:
     """Récupère l'utilisateur via token Supabase JWT.
 
     Args:
@@ -21,11 +44,15 @@ def get_current_user(creds: HTTPAuthorizationCredentials = Depends(security)) ->
     Returns:
         user (User): Les informations de l'utilisateur récupérées depuis Supabase.
     Raises:
-        HTTPException: Si le token est invalide, expiré ou si l'utilisateur n'existe pas.
+        HTTPException: Si le token est invalide, expiré ou si l'utilisateur n'existe pas,
+            504 si Supabase ne répond pas à temps.
     """
     token = creds.credentials
+    supabase = await get_supabase()
     try:
-        response = supabase.auth.get_user(token)
+        response = await with_timeout(supabase.auth.get_user(token), "Supabase auth.get_user")
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=401,
@@ -37,3 +64,22 @@ def get_current_user(creds: HTTPAuthorizationCredentials = Depends(security)) ->
             detail="Utilisateur non trouvé ou token invalide",
         )
     return response.user
+
+
+def require_metrics_token(
+    creds: Optional[HTTPAuthorizationCredentials] = Depends(optional_security),
+) -> None:
+    """Réserve /metrics au scraper : en-tête `Authorization: Bearer <METRICS_TOKEN>`.
+
+    Raises:
+        HTTPException: 404 si METRICS_TOKEN n'est pas défini, 401 si le token est absent
+            ou invalide.
+    """
+    if not METRICS_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if creds is None or not hmac.compare_digest(creds.credentials, METRICS_TOKEN):
+        raise HTTPException(
+            status_code=401,
+            detail="Token de métriques invalide",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
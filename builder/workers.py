@@ -0,0 +1,232 @@
+import asyncio
+import functools
+import math
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+
+from fastapi import HTTPException
+from fastapi.logger import logger
+from metrics import registry
+
+# Configuration
+IMAGE_WORKERS: int = int(os.getenv("IMAGE_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))
+IMAGE_QUEUE_LIMIT: int = int(os.getenv("IMAGE_QUEUE_LIMIT", str(2 * IMAGE_WORKERS)))
+# Threads dédiés aux appels bloquants sans client async (GCS, disque)
+IO_THREADS: int = int(os.getenv("IO_THREADS", "32"))
+# Délai maximal (secondes) de chaque appel à un service amont
+UPSTREAM_TIMEOUT: float = float(os.getenv("UPSTREAM_TIMEOUT", "30"))
+
+T = TypeVar("T")
+
+
+class WorkerError(Exception):
+    """Erreur HTTP levée dans un worker, transportable entre process (picklable)."""
+
+    def __init__(self, status_code: int, detail: Any) -> None:
+        super().__init__(status_code, detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.worker_metrics: Dict[str, Any] = {}
+
+
+def _init_worker() -> None:
+    """Initialise un process worker : un seul thread OpenCV par process, et les threads
+    d'encodage bornés à la part du CPU de ce worker (IMAGE_WORKERS process en parallèle).
+    """
+    import cv2
+    import image
+
+    cv2.setNumThreads(1)
+    image.set_encode_threads(max(1, (os.cpu_count() or 1) // IMAGE_WORKERS), jxl_threads=1)
+
+
+def _timed_call(
+    fn: Callable[..., Any], submitted_at: float, *args: Any
+) -> Tuple[Any, float, float, Dict[str, Any]]:
+    """Exécute `fn` dans le worker et retourne (résultat, début, fin, métriques du worker).
+
+    En cas d'erreur, les métriques de l'appel sont jointes à l'exception (`worker_metrics`)
+    au lieu de rester dans le worker et d'être imputées à l'appel suivant.
+    """
+    started_at = time.time()
+    worker_metrics: Dict[str, Any] = {}
+    try:
+        try:
+            result = fn(*args)
+        finally:
+            worker_metrics = registry.drain()
+    except HTTPException as e:
+        error = WorkerError(e.status_code, e.detail)
+        error.worker_metrics = worker_metrics
+        raise error from None
+    except Exception as e:
+        e.worker_metrics = worker_metrics  # type: ignore[attr-defined]
+        raise
+    return result, started_at, time.time(), worker_metrics
+
+
+class WorkerPool:
+    """Pool de process dédié au travail CPU (décodage, rendu PDF, encodage).
+
+    Le nombre de tâches en attente est borné : au-delà de `max_workers + max_queue`
+    tâches en cours, `run` lève une HTTPException 503 avec un en-tête Retry-After.
+    """
+
+    def __init__(self, max_workers: int, max_queue: int) -> None:
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._stats: Dict[str, float] = {
+            "completed": 0,
+            "failed": 0,
+            "rejected": 0,
+            "queue_wait_seconds_total": 0.0,
+            "queue_wait_seconds_max": 0.0,
+            "processing_seconds_total": 0.0,
+            "processing_seconds_max": 0.0,
+        }
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                )
+            return self._executor
+
+    def _retry_after(self) -> int:
+        """Estime en secondes le temps avant qu'un slot se libère."""
+        completed = self._stats["completed"]
+        avg = self._stats["processing_seconds_total"] / completed if completed else 1.0
+        return max(1, math.ceil(avg * self._in_flight / self.max_workers))
+
+    def _reserve(self) -> None:
+        with self._lock:
+            if self._in_flight >= self.max_workers + self.max_queue:
+                self._stats["rejected"] += 1
+                raise HTTPException(
+                    status_code=503,
+                    detail="Serveur saturé, veuillez réessayer plus tard.",
+                    headers={"Retry-After": str(self._retry_after())},
+                )
+            self._in_flight += 1
+
+    def _release(self, queue_wait: Optional[float], processing: Optional[float]) -> None:
+        with self._lock:
+            self._in_flight -= 1
+            if queue_wait is None or processing is None:
+                self._stats["failed"] += 1
+                return
+            self._stats["completed"] += 1
+            self._stats["queue_wait_seconds_total"] += queue_wait
+            self._stats["queue_wait_seconds_max"] = max(
+                self._stats["queue_wait_seconds_max"], queue_wait
+            )
+            self._stats["processing_seconds_total"] += processing
+            self._stats["processing_seconds_max"] = max(
+                self._stats["processing_seconds_max"], processing
+            )
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Exécute `fn(*args)` dans un process worker sans bloquer la boucle d'événements.
+
+        Args:
+            fn: Fonction top-level (picklable) à exécuter.
+            *args: Arguments picklables de la fonction.
+        Returns:
+            Le résultat de `fn`.
+        Raises:
+            HTTPException: 503 si le pool est saturé, ou l'erreur HTTP levée par `fn`.
+        """
+        self._reserve()
+        queue_wait: Optional[float] = None
+        processing: Optional[float] = None
+        try:
+            loop = asyncio.get_running_loop()
+            submitted_at = time.time()
+            result, started_at, finished_at, worker_metrics = await loop.run_in_executor(
+                self._get_executor(), _timed_call, fn, submitted_at, *args
+            )
+            registry.merge(worker_metrics)
+            queue_wait = max(0.0, started_at - submitted_at)
+            processing = finished_at - started_at
+            return result
+        except WorkerError as e:
+            registry.merge(e.worker_metrics)
+            raise HTTPException(status_code=e.status_code, detail=e.detail)
+        except BrokenProcessPool:
+            logger.exception("Pool de workers image cassé, redémarrage.")
+            with self._lock:
+                self._executor = None
+            raise HTTPException(
+                status_code=503,
+                detail="Serveur saturé, veuillez réessayer plus tard.",
+                headers={"Retry-After": "1"},
+            )
+        except Exception as e:
+            registry.merge(getattr(e, "worker_metrics", {}))
+            raise
+        finally:
+            self._release(queue_wait, processing)
+            if processing is not None:
+                logger.info(
+                    f"{getattr(fn, '__name__', fn)}: attente {queue_wait:.3f}s, "
+                    f"traitement {processing:.3f}s"
+                )
+
+    def stats(self) -> Dict[str, float]:
+        """Retourne un instantané des métriques du pool."""
+        with self._lock:
+            return {
+                **self._stats,
+                "in_flight": self._in_flight,
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+            }
+
+    def shutdown(self) -> None:
+        """Arrête les process workers (appelé à l'arrêt de l'application)."""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+image_pool = WorkerPool(IMAGE_WORKERS, IMAGE_QUEUE_LIMIT)
+
+
+io_executor = ThreadPoolExecutor(max_workers=IO_THREADS, thread_name_prefix="io")
+
+
+async def with_timeout(awaitable: Awaitable[T], what: str, timeout: float = UPSTREAM_TIMEOUT) -> T:
+    """Attend un appel amont avec un délai maximal.
+
+    Raises:
+        HTTPException: 504 si le délai est dépassé.
+    """
+    try:
+        return await asyncio.wait_for(awaitable, timeout)
+    except asyncio.TimeoutError:
+        logger.error(f"Délai dépassé ({timeout}s) : {what}")
+        raise HTTPException(status_code=504, detail=f"Délai dépassé : {what}")
+
+
+async def run_blocking(
+    fn: Callable[..., T], *args: Any, timeout: float = UPSTREAM_TIMEOUT, **kwargs: Any
+) -> T:
+    """Exécute un appel bloquant dans `io_executor` (borné) avec un délai maximal."""
+    loop = asyncio.get_running_loop()
+    return await with_timeout(
+        loop.run_in_executor(io_executor, functools.partial(fn, *args, **kwargs)),
+        getattr(fn, "__name__", repr(fn)),
+        timeout,
+    )